@@ -124,6 +124,26 @@ STATIC_URL = 'static/'
 MEDIA_URL = 'media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'data')
+
+# Load models only from data/models (see fetch_models), never from a model hub
+MODELS_OFFLINE = os.environ.get("VIDEOSEARCH_OFFLINE", "").lower() in ("1", "true", "yes")
+
+# Keyframe image tiers stored next to the full-size JPEG: tier name -> longest side in pixels.
+# Run build_thumbnails after changing them.
+KEYFRAME_THUMBNAIL_TIERS = {"thumb": 320}
+KEYFRAME_THUMBNAIL_FORMAT = "WEBP"
+KEYFRAME_THUMBNAIL_QUALITY = 80
+
+# Preview proxies played in the detailed view (see build_proxies), overrides of
+# VideoSearch.utils.proxies.DEFAULT_PROXY_SETTINGS. Run build_proxies after changing them.
+VIDEO_PROXY_SETTINGS = {"height": 480, "crf": 28}
+
+# Media is served by VideoSearch.views.media_view (byte ranges, ETag/Last-Modified), also without DEBUG.
+# Only these folders of MEDIA_ROOT are served. Behind nginx set MEDIA_SENDFILE_HEADER = "X-Accel-Redirect"
+# and an internal location MEDIA_ACCEL_REDIRECT_PREFIX aliasing MEDIA_ROOT; behind Apache/lighttpd "X-Sendfile".
+MEDIA_SERVED_DIRS = ["videos", "keyframes", "proxies"]
+MEDIA_SENDFILE_HEADER = None
+MEDIA_ACCEL_REDIRECT_PREFIX = "/protected-media/"
 STATICFILES_DIRS = [os.path.join(BASE_DIR, STATIC_URL)]
 
 # Default primary key field type
@@ -15,18 +15,19 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, re_path
 from django.conf import settings
-from django.conf.urls.static import static
 from VideoSearch import views
+import re
 
 urlpatterns = [
     path('', views.home_view, name='home'),
     path("api/search/", views.api_search_view, name="api_search"),
     path("api/color/", views.api_search_view, name="color_filter"),
+    path("api/sprites/", views.api_sprites_view, name="api_sprites"),
+    path("sprites/<slug:key>/", views.sprite_sheet_view, name="sprite_sheet"),
     path('detailed_view/<int:keyframe_id>/', views.detailed_view, name='detailed_view'),
+    path('keyframe_image/<int:keyframe_id>/<slug:tier>/<slug:version>/', views.keyframe_image_view, name='keyframe_image'),
+    re_path(rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.*)$", views.media_view, name="media"),
     path('admin/', admin.site.urls)
-]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+]
\ No newline at end of file
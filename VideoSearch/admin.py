@@ -1,8 +1,11 @@
 from django.contrib import admin
-from .models import Keyframe, Video, Clip, ClipPredictionCache
+from .models import Keyframe, Video, Clip, ClipPredictionCache, VideoPredictionCache, ImportJob, VideoProbe
 
 # Register your models here.
 admin.site.register(Video)
 admin.site.register(Clip)
 admin.site.register(ClipPredictionCache)
-admin.site.register(Keyframe)
\ No newline at end of file
+admin.site.register(VideoPredictionCache)
+admin.site.register(Keyframe)
+admin.site.register(ImportJob)
+admin.site.register(VideoProbe)
@@ -4,6 +4,17 @@ import colorama
 colorama.init()  # auto-enables color output on Windows terminals
 
 class StyledCommand(BaseCommand):
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        """Option defaults come from the machine profile written by tune_import, if one exists."""
+        from VideoSearch.utils.machine_profile import command_defaults
+
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        known = {action.dest for action in parser._actions}
+        defaults = {key: value for key, value in command_defaults(subcommand).items() if key in known}
+        if defaults:
+            parser.set_defaults(**defaults)
+        return parser
+
     def style_info(self, text):
         return f"{colorama.Fore.CYAN}{text}{colorama.Style.RESET_ALL}"
 
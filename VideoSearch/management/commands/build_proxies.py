@@ -0,0 +1,41 @@
+from VideoSearch.management.base import StyledCommand as BaseCommand
+from VideoSearch.models import Video
+from VideoSearch.utils.proxies import build_proxy, needs_proxy, proxy_settings, prune_proxies
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+class Command(BaseCommand):
+    help = "Encode small preview proxies of all videos for the detailed view (H.264, a keyframe every second, +faststart).\nOnly videos without an up-to-date proxy are encoded; run it after importing new videos or after changing VIDEO_PROXY_SETTINGS."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of concurrent ffmpeg encodes (every encode uses several threads itself).')
+        parser.add_argument('--force', action='store_true', help='Encode all proxies again, also up-to-date ones.')
+
+    def handle(self, *args, **kwargs):
+        params = proxy_settings()
+        videos = Video.objects.only("id", "file_path", "file_size", "file_mtime_ns", "content_hash", "proxy_hash")
+
+        removed = prune_proxies(videos.values_list("id", flat=True))
+        if removed:
+            self.stdout.write(self.style_info(f"Removed {removed} proxy file(s) of deleted videos."))
+
+        pending = [video for video in videos if kwargs["force"] or needs_proxy(video, params)]
+        if not pending:
+            self.stdout.write(self.style_success("All proxies are up to date."))
+            return
+
+        self.stdout.write(self.style_info(f"Encoding {len(pending)} proxies ({params['height']}p, CRF {params['crf']}) with {kwargs['workers']} worker(s)."))
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, kwargs["workers"])) as pool:
+            futures = {pool.submit(build_proxy, video, params, self.stdout.write): video for video in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                video = futures[future]
+                proxy_hash = future.result()
+                if proxy_hash is None:
+                    failed += 1
+                    continue
+                Video.objects.filter(id=video.id).update(proxy_hash=proxy_hash)
+                self.stdout.write(f"[{done}/{len(pending)}] {video.file_name}")
+
+        if failed:
+            self.stdout.write(self.style_warning(f"{failed} proxies failed; the detailed view plays their source files."))
+        self.stdout.write(self.style_success("Proxies complete."))
@@ -0,0 +1,62 @@
+from VideoSearch.management.base import StyledCommand as BaseCommand
+from VideoSearch.models import Keyframe
+from VideoSearch.utils.thumbnails import save_thumbnails, file_hash, tier_paths, thumbnail_tiers, thumbnail_format
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import os
+
+class Command(BaseCommand):
+    help = "Create the thumbnail tiers (KEYFRAME_THUMBNAIL_TIERS) and content hashes of already stored keyframe images.\nNew keyframes get them during extraction; run this once for older keyframes or after changing the tiers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Keyframes loaded and updated per query.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='Threads decoding and encoding images (Pillow releases the GIL while doing so).')
+        parser.add_argument('--force', action='store_true', help='Recreate all tiers, also for keyframes that already have them.')
+
+    def handle(self, *args, **kwargs):
+        total = Keyframe.objects.count()
+        tiers = ", ".join(f"{tier} ({size}px)" for tier, size in thumbnail_tiers().items())
+        self.stdout.write(self.style_info(f"Building {thumbnail_format()[0]} tiers {tiers} for up to {total} keyframes with {kwargs['workers']} thread(s)."))
+
+        processed = hashed = missing = 0
+        with ThreadPoolExecutor(max_workers=max(1, kwargs["workers"])) as pool:
+            for batch in iter_keyframes(kwargs["batch_size"]):
+                hashes = list(pool.map(lambda kf: build_tiers(kf, kwargs["force"]), batch))
+
+                changed = []
+                for kf, image_hash in zip(batch, hashes):
+                    if image_hash is None:
+                        missing += 1
+                    elif image_hash != kf.image_hash:
+                        kf.image_hash = image_hash
+                        changed.append(kf)
+                Keyframe.objects.bulk_update(changed, ["image_hash"])
+
+                processed += len(batch)
+                hashed += len(changed)
+                self.stdout.write(f"Processed {processed}/{total} keyframes ({hashed} image hashes updated).")
+
+        if missing:
+            self.stdout.write(self.style_warning(f"{missing} keyframe(s) have no stored image. Re-run extract_keyframes for their clips."))
+        self.stdout.write(self.style_success("Thumbnails complete."))
+
+def iter_keyframes(batch_size):
+    """Yields all keyframes in batches, paging by id so only one batch of rows is held in memory at a time."""
+    last_id = 0
+    while True:
+        batch = list(Keyframe.objects.filter(id__gt=last_id).only("id", "clip_id", "frame", "image_hash").order_by("id")[:batch_size])
+        if not batch:
+            return
+        last_id = batch[-1].id
+        yield batch
+
+def build_tiers(kf, force=False) -> str | None:
+    """Creates missing tiers of a keyframe image and returns its content hash (None if the image does not exist)."""
+    full_path = kf.get_image_path()
+    if not full_path.exists():
+        return None
+
+    if force or not all(path.exists() for path in tier_paths(full_path)):
+        with Image.open(full_path) as img:
+            save_thumbnails(img, full_path)
+    return kf.image_hash if kf.image_hash and not force else file_hash(full_path)
@@ -2,11 +2,21 @@ from VideoSearch.management.base import StyledCommand as BaseCommand
 from VideoSearch.models import Video
 
 class Command(BaseCommand):
-    help = "Delete all imported videos and cascade clear related data."
+    help = "Delete all imported videos and cascade clear related data.\nRows are removed with set-based SQL (TRUNCATE on PostgreSQL) and the keyframe images by discarding the whole data/keyframes tree."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wait', action='store_true', help='Delete the discarded keyframe images before returning instead of in a background process.')
+        parser.add_argument('--per-row', action='store_true', help='Use the slow ORM cascade that deletes every keyframe and its image one by one.')
 
     def handle(self, *args, **kwargs):
-        count, _ = Video.objects.all().delete()
+        from VideoSearch.utils.purge import purge_all
+
+        if kwargs.get("per_row"):
+            count, _ = Video.objects.all().delete()
+        else:
+            count = purge_all(background=not kwargs.get("wait"), log=lambda msg: self.stdout.write(self.style_info(msg)))
+
         if count > 0:
             self.stdout.write(self.style_success(f"Cleared {count} video(s) and related data."))
         else:
-            self.stdout.write(self.style_error("No imported videos found. Nothing to clear."))
\ No newline at end of file
+            self.stdout.write(self.style_error("No imported videos found. Nothing to clear."))
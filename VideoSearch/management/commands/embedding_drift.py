@@ -0,0 +1,84 @@
+from VideoSearch.management.base import StyledCommand as BaseCommand
+from VideoSearch.models import Keyframe
+import numpy as np
+import time
+
+class Command(BaseCommand):
+    help = "Compare int8-quantized CPU image encoders with the fp32 models on a sample of keyframes.\nReports the cosine drift between both embeddings and how much their nearest-neighbour rankings overlap."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=200, help='Number of random keyframes to embed.')
+        parser.add_argument('--top-k', type=int, default=10, help='Neighbours compared for the retrieval overlap.')
+        parser.add_argument('--clip-model', type=str, default="openai/clip-vit-base-patch32", help='CLIP model to compare.')
+        parser.add_argument('--dino-model', type=str, default="vit_small_patch16_224_dino", help='DINO model to compare (empty string to skip DINO).')
+        parser.add_argument('--threads', type=int, default=None, help='Torch threads used for both runs.')
+        parser.add_argument('--batch-size', type=int, default=16, help='Images per model call.')
+
+    def handle(self, *args, **kwargs):
+        from VideoSearch.utils.embeddings import ImageEmbedder
+
+        keyframes = list(Keyframe.objects.only("id", "clip_id", "frame").order_by("?")[:kwargs["sample"]])
+        images = []
+        for kf in keyframes:
+            img = kf.load_image()
+            if img is not None:
+                images.append(img.convert("RGB"))
+
+        if len(images) < 2:
+            self.stdout.write(self.style_warning("Not enough keyframe images found. Run extract_keyframes first."))
+            return
+
+        dino_model = kwargs["dino_model"] or None
+        models = (kwargs["clip_model"], dino_model, "full" if dino_model else "clip-only")
+        self.stdout.write(self.style_info(f"Embedding {len(images)} keyframes with CLIP={models[0]}, DINO={models[1]}."))
+
+        results = {}
+        for quantize in (False, True):
+            embedder = ImageEmbedder(device="cpu", command=self, num_threads=kwargs["threads"],
+                                     batch_size=kwargs["batch_size"], quantize=quantize, models=models)
+            start = time.perf_counter()
+            features = embedder.get_combined_embedding_batch(images)
+            elapsed = time.perf_counter() - start
+            results[quantize] = (features, elapsed)
+            del embedder
+
+        reference, reference_seconds = results[False]
+        quantized, quantized_seconds = results[True]
+        self.stdout.write(self.style_info(
+            f"Throughput: fp32 {len(images) / reference_seconds:.1f} img/s | int8 {len(images) / quantized_seconds:.1f} img/s "
+            f"({reference_seconds / quantized_seconds:.2f}x)"
+        ))
+
+        top_k = min(kwargs["top_k"], len(images) - 1)
+        for key in ("clip_emb", "dino_emb"):
+            if reference[0].get(key) is None:
+                continue
+            a = np.stack([f[key] for f in reference])
+            b = np.stack([f[key] for f in quantized])
+            drift = cosine_drift(a, b)
+            overlap = neighbour_overlap(a, b, top_k)
+            self.stdout.write(
+                f"{key}: cosine drift mean {drift.mean():.4f}, median {np.median(drift):.4f}, max {drift.max():.4f} | "
+                f"top-{top_k} overlap mean {overlap.mean():.3f}, min {overlap.min():.3f}"
+            )
+
+        self.stdout.write(self.style_success("Embedding drift report complete."))
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+def cosine_drift(reference: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    """Cosine distance between the two embeddings of every row."""
+    return 1.0 - np.sum(_normalize(reference) * _normalize(candidate), axis=1)
+
+def neighbour_overlap(reference: np.ndarray, candidate: np.ndarray, top_k: int) -> np.ndarray:
+    """Share of each row's top_k nearest neighbours (within the sample) that both embeddings agree on."""
+    def neighbours(matrix):
+        normalized = _normalize(matrix)
+        similarity = normalized @ normalized.T
+        np.fill_diagonal(similarity, -np.inf)
+        return np.argsort(-similarity, axis=1)[:, :top_k]
+
+    ref, cand = neighbours(reference), neighbours(candidate)
+    return np.array([len(set(r) & set(c)) / top_k for r, c in zip(ref, cand)])
@@ -0,0 +1,61 @@
+from VideoSearch.management.base import StyledCommand as BaseCommand
+from VideoSearch.models import Video, ClipPredictionCache, Keyframe, ImportJob
+from django.db.models import Count
+
+class Command(BaseCommand):
+    help = "Create import jobs for all outstanding work so import_worker processes can pick it up.\nWork already recorded by earlier imports (pending keyframe caches, missing object vectors) is enqueued as well."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true', help='Reset failed jobs so they are attempted again.')
+        parser.add_argument('--clip-model', type=str, default=None, help='CLIP model all workers embed keyframes with (default: the model of already queued jobs, else the choice for this machine).')
+        parser.add_argument('--dino-model', type=str, default=None, help='DINO model all workers embed keyframes with; "none" (the default with --clip-model) embeds with CLIP only.')
+
+    def handle(self, *args, **kwargs):
+        if kwargs.get("retry_failed"):
+            reset = ImportJob.objects.filter(status=ImportJob.STATUS_FAILED).update(status=ImportJob.STATUS_PENDING, attempts=0)
+            self.stdout.write(self.style_info(f"Reset {reset} failed job(s)."))
+
+        self.models = self.queue_models(kwargs.get("clip_model"), kwargs.get("dino_model"))
+        self.stdout.write(self.style_info(f"Keyframes are embedded with CLIP={self.models[0]}, DINO={self.models[1] or 'none'} on every worker."))
+        updated = (ImportJob.objects.exclude(status=ImportJob.STATUS_DONE)
+                   .exclude(clip_model=self.models[0], dino_model=self.models[1] or "")
+                   .update(clip_model=self.models[0], dino_model=self.models[1] or ""))
+        if updated:
+            self.stdout.write(self.style_info(f"Switched {updated} queued job(s) to these models."))
+
+        created = 0
+        for video in Video.objects.iterator(chunk_size=500):
+            created += self._enqueue(ImportJob.STAGE_CLIPS, video)
+
+        for entry in ClipPredictionCache.objects.select_related("clip__video").iterator(chunk_size=500):
+            created += self._enqueue(ImportJob.STAGE_KEYFRAMES, entry.clip.video, entry.clip)
+
+        clips = Keyframe.objects.filter(object_vector__isnull=True).values_list("clip_id", "clip__video_id").distinct()
+        for clip_id, video_id in clips.iterator(chunk_size=500):
+            created += ImportJob.objects.get_or_create(video_id=video_id, clip_id=clip_id, stage=ImportJob.STAGE_OBJECTS,
+                                                       defaults={"clip_model": self.models[0], "dino_model": self.models[1] or ""})[1]
+
+        self.stdout.write(self.style_success(f"Enqueued {created} new job(s)."))
+
+        summary = ImportJob.objects.values("stage", "status").annotate(count=Count("id")).order_by("stage", "status")
+        for row in summary:
+            self.stdout.write(self.style_info(f"  {row['stage']:>10} | {row['status']:>8} | {row['count']}"))
+
+    def queue_models(self, clip_model=None, dino_model=None) -> tuple:
+        """
+        (clip_model_name, dino_model_name or None) of the queue: the given ones, else those of already
+        queued jobs, so enqueueing more work never mixes embedding spaces, else EmbeddingModelSelector's choice.
+        """
+        if not clip_model:
+            queued = ImportJob.objects.exclude(clip_model="").order_by("-id").values_list("clip_model", "dino_model").first()
+            if queued is None:
+                from VideoSearch.utils.hardware import EmbeddingModelSelector
+                queued = EmbeddingModelSelector.select(command=self)[:2]
+            clip_model, dino_model = queued[0], dino_model or queued[1]
+
+        dino_model = dino_model or "none"
+        return clip_model, None if dino_model.lower() == "none" else dino_model
+
+    def _enqueue(self, stage, video, clip=None):
+        return ImportJob.objects.get_or_create(video=video, clip=clip, stage=stage,
+                                               defaults={"clip_model": self.models[0], "dino_model": self.models[1] or ""})[1]
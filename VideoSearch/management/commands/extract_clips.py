@@ -1,9 +1,9 @@
 from VideoSearch.management.base import StyledCommand as BaseCommand
-from scipy.signal import argrelextrema
 import numpy as np
 from multiprocessing import Pool, cpu_count
 import multiprocessing
 from functools import partial
+from VideoSearch.utils.shot_boundaries import TRANSNET_BACKENDS, multipass_schedule, multipass_cuts
 
 DEFAULT_CLIP_EXTRACTION_SETTINGS = {
     "threshold_low": 0.45,
@@ -13,11 +13,19 @@ DEFAULT_CLIP_EXTRACTION_SETTINGS = {
     "passes": 20,
 }
 
+transnet_model = None
+
 class Command(BaseCommand):
     help = "Extract clips from all videos and store them in the database.\nA clip is defined as a single Video sequence with no cuts within it."
 
     def add_arguments(self, parser):
         parser.add_argument('--workers', type=int, default=4, help='Number of worker processes (1 disables multiprocessing).')
+        parser.add_argument('--batch-size', type=int, default=16, help='Number of 100-frame windows per TransNetV2 inference call (windows of several videos are batched together).')
+        parser.add_argument('--videos-per-task', type=int, default=8, help='Number of videos handed to a worker at once; their windows share inference batches.')
+        parser.add_argument('--backend', choices=TRANSNET_BACKENDS, default="tensorflow", help='Framework used for TransNetV2 inference (pytorch requires converted weights).')
+        parser.add_argument('--threads', type=int, default=None, help='Intra-op threads per worker (default: CPU cores divided by workers).')
+        parser.add_argument('--quantize', action='store_true', help='Use int8 dynamic quantization (pytorch backend on CPU only).')
+        parser.add_argument('--backfill-predictions', action='store_true', help='Also run TransNetV2 on videos whose clips are complete but whose predictions were never stored (imported before they were kept), so resegment can use them. Their clips are only replaced if they were made with other settings.')
         for key, default in DEFAULT_CLIP_EXTRACTION_SETTINGS.items():
             arg_name = f"--{key.replace('_', '-')}"
             arg_type = float if isinstance(default, float) else int
@@ -44,54 +52,139 @@ class Command(BaseCommand):
 
         from VideoSearch.models import Video
 
-        videos = Video.objects.all()
-        video_ids = [v.id for v in videos]
+        video_ids = list(Video.objects.values_list("id", flat=True))
 
         num_workers = kwargs.get("workers", 4)
-        self.stdout.write(self.style_info(f"Processing {len(video_ids)} videos using {num_workers} worker(s)."))
+        videos_per_task = max(1, kwargs.get("videos_per_task", 8))
+        tasks = [video_ids[i:i + videos_per_task] for i in range(0, len(video_ids), videos_per_task)]
+        threads = kwargs.get("threads") or max(1, cpu_count() // max(1, num_workers))
+        model_args = (kwargs.get("backend", "tensorflow"), threads, kwargs.get("quantize", False))
+        self.stdout.write(self.style_info(f"Processing {len(video_ids)} videos using {num_workers} worker(s) with {threads} thread(s) each."))
 
         if num_workers == 1:
             # Run sequentially (no Pool)
-            results = [process_video_for_clips(vid, kwargs) for vid in video_ids]
+            init_worker(*model_args)
+            for task in tasks:
+                for msg in process_videos_for_clips(task, kwargs):
+                    self.stdout.write(self.style_success(msg))
         else:
-            with Pool(processes=num_workers) as pool:
-                results = pool.map(partial(process_video_for_clips, kwargs=kwargs), video_ids)
-
-        for msg in results:
-            self.stdout.write(self.style_success(msg))
+            with Pool(processes=num_workers, initializer=init_worker, initargs=model_args) as pool:
+                for messages in pool.imap_unordered(partial(process_videos_for_clips, kwargs=kwargs), tasks):
+                    for msg in messages:
+                        self.stdout.write(self.style_success(msg))
 
-def process_video_for_clips(video_id, kwargs):
+def init_worker(backend="tensorflow", threads=None, quantize=False):
+    """Initialize Django and load TransNetV2 only once per worker process."""
     import os
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ContentBasedVideoRetrieval.settings")
     import django
     django.setup()
 
-    from VideoSearch.models import Video, Clip, ClipPredictionCache
-    from third_party.transnetv2.inference.transnetv2 import TransNetV2
-    from pathlib import Path
-
-    video = Video.objects.get(id=video_id)
-    path = Path(video.file_path)
-
-    existing_clips = Clip.objects.filter(video=video)
-    if existing_clips.exists() and is_clip_coverage_complete(video):
-        return f"Skipping {path.name} - clips fully exist."
+    global transnet_model
+    from VideoSearch.utils.shot_boundaries import load_transnet
+    transnet_model = load_transnet(backend, threads=threads, quantize=quantize)
 
-    Clip.objects.filter(video=video).delete()
+def process_videos_for_clips(video_ids, kwargs, model=None):
+    """
+    Detects clips for several videos at once. Frames of all videos are decoded one after
+    another while their TransNetV2 windows are packed into shared inference batches.
+    Videos whose predictions are already stored are re-segmented without running the model,
+    e.g. when their clips were created with other segmentation settings. Videos with complete
+    clips but without stored predictions are skipped unless kwargs["backfill_predictions"] is set.
+    Uses the worker's TransNetV2 unless a model is passed.
+    """
+    from VideoSearch.models import Video, Clip, VideoPredictionCache
+    from VideoSearch.utils.shot_boundaries import load_transnet_frames, predict_videos
+    from VideoSearch.utils.manifest import clip_params_hash, is_stale
+    from pathlib import Path
 
-    model = TransNetV2()
-    clips, predictions = extract_clips(model, video, path, **kwargs)
+    global transnet_model
+    messages = []
+    videos = {}
+    params_hash = clip_params_hash(kwargs)
+
+    backfill = kwargs.get("backfill_predictions", False)
+    resegment = set()
+
+    for video in Video.objects.filter(id__in=video_ids).select_related("videopredictioncache"):
+        path = Path(video.file_path)
+        cache = getattr(video, "videopredictioncache", None)
+        complete = Clip.objects.filter(video=video).exists() and is_clip_coverage_complete(video)
+        stale = is_stale(video.clip_params_hash, params_hash)
+        if complete and not stale and (cache is not None or not backfill):
+            messages.append(f"Skipping {path.name} - clips fully exist.")
+            continue
+        if cache is not None:
+            kept, created, removed = store_clips(video, cache.load_predictions(), **kwargs)
+            messages.append(f"Stored {kept + created} clips for {path.name} from cached predictions ({removed} removed).")
+            continue
+        if complete and not backfill:
+            messages.append(f"Skipping {path.name} - clips were made with other settings, but no predictions are stored (use --backfill-predictions).")
+            continue
+        videos[video.id] = video
+        if not complete or stale:
+            resegment.add(video.id)
+
+    def decoded_videos():
+        for video_id, video in videos.items():
+            print(f"[ClipExtraction] Extracting frames from {Path(video.file_path).name}")
+            try:
+                frames = load_transnet_frames(video.file_path)
+            except Exception as e:
+                messages.append(f"Failed to decode {Path(video.file_path).name}: {e}")
+                continue
+            yield video_id, frames
+
+    batch_size = kwargs.get("batch_size", 16)
+    for video_id, predictions in predict_videos(model or transnet_model, decoded_videos(), batch_size=batch_size):
+        video = videos[video_id]
+        VideoPredictionCache.store(video, predictions)
+        if video_id not in resegment:
+            messages.append(f"Stored predictions for {Path(video.file_path).name}; its clips are unchanged.")
+            continue
+        kept, created, removed = store_clips(video, predictions, **kwargs)
+
+        messages.append(f"Stored {kept + created} clips for {Path(video.file_path).name}")
+
+    return messages
+
+def store_clips(video, predictions, **kwargs):
+    """
+    Segments a video from its per-frame predictions and replaces its clips with the result.
+    Clips whose boundaries did not change are kept together with their keyframes; new clips
+    get a ClipPredictionCache entry so extract_keyframes picks them up. The settings hash is
+    stored with the video so later runs with other settings re-segment it.
 
-    for start_frame, end_frame in clips:
-        clip = Clip.objects.create(
-            video=video,
-            start_frame=start_frame,
-            end_frame=end_frame
-        )
-        ClipPredictionCache.store(clip, predictions[start_frame:end_frame + 1])
+    Returns: (kept, created, removed) clip counts
+    """
+    from VideoSearch.models import Video, Clip, ClipPredictionCache
+    from VideoSearch.utils.manifest import clip_params_hash
+    from VideoSearch.utils.purge import purge_clips
+    from django.db import transaction
+
+    clips = predictions_to_clips(video, predictions, **kwargs)
+    existing = {(clip.start_frame, clip.end_frame): clip.id for clip in Clip.objects.filter(video=video)}
+    wanted = set(clips)
+    removed = [clip_id for bounds, clip_id in existing.items() if bounds not in wanted]
+
+    with transaction.atomic():
+        purge_clips(removed)
+        created = Clip.objects.bulk_create([
+            Clip(video=video, start_frame=start_frame, end_frame=end_frame)
+            for start_frame, end_frame in clips
+            if (start_frame, end_frame) not in existing
+        ])
+        ClipPredictionCache.objects.bulk_create([
+            ClipPredictionCache(
+                clip=clip,
+                probabilities=ClipPredictionCache.compress_array(predictions[clip.start_frame:clip.end_frame + 1])
+            )
+            for clip in created
+        ])
+        Video.objects.filter(id=video.id).update(clip_params_hash=clip_params_hash(kwargs))
+
+    return len(clips) - len(created), len(created), len(removed)
 
-    return f"Stored {len(clips)} clips for {path.name}"
-            
 def is_clip_coverage_complete(video):
     from VideoSearch.models import Clip
     clips = Clip.objects.filter(video=video).order_by('start_frame')
@@ -106,15 +199,13 @@ def is_clip_coverage_complete(video):
 
     return current >= video.frame_count
 
-def extract_clips(model, video, video_path, **kwargs):
+def predictions_to_clips(video, single_frame_predictions, **kwargs):
     """
-    Runs clip boundary detection on a video file using TransNetV2 predictions.
+    Turns TransNetV2 per-frame predictions of a video into clips.
     Applies multi-pass local maxima analysis with confidence-based filtering.
 
     Returns: List of (start_frame, end_frame) tuples
     """
-    _, single_frame_predictions, _ = model.predict_video(str(video_path))
-
     fps = video.fps()
 
     settings = {k: kwargs.get(k, v) for k, v in DEFAULT_CLIP_EXTRACTION_SETTINGS.items()}
@@ -125,7 +216,7 @@ def extract_clips(model, video, video_path, **kwargs):
         **settings,
     )
 
-    return [(int(start), int(end)) for start, end in scenes], single_frame_predictions
+    return [(int(start), int(end)) for start, end in scenes]
 
 def multipass_predictions_to_scenes(
     predictions: np.ndarray,
@@ -138,6 +229,7 @@ def multipass_predictions_to_scenes(
 ):
     """
     Runs multiple passes of local maxima detection with decreasing thresholds and increasing smoothing.
+    All passes are evaluated in one vectorized step on the local maximum reach of every frame.
     
     :param predictions: 1D numpy array of shot boundary confidences per frame.
     :param threshold_low: Minimum threshold value to consider.
@@ -149,20 +241,9 @@ def multipass_predictions_to_scenes(
     :return: List of (start_frame, end_frame) tuples.
     """
     predictions = np.asarray(predictions)
-    cut_candidates = set()
-
-    order_high = int(max_pass_seconds * fps / 2)
-
-    for i in range(passes):
-        t = i / (passes - 1) if passes > 1 else 0
-        threshold = threshold_high - t * (threshold_high - threshold_low)
-        order = max(1, int(order_low + t * (order_high - order_low)))
-
-        local_maxima = argrelextrema(predictions, np.greater, order=order)[0]
-        new_cuts = [idx for idx in local_maxima if predictions[idx] > threshold]
-        cut_candidates.update(new_cuts)
 
-    sorted_cuts = sorted(cut_candidates)
+    thresholds, orders = multipass_schedule(threshold_low, threshold_high, order_low, max_pass_seconds, passes, fps)
+    sorted_cuts = multipass_cuts(predictions, thresholds, orders).tolist()
 
     if not sorted_cuts:
         return [(0, len(predictions) - 1)]
@@ -1,24 +1,66 @@
 from VideoSearch.management.base import StyledCommand as BaseCommand
 from VideoSearch.management.commands.extract_clips import multipass_predictions_to_scenes
-from multiprocessing import Pool
+from VideoSearch.utils.frame_hash import DEFAULT_DEDUP_TOLERANCE
+from VideoSearch.utils.manifest import keyframe_params_hash
+from multiprocessing import Pool, cpu_count
+
+DEFAULT_KEYFRAME_SETTINGS = {
+    "threshold": 0.35,
+    "search_range_factor": 0.95,
+    "frames_to_compare": 25,
+}
 
 feature_extractor = None
+object_detector = None
 
 class Command(BaseCommand):
     help = "Extract keyframes from newly extracted clips."
 
     def add_arguments(self, parser):
-        parser.add_argument('--threshold', type=float, default=0.35, help='Distance threshold for keyframe uniqueness.')
-        parser.add_argument('--search-range-factor', type=float, default=0.95, help='Fraction of region used to search around potential keyframe.')
-        parser.add_argument('--frames-to-compare', type=int, default=25, help='How many frames to sample when searching for keyframes.')
+        add_keyframe_arguments(parser)
         parser.add_argument('--workers', type=int, default=4, help='Number of worker processes (1 disables multiprocessing).')
+        parser.add_argument('--threads', type=int, default=None, help='Torch threads per worker (default: CPU cores divided by workers).')
+        parser.add_argument('--dedup-tolerance', type=float, default=DEFAULT_DEDUP_TOLERANCE, help='Sampled frames whose 16x16 grayscale thumbnails differ by at most this mean difference from an already kept frame skip model inference (0, the default, disables it; try 0.02).')
+        parser.add_argument('--quantize', action='store_true', help='Run CLIP and DINO int8-quantized on the CPU (also enables DINO without a GPU). Check the effect with embedding_drift.')
+        parser.add_argument('--inference-server', action='store_true', help='Run CLIP/DINO once in a shared local server process; workers send their frames over shared memory and only sample, decode and compare.')
+        parser.add_argument('--server-batch', type=int, default=64, help='Maximum frames per model call of the inference server.')
+        parser.add_argument('--detect-objects', action='store_true', help='Detect objects on the keyframe images while they are stored, making a separate extract_objects run unnecessary.')
+        parser.add_argument('--object-batch', type=int, default=8, help='Keyframes per YOLO inference call when detecting objects inline.')
+        parser.add_argument('--requeue-stale', action='store_true', help='Delete and re-extract the keyframes of clips that were extracted with other settings or models (otherwise they are only counted).')
+        parser.add_argument('--per-video', action='store_true', help='Schedule whole videos instead of single clips: a worker plans the samples of all clips of a video and decodes them in one sequential pass instead of seeking once per frame.')
 
     def handle(self, *args, **kwargs):
         from VideoSearch.models import ClipPredictionCache
-        threshold = kwargs.get('threshold', 0.35)
-        search_range_factor = kwargs.get('search_range_factor', 0.95)
-        frames_to_compare = kwargs.get('frames_to_compare', 25)
+        threshold = kwargs.get('threshold', DEFAULT_KEYFRAME_SETTINGS["threshold"])
+        search_range_factor = kwargs.get('search_range_factor', DEFAULT_KEYFRAME_SETTINGS["search_range_factor"])
+        frames_to_compare = kwargs.get('frames_to_compare', DEFAULT_KEYFRAME_SETTINGS["frames_to_compare"])
         workers = kwargs.get('workers', 4)
+        detect_objects = kwargs.get('detect_objects', False)
+        object_batch = kwargs.get('object_batch', 8)
+        threads = kwargs.get('threads') or max(1, cpu_count() // max(1, workers))
+        quantize = kwargs.get('quantize', False)
+        dedup_tolerance = kwargs.get('dedup_tolerance', DEFAULT_DEDUP_TOLERANCE)
+
+        # one model choice for all workers and the inference server, so the settings hash matches what runs
+        from VideoSearch.utils.hardware import EmbeddingModelSelector
+        models = EmbeddingModelSelector.select(command=self, quantized=quantize)
+
+        requeue = kwargs.get('requeue_stale', False)
+        stale, without_predictions = requeue_stale_clips(
+            keyframe_params_hash(threshold, search_range_factor, frames_to_compare, dedup_tolerance, quantize, models[:2]),
+            # clips stamped before model names were hashed are only compared by their settings
+            keyframe_params_hash(threshold, search_range_factor, frames_to_compare, dedup_tolerance, quantize),
+            dry_run=not requeue,
+        )
+        if stale and requeue:
+            self.stdout.write(self.style_info(f"Re-extracting {stale} clip(s) whose keyframes were extracted with other settings or models."))
+        elif stale:
+            self.stdout.write(self.style_warning(f"{stale} clip(s) have keyframes extracted with other settings or models. Run with --requeue-stale to re-extract them."))
+        if without_predictions:
+            self.stdout.write(self.style_warning(
+                f"{without_predictions} clip(s) were extracted with other settings or models but their videos have no stored predictions "
+                "(imported before they were kept). Run extract_clips --backfill-predictions to store them, then extract_keyframes again."
+            ))
 
         candidates = ClipPredictionCache.objects.select_related("clip", "clip__video").all()
 
@@ -26,23 +68,65 @@ class Command(BaseCommand):
             self.stdout.write(self.style_warning("No clips require keyframe extraction."))
             return
 
-        args_list = [
-            (entry.id, threshold, search_range_factor, frames_to_compare)
-            for entry in candidates
-        ]
-
-        self.stdout.write(self.style_info(f"Extracting keyframes for {len(args_list)} clips using {workers} worker(s)."))
-
-        if workers == 1:
-            init_worker()
-            for args in args_list:
-                process_clip_entry_worker(*args)
+        if kwargs.get('per_video'):
+            entries_by_video = {}
+            for entry in candidates:
+                entries_by_video.setdefault(entry.clip.video_id, []).append(entry.id)
+            # largest videos first, so no worker is left with a long video at the end
+            task = process_video_entries_worker
+            args_list = [
+                (entry_ids, threshold, search_range_factor, frames_to_compare, object_batch)
+                for entry_ids in sorted(entries_by_video.values(), key=len, reverse=True)
+            ]
+            self.stdout.write(self.style_info(f"Extracting keyframes for {len(candidates)} clips of {len(args_list)} videos using {workers} worker(s)."))
         else:
-            with Pool(processes=workers, initializer=init_worker) as pool:
-                pool.starmap(process_clip_entry_worker, args_list)
+            task = process_clip_entry_worker
+            args_list = [
+                (entry.id, threshold, search_range_factor, frames_to_compare, object_batch)
+                for entry in candidates
+            ]
+            self.stdout.write(self.style_info(f"Extracting keyframes for {len(args_list)} clips using {workers} worker(s)."))
+
+        if detect_objects:
+            self.stdout.write(self.style_info("Object detection runs inline on the extracted keyframes."))
+
+        server = None
+        if kwargs.get('inference_server'):
+            from VideoSearch.utils.inference_server import InferenceServer
+            # the models get all cores; workers only decode and compare
+            server = InferenceServer(slots=workers, max_batch=kwargs.get('server_batch', 64), num_threads=cpu_count(), quantize=quantize, models=models).start()
+            self.stdout.write(self.style_info(f"Started shared inference server for {workers} worker(s)."))
+        worker_args = (detect_objects, threads, quantize, dedup_tolerance, server.client_config() if server else None, models)
+
+        try:
+            if workers == 1:
+                init_worker(*worker_args)
+                for args in args_list:
+                    task(*args)
+            else:
+                with Pool(processes=workers, initializer=init_worker, initargs=worker_args) as pool:
+                    pool.starmap(task, args_list)
+        finally:
+            if server:
+                server.stop()
+
+def add_keyframe_arguments(parser):
+    """Keyframe selection options with the same defaults in every command that extracts keyframes."""
+    parser.add_argument('--threshold', type=float, default=DEFAULT_KEYFRAME_SETTINGS["threshold"], help='Distance threshold for keyframe uniqueness.')
+    parser.add_argument('--search-range-factor', type=float, default=DEFAULT_KEYFRAME_SETTINGS["search_range_factor"], help='Fraction of region used to search around potential keyframe.')
+    parser.add_argument('--frames-to-compare', type=int, default=DEFAULT_KEYFRAME_SETTINGS["frames_to_compare"], help='How many frames to sample when searching for keyframes.')
+
+def process_clip_entry(entry, feature_extractor, threshold, search_range_factor, frames_to_compare, command=None, object_detector=None, object_batch=8,
+                       windows=None, load_images=None):
+    """
+    Extracts the keyframes of one clip and removes its ClipPredictionCache entry.
 
-def process_clip_entry(entry, feature_extractor, threshold, search_range_factor, frames_to_compare, command=None):
-    from VideoSearch.models import Keyframe
+    :param windows: Sampling windows from plan_clip_sampling, computed if None.
+    :param load_images: Callable returning the images of clip-relative frame numbers;
+        seeks in the video with ffmpeg (Clip.get_selected_frame_images) if None.
+    """
+    from VideoSearch.models import Clip, Keyframe
+    from VideoSearch.utils.feature_matrix import KeyframeAccumulator
 
     clip = entry.clip
     if command:
@@ -52,35 +136,105 @@ def process_clip_entry(entry, feature_extractor, threshold, search_range_factor,
 
     Keyframe.objects.filter(clip=clip).delete()
 
-    probs = entry.load_predictions()
-    change_regions = multipass_predictions_to_scenes(probs, 0.01, 1, 3, 1, 25, clip.fps())
+    if windows is None:
+        windows = plan_clip_sampling(entry, search_range_factor, frames_to_compare)
     if command:
-        command.stdout.write(command.style_info(f"Detected {len(change_regions)} change regions."))
+        command.stdout.write(command.style_info(f"Detected {len(windows)} change regions."))
     else:
-        print(f"[KeyframeExtraction] Detected {len(change_regions)} change regions.")
-
-    for start, end in change_regions:
-        potential_keyframe = int((start + end) / 2)
-        try_for_potential_keyframe(
-            feature_extractor,
-            clip,
-            potential_keyframe,
-            start,
-            end,
-            int((end - start) * search_range_factor),
-            threshold,
-            frames_to_compare
-        )
-
+        print(f"[KeyframeExtraction] Detected {len(windows)} change regions.")
+
+    keyframes = KeyframeAccumulator(clip, detector=object_detector, detector_batch_size=object_batch)
+    for start, step_size, frame_offsets in windows:
+        images = load_images(frame_offsets) if load_images else clip.get_selected_frame_images(frame_offsets)
+        select_keyframes(feature_extractor, keyframes, images, start, step_size, threshold)
+
+    stored = len(keyframes.flush())
+    params_hash = keyframe_params_hash(threshold, search_range_factor, frames_to_compare,
+                                       feature_extractor.dedup_tolerance, getattr(feature_extractor, "quantize", False),
+                                       getattr(feature_extractor, "model_names", None))
+    Clip.objects.filter(id=clip.id).update(keyframe_params_hash=params_hash)
+    stats = feature_extractor.reset_stats()
+    summary = f"Extracted {stored} keyframes. Skipped inference for {stats['frames_skipped']} of {stats['frames_sampled']} sampled frames as near-duplicates."
     if command:
-        command.stdout.write(command.style_success(f"Extracted {Keyframe.objects.filter(clip=clip).count()} keyframes."))
+        command.stdout.write(command.style_success(summary))
     else:
-        print(f"[KeyframeExtraction] Extracted {Keyframe.objects.filter(clip=clip).count()} keyframes.")
+        print(f"[KeyframeExtraction] {summary}")
 
     entry.delete()
 
-def init_worker():
-    """Initialize model only once per worker process."""
+def process_video_entries(entries, feature_extractor, threshold, search_range_factor, frames_to_compare, command=None, object_detector=None, object_batch=8):
+    """
+    Extracts the keyframes of several clips of the same video. The sampling windows of all clips
+    are planned first, then the union of their frames is decoded in one sequential pass and handed
+    to the clips in order, instead of seeking once per sampled frame.
+    """
+    from VideoSearch.utils.frame_reader import SequentialFrameReader
+
+    entries = sorted(entries, key=lambda entry: entry.clip.start_frame)
+    plans = [(entry, plan_clip_sampling(entry, search_range_factor, frames_to_compare)) for entry in entries]
+    frames = [
+        entry.clip.start_frame + offset
+        for entry, windows in plans
+        for _, _, frame_offsets in windows
+        for offset in frame_offsets
+    ]
+
+    with SequentialFrameReader(entries[0].clip.video.file_path, frames) as reader:
+        for entry, windows in plans:
+            clip = entry.clip
+            process_clip_entry(
+                entry,
+                feature_extractor,
+                threshold,
+                search_range_factor,
+                frames_to_compare,
+                command=command,
+                object_detector=object_detector,
+                object_batch=object_batch,
+                windows=windows,
+                load_images=lambda offsets, clip=clip: reader.read([clip.start_frame + offset for offset in offsets]),
+            )
+
+def requeue_stale_clips(params_hash, legacy_hash=None, dry_run=False):
+    """
+    Queues clips whose keyframes were extracted with other settings again by restoring their
+    ClipPredictionCache entry from the stored video predictions.
+
+    :param params_hash: Current keyframe_params_hash.
+    :param legacy_hash: Hash of the current settings in an older format, also treated as up to date.
+    :param dry_run: Only count the stale clips, queue nothing.
+    :return: (queued clips, stale clips that could not be queued because their video has no stored predictions)
+    """
+    from VideoSearch.models import Clip, ClipPredictionCache, VideoPredictionCache
+
+    stale = (
+        Clip.objects.filter(clippredictioncache__isnull=True)
+        .exclude(keyframe_params_hash="")
+        .exclude(keyframe_params_hash__in=[h for h in (params_hash, legacy_hash) if h])
+        .only("id", "video_id", "start_frame", "end_frame")
+        .order_by("video_id")
+    )
+    clips_by_video = {}
+    for clip in stale:
+        clips_by_video.setdefault(clip.video_id, []).append(clip)
+
+    caches = VideoPredictionCache.objects.filter(video_id__in=list(clips_by_video))
+    if dry_run:
+        queueable = sum(len(clips_by_video[video_id]) for video_id in caches.values_list("video_id", flat=True))
+        return queueable, sum(len(clips) for clips in clips_by_video.values()) - queueable
+
+    entries = []
+    for cache in caches:
+        predictions = cache.load_predictions()
+        entries.extend(
+            ClipPredictionCache(clip=clip, probabilities=ClipPredictionCache.compress_array(predictions[clip.start_frame:clip.end_frame + 1]))
+            for clip in clips_by_video.pop(cache.video_id)
+        )
+    ClipPredictionCache.objects.bulk_create(entries, batch_size=500)
+    return len(entries), sum(len(clips) for clips in clips_by_video.values())
+
+def init_worker(detect_objects=False, threads=None, quantize=False, dedup_tolerance=DEFAULT_DEDUP_TOLERANCE, server_config=None, models=None):
+    """Initialize models only once per worker process."""
     import os
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ContentBasedVideoRetrieval.settings")
     import django
@@ -88,12 +242,21 @@ def init_worker():
 
     global feature_extractor
     from VideoSearch.utils.visual_feature_extractor import VisualFeatureExtractor
-    feature_extractor = VisualFeatureExtractor(command=None)
-
-def process_clip_entry_worker(entry_id, threshold, search_range_factor, frames_to_compare):
+    embedder = None
+    if server_config is not None:
+        from VideoSearch.utils.inference_server import RemoteEmbedder
+        embedder = RemoteEmbedder.connect(server_config)
+    feature_extractor = VisualFeatureExtractor(command=None, num_threads=threads, quantize=quantize, dedup_tolerance=dedup_tolerance, embedder=embedder, models=models)
+
+    global object_detector
+    if detect_objects:
+        from VideoSearch.utils.objects import ObjectDetector
+        object_detector = ObjectDetector()
+
+def process_clip_entry_worker(entry_id, threshold, search_range_factor, frames_to_compare, object_batch=8):
     from VideoSearch.models import ClipPredictionCache
 
-    global feature_extractor
+    global feature_extractor, object_detector
     entry = ClipPredictionCache.objects.select_related("clip", "clip__video").get(id=entry_id)
 
     process_clip_entry(
@@ -102,42 +265,70 @@ def process_clip_entry_worker(entry_id, threshold, search_range_factor, frames_t
         threshold,
         search_range_factor,
         frames_to_compare,
-        command=None
+        command=None,
+        object_detector=object_detector,
+        object_batch=object_batch
+    )
+
+def process_video_entries_worker(entry_ids, threshold, search_range_factor, frames_to_compare, object_batch=8):
+    from VideoSearch.models import ClipPredictionCache
+
+    global feature_extractor, object_detector
+    entries = list(ClipPredictionCache.objects.select_related("clip", "clip__video").filter(id__in=entry_ids))
+    if not entries:
+        return
+
+    process_video_entries(
+        entries,
+        feature_extractor,
+        threshold,
+        search_range_factor,
+        frames_to_compare,
+        command=None,
+        object_detector=object_detector,
+        object_batch=object_batch
     )
 
-def try_for_potential_keyframe(
-    feature_extractor,
-    clip,
-    potential_keyframe: int,
-    lower_bound: int,
-    upper_bound: int,
-    search_range: int,
-    threshold: float,
-    amount_of_frames_to_compare: int,
-):
+def plan_clip_sampling(entry, search_range_factor, frames_to_compare):
     """
-    Tries to add new keyframes by sampling within a potential region of stability.
-    Adds the most representative image if sufficiently different from existing keyframes.
+    Finds the change regions of a clip and the frames sampled around the potential keyframe of each region.
+    Returns a list of (start, step_size, frame_offsets) windows; offsets are relative to the clip start.
     """
-    start, end = compute_sampling_bounds(clip, potential_keyframe, lower_bound, upper_bound, search_range)
-    num_frames = end - start + 1
-    step_size = max(1, num_frames // amount_of_frames_to_compare)
-    frame_offsets = [i for i in range(0, end - start + 1, step_size)]
-    images = clip.get_selected_frame_images(frame_offsets)
+    clip = entry.clip
+    probs = entry.load_predictions()
+    change_regions = multipass_predictions_to_scenes(probs, 0.01, 1, 3, 1, 25, clip.fps())
 
-    if not images:
+    windows = []
+    for lower_bound, upper_bound in change_regions:
+        potential_keyframe = int((lower_bound + upper_bound) / 2)
+        search_range = int((upper_bound - lower_bound) * search_range_factor)
+        start, end = compute_sampling_bounds(clip, potential_keyframe, lower_bound, upper_bound, search_range)
+        step_size = max(1, (end - start + 1) // frames_to_compare)
+        frame_offsets = [offset for offset in range(start, end + 1, step_size) if clip.start_frame + offset <= clip.end_frame]
+        windows.append((start, step_size, frame_offsets))
+    return windows
+
+def select_keyframes(feature_extractor, keyframes, images, start, step_size, threshold):
+    """
+    Adds the most representative of the sampled images to the keyframes, as long as they are
+    sufficiently different from the existing keyframes. Image i shows frame start + i * step_size.
+    """
+    clip = keyframes.clip
+    if not images or all(image is None for image in images):
+        end = start + max(0, len(images) - 1) * step_size
         if feature_extractor.command:
             feature_extractor.command.stdout.write(feature_extractor.command.style_warning(f"No images found in range {start}-{end} for clip {clip.id}"))
         else:
             print(f"[KeyframeExtraction] No images found in range {start}-{end} for clip {clip.id}")
         return
 
-    candidates = feature_extractor.get_candidates(images, start, step_size, clip, threshold)
+    candidates = feature_extractor.get_candidates(images, start, step_size, keyframes, threshold)
 
     if(not candidates):
         return
 
-    refine_and_store_keyframes(candidates, clip, feature_extractor, threshold)
+    images_by_frame = {start + i * step_size: image for i, image in enumerate(images)}
+    refine_and_store_keyframes(candidates, keyframes, feature_extractor, threshold, images_by_frame)
 
 
 def compute_sampling_bounds(clip, center_frame, lower_bound, upper_bound, search_range):
@@ -158,25 +349,18 @@ def compute_sampling_bounds(clip, center_frame, lower_bound, upper_bound, search
         return start, end
 
 
-def refine_and_store_keyframes(candidates, clip, feature_extractor, threshold):
-    from VideoSearch.models import Keyframe
-    while candidates:
-        best_frame = feature_extractor.select_representative(candidates)
+def refine_and_store_keyframes(candidates, keyframes, feature_extractor, threshold, images_by_frame=None):
+    from VideoSearch.utils.feature_matrix import CandidatePool
+
+    pool = CandidatePool(candidates)
+    while len(pool):
+        best_frame = pool.medoid()
         if not best_frame:
             break
 
         frame_number, features = best_frame
-        Keyframe.create(
-            clip,
-            frame_number, 
-            features["clip_emb"], 
-            features["dino_emb"],
-            features["histogram"],
-            features["palette"],
-            features["colorfulness"])
-
-        candidates = [
-            (frame, features)
-            for frame, features in candidates
-            if feature_extractor.distance_to_existing_keyframes(clip, features)[0] > threshold
-        ]
\ No newline at end of file
+        keyframes.add(frame_number, features, (images_by_frame or {}).get(frame_number))
+
+        remaining = pool.remaining()
+        min_distances, _ = feature_extractor.distances_to_keyframes(keyframes, [features for _, features in remaining])
+        pool.keep(min_distances > threshold)
@@ -1,6 +1,8 @@
-from django.core.management.base import BaseCommand
+from VideoSearch.management.base import StyledCommand as BaseCommand
 from VideoSearch.models import Keyframe
-from VideoSearch.utils.objects import ObjectDetector
+from VideoSearch.utils.objects import ObjectDetector, auto_batch_size
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 import numpy as np
 
 class Command(BaseCommand):
@@ -10,17 +12,27 @@ class Command(BaseCommand):
         parser.add_argument(
             '--batch-size',
             type=int,
-            default=1,
-            help='Number of keyframes to process in a batch (default: 1)'
+            default=None,
+            help='Number of keyframes to process in a batch (default: sized to the available memory)'
+        )
+        parser.add_argument(
+            '--prefetch',
+            type=int,
+            default=2,
+            help='Number of batches whose images are loaded ahead while YOLO runs (default: 2)'
+        )
+        parser.add_argument(
+            '--io-threads',
+            type=int,
+            default=4,
+            help='Threads loading and decoding keyframe images (default: 4)'
         )
 
     def handle(self, *args, **options):
-        batch_size = options['batch_size']
         detector = ObjectDetector(command=self)
+        batch_size = options['batch_size'] or auto_batch_size()
 
-        keyframes = list(Keyframe.objects.filter(object_vector__isnull=True))
-        total = len(keyframes)
-
+        total = Keyframe.objects.filter(object_vector__isnull=True).count()
         if total == 0:
             self.stdout.write(self.style.SUCCESS("All keyframes already have object vectors."))
             return
@@ -28,31 +40,98 @@ class Command(BaseCommand):
         self.stdout.write(self.style.WARNING(f"Found {total} keyframes missing object vectors..."))
         self.stdout.write(f"Using batch size: {batch_size}")
 
-        for i in range(0, total, batch_size):
-            batch_kfs = keyframes[i:i + batch_size]
-            images = []
-            valid_kfs = []
-
-            for kf in batch_kfs:
-                img = kf.load_image()
-                if img is not None:
-                    images.append(img)
-                    valid_kfs.append(kf)
-                else:
-                    self.stdout.write(self.style.ERROR(f"Skipping Keyframe {kf.id}: image missing"))
-
-            if not images:
-                continue
-
-            # Use the new method returning 80-d vectors
-            vectors_batch = detector.extract_vector_batch(images)
-
-            for kf, vec in zip(valid_kfs, vectors_batch):
-                if vec is not None and np.linalg.norm(vec) > 0:
-                    kf.object_vector = Keyframe.compress_array(vec)
-                    kf.save(update_fields=["object_vector"])
-                    self.stdout.write(f"Keyframe {kf.id} processed.")
-                else:
-                    self.stdout.write(self.style.WARNING(f"No valid vector for Keyframe {kf.id}"))
+        processed = 0
+        updated = 0
+        batches = iter_missing_keyframes(batch_size)
+
+        with ThreadPoolExecutor(max_workers=max(1, options['io_threads'])) as pool:
+            pending = deque()
+
+            def prefetch_next():
+                batch_kfs = next(batches, None)
+                if batch_kfs:
+                    pending.append((batch_kfs, [pool.submit(load_decoded_image, kf) for kf in batch_kfs]))
+
+            for _ in range(max(1, options['prefetch'])):
+                prefetch_next()
+
+            while pending:
+                batch_kfs, futures = pending.popleft()
+                prefetch_next()  # keep the loaders busy while this batch runs through YOLO
+
+                images = []
+                valid_kfs = []
+                for kf, future in zip(batch_kfs, futures):
+                    img = future.result()
+                    if img is not None:
+                        images.append(img)
+                        valid_kfs.append(kf)
+                    else:
+                        self.stdout.write(self.style.ERROR(f"Skipping Keyframe {kf.id}: image missing"))
+
+                if images:
+                    updated += detect_and_store(detector, valid_kfs, images)
+
+                processed += len(batch_kfs)
+                self.stdout.write(f"Processed {processed}/{total} keyframes ({updated} object vectors stored).")
 
         self.stdout.write(self.style.SUCCESS("Object vector extraction complete."))
+
+def iter_missing_keyframes(batch_size):
+    """
+    Yields keyframes without object vectors in batches, paging by id so only one batch
+    of rows is held in memory at a time.
+    """
+    last_id = 0
+    while True:
+        batch = list(
+            Keyframe.objects.filter(object_vector__isnull=True, id__gt=last_id)
+            .only("id", "clip_id", "frame")
+            .order_by("id")[:batch_size]
+        )
+        if not batch:
+            return
+        last_id = batch[-1].id
+        yield batch
+
+def load_decoded_image(kf):
+    """Loads a keyframe image and forces the JPEG decode, so it happens in the loader thread."""
+    img = kf.load_image()
+    if img is None:
+        return None
+    return img.convert("RGB")
+
+def detect_and_store(detector, keyframes, images):
+    """Runs YOLO on already loaded images and stores the vectors with a single bulk_update."""
+    changed = []
+    for kf, vec in zip(keyframes, detector.extract_vector_batch(images)):
+        if vec is not None and np.linalg.norm(vec) > 0:
+            kf.object_vector = Keyframe.compress_array(vec)
+            changed.append(kf)
+
+    Keyframe.objects.bulk_update(changed, ["object_vector"])
+    return len(changed)
+
+def store_object_vectors(detector, keyframes, batch_size=4, log=print):
+    """
+    Detects objects for the given keyframes in batches of batch_size and stores their
+    vectors with one bulk_update per batch. Returns the number of keyframes updated.
+    """
+    updated = 0
+    for i in range(0, len(keyframes), batch_size):
+        batch_kfs = keyframes[i:i + batch_size]
+        images = []
+        valid_kfs = []
+
+        for kf in batch_kfs:
+            img = kf.load_image()
+            if img is not None:
+                images.append(img)
+                valid_kfs.append(kf)
+            else:
+                log(f"Skipping Keyframe {kf.id}: image missing")
+
+        if images:
+            updated += detect_and_store(detector, valid_kfs, images)
+
+    return updated
@@ -0,0 +1,70 @@
+from VideoSearch.management.base import StyledCommand as BaseCommand
+from VideoSearch.utils import model_registry
+from datetime import datetime
+import json
+
+CLIP_MODELS = ["openai/clip-vit-base-patch32", "openai/clip-vit-large-patch14"]
+# timm has no pretrained vit_tiny_patch16_224_dino, so EmbeddingModelSelector's tiny choice cannot be fetched
+DINO_MODELS = ["vit_small_patch16_224_dino", "vit_base_patch16_224_dino"]
+YOLO_MODELS = ["yolov8x.pt"]
+
+class Command(BaseCommand):
+    help = "Download or convert all models once into data/models (safetensors where possible).\nAfterwards imports and the search load them locally and memory-mapped; set MODELS_OFFLINE = True or VIDEOSEARCH_OFFLINE=1 to never contact a model hub."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clip', nargs='*', default=CLIP_MODELS, help='CLIP models to fetch.')
+        parser.add_argument('--dino', nargs='*', default=DINO_MODELS, help='timm DINO models to fetch.')
+        parser.add_argument('--yolo', nargs='*', default=YOLO_MODELS, help='YOLO checkpoints to fetch.')
+        parser.add_argument('--skip-transnet', action='store_true', help='Do not convert the PyTorch TransNetV2 weights to safetensors.')
+        parser.add_argument('--force', action='store_true', help='Fetch models again even if a local artifact exists.')
+
+    def handle(self, *args, **kwargs):
+        jobs = (
+            [("clip", name, model_registry.clip_dir(name), model_registry.fetch_clip) for name in kwargs["clip"]]
+            + [("dino", name, model_registry.dino_file(name), model_registry.fetch_dino) for name in kwargs["dino"]]
+            + [("yolo", name, model_registry.yolo_file(name), model_registry.fetch_yolo) for name in kwargs["yolo"]]
+        )
+        if not kwargs["skip_transnet"]:
+            jobs.append(("transnet", "transnetv2-pytorch", model_registry.TRANSNET_SAFETENSORS, lambda _: model_registry.convert_transnet()))
+
+        manifest_path = model_registry.MODEL_ROOT / "registry.json"
+        manifest = {}
+        if manifest_path.is_file():
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+
+        failed = 0
+        for kind, name, path, fetch in jobs:
+            if path.exists() and not kwargs["force"]:
+                self.stdout.write(self.style_info(f"[{kind}] {name}: already at {path}."))
+                continue
+            try:
+                path = fetch(name)
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style_error(f"[{kind}] {name}: failed: {e}"))
+                continue
+
+            manifest[f"{kind}:{name}"] = {
+                "kind": kind,
+                "name": name,
+                "path": str(path),
+                "bytes": _size(path),
+                "fetched_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            self.stdout.write(self.style_success(f"[{kind}] {name}: stored at {path}."))
+
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+        if failed:
+            self.stdout.write(self.style_warning(f"{failed} model(s) could not be fetched."))
+        else:
+            self.stdout.write(self.style_success("All models are available locally."))
+        self.stdout.write(self.style_info("The TensorFlow TransNetV2 SavedModel ships with the repository and needs no fetching."))
+
+def _size(path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
@@ -1,38 +1,57 @@
 from VideoSearch.management.base import StyledCommand as BaseCommand
 from django.core.management import call_command
-import torch
 
 class Command(BaseCommand):
     help = "Run full import pipeline with default parameters."
 
     def add_arguments(self, parser):
-        parser.add_argument('--workers_clip', type=int, default=None, help="Number of multiprocessing workers to use for clip/keyframe extraction.")
-        parser.add_argument('--workers_keyframes', type=int, default=None, help="Number of multiprocessing workers to use for clip/keyframe extraction.")
+        parser.add_argument('--workers_clip', type=int, default=None, help="Number of multiprocessing workers to use for clip extraction (default: machine profile, see tune_import).")
+        parser.add_argument('--workers_keyframes', type=int, default=None, help="Number of multiprocessing workers to use for keyframe extraction (default: machine profile, see tune_import).")
+        parser.add_argument('--streaming', action='store_true', help="Run all stages concurrently per video (see stream_import) instead of one stage after another.")
+        parser.add_argument('--skip-proxies', action='store_true', help="Do not encode the preview proxies of the detailed view (see build_proxies).")
+        parser.add_argument('--inline-objects', action='store_true', help="Detect objects during keyframe extraction instead of in a separate pass over the stored keyframes.")
 
     def handle(self, *args, **kwargs):
-        from multiprocessing import cpu_count
-
-        worker_clip = kwargs.get("workers_clip")
-        worker_keyframes = kwargs.get("workers_keyframes")
-        worker_clip = worker_clip if worker_clip is not None else min(1, cpu_count())
-        worker_keyframes = worker_keyframes if worker_keyframes is not None else min(1, cpu_count())
+        # without explicit worker counts the stage commands use their own defaults, which
+        # come from the machine profile written by tune_import; the keyframe settings are the
+        # stage commands' defaults too, so full_import extracts the same keyframes as they do
+        clip_workers = {"workers": kwargs["workers_clip"]} if kwargs.get("workers_clip") is not None else {}
+        keyframe_workers = {"workers": kwargs["workers_keyframes"]} if kwargs.get("workers_keyframes") is not None else {}
+
+        if kwargs.get("streaming"):
+            self.stdout.write(self.style_info("=== Streaming Import ==="))
+            streaming_workers = {}
+            if clip_workers:
+                streaming_workers["segment_workers"] = clip_workers["workers"]
+            if keyframe_workers:
+                streaming_workers["keyframe_workers"] = keyframe_workers["workers"]
+            call_command(
+                "stream_import",
+                inline_objects=kwargs.get("inline_objects", False),
+                **streaming_workers,
+            )
+            self.build_proxies(kwargs)
+            self.stdout.write(self.style_success("Full import completed."))
+            return
 
         self.stdout.write(self.style_info("=== Importing Videos ==="))
         call_command("import_videos")
 
         self.stdout.write(self.style_info("=== Extracting Clips ==="))
-        call_command("extract_clips", workers=worker_clip)
+        call_command("extract_clips", **clip_workers)
 
         self.stdout.write(self.style_info("=== Extracting Keyframes ==="))
-        keyframe_kwargs = {
-            "search_range_factor": 0.95 if torch.cuda.is_available() else 0.5,
-            "frames_to_compare": 50 if torch.cuda.is_available() else 5,
-            "workers": worker_keyframes
-        }
-        call_command("extract_keyframes", **keyframe_kwargs)
+        call_command("extract_keyframes", detect_objects=kwargs.get("inline_objects", False), **keyframe_workers)
 
-        self.stdout.write(self.style_info("=== Extracting Objects ==="))
+        if not kwargs.get("inline_objects"):
+            self.stdout.write(self.style_info("=== Extracting Objects ==="))
+            call_command("extract_objects")
 
-        call_command("extract_objects", batch_size = 4)
+        self.build_proxies(kwargs)
+        self.stdout.write(self.style_success("Full import completed."))
 
-        self.stdout.write(self.style_success("Full import completed."))
\ No newline at end of file
+    def build_proxies(self, kwargs):
+        if kwargs.get("skip_proxies"):
+            return
+        self.stdout.write(self.style_info("=== Building Proxies ==="))
+        call_command("build_proxies")
@@ -1,11 +1,18 @@
 from VideoSearch.management.base import StyledCommand as BaseCommand
-from VideoSearch.models import Video
+from VideoSearch.models import Video, Clip, VideoPredictionCache
+from VideoSearch.utils.purge import purge_videos, purge_clips
+from VideoSearch.utils.proxies import remove_proxies
+from VideoSearch.utils.probe import probe_files, prune_probes, DEFAULT_PROBE_WORKERS
+from VideoSearch.utils.manifest import content_hash
+from django.db import transaction
 from pathlib import Path
-import subprocess
-import time
 
 class Command(BaseCommand):
-    help = "Scan video directory (\'.data/videos/\') and import metadata into the database."
+    help = "Scan video directory (\'.data/videos/\') and import metadata into the database.\nFiles are probed once with ffprobe in parallel; probes are cached by path, size and modification time, so rescans only probe new or changed files.\nVideos are matched by a content fingerprint: renamed or moved files keep their clips and keyframes, only videos whose content changed are processed again."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=DEFAULT_PROBE_WORKERS, help='Concurrent ffprobe processes.')
+        parser.add_argument('--no-cache', action='store_true', help='Probe every file again instead of reusing cached probes.')
 
     def handle(self, *args, **kwargs):
         video_dir = Path('./data/videos')
@@ -14,164 +21,163 @@ class Command(BaseCommand):
             video_dir.mkdir(parents=True)
             self.stdout.write(self.style_warning(f"Directory '{video_dir}' did not exist, created it. Place videos into the folder and run the command again."))
 
-        video_files = [f for f in video_dir.rglob('*') if is_valid_video(f)]
+        files = [f for f in video_dir.rglob('*') if f.is_file()]
+        probes = probe_files(files, workers=kwargs.get("workers", DEFAULT_PROBE_WORKERS), use_cache=not kwargs.get("no_cache"),
+                             log=lambda msg: self.stdout.write(self.style_info(msg)))
+        prune_probes(video_dir, set(probes))
+
+        probes = {path: probe for path, probe in probes.items() if probe.is_video}
+        video_files = [f for f in files if str(f.resolve()) in probes]
 
-        valid_paths = set(str(f.resolve()) for f in video_files)
-        self.remove_stale_videos(valid_paths)
+        self.sync_videos(probes)
 
         if not video_files:
             self.stdout.write(self.style_warning(f"Directory '{video_dir}' is empty or contains no supported video files."))
             return
 
         for full_path in video_files:
-            self.import_video_file(full_path)
+            self.import_video_file(full_path, probes[str(full_path.resolve())].metadata())
+
+    def sync_videos(self, probes):
+        """
+        Reconciles imported videos with the files on disk using their content manifest
+        (size, mtime and a sampled content hash) instead of deleting and importing again:
+        unchanged or only touched files are kept, moved files are re-pointed, and only videos whose
+        content changed lose their clips and keyframes. Videos without a file are deleted.
+
+        :param probes: Dict of resolved path -> VideoProbe of all videos present on disk.
+        """
+        deleted, renamed, changed = [], [], []
+        deleted_ids = []
+        missing = []
+        known_paths = set()
+
+        for video in Video.objects.all():
+            db_path = str(Path(video.file_path).resolve())   # Note: DB paths should be resolved but we are doing it again here just as a fallback if the paths are corrupted.
+            known_paths.add(db_path)
+            probe = probes.get(db_path)
+            if probe is None:
+                missing.append(video)
+                continue
 
-    def remove_stale_videos(self, valid_paths):
-        db_videos = list(Video.objects.all())
-        deleted_filenames = []
+            meta = probe.metadata()
+            if not meta or not meta['frame_count']:
+                deleted.append(Path(db_path).name)
+                deleted_ids.append(video.id)
+                continue
 
-        for video in db_videos:
-            db_path = Path(video.file_path).resolve()   # Note: DB paths should be resolved but we are doing it again here just as a fallback if the paths are corrupted.
-            if str(db_path) not in valid_paths:
-                deleted_filenames.append(db_path.name)
-                video.delete()
+            if video.file_size == probe.size and video.file_mtime_ns == probe.mtime_ns:
                 continue
 
-            meta = self.get_video_metadata(db_path, False)
-            if not meta:
-                deleted_filenames.append(db_path.name)
-                video.delete()
+            digest = content_hash(db_path)
+            if digest == video.content_hash or (not video.content_hash and metadata_matches(video, meta)):
+                # only touched, or imported before the manifest existed: keep all derived data
+                set_fingerprint(video, probe, digest)
+                video.save(update_fields=["file_size", "file_mtime_ns", "content_hash"])
                 continue
 
-            new_resolution = f"{meta['width']}x{meta['height']}"
-            if (
-                (video.frame_count != meta['frame_count'] and meta['frame_count'] != None) or
-                video.fps_num != meta['fps_num'] or
-                video.fps_den != meta['fps_den'] or
-                video.resolution != new_resolution
-            ):
-                deleted_filenames.append(db_path.name)
-                video.delete()
-
-        if deleted_filenames:
-            self.stdout.write(self.style_info(f"Removed {len(deleted_filenames)} video(s) no longer present:"))
-            for name in deleted_filenames:
-                self.stdout.write(self.style_info(f"  - {name}"))
-
-    def import_video_file(self, full_path):
+            reset_video(video, meta, probe, digest)
+            changed.append(Path(db_path).name)
+
+        # a new file with the fingerprint of a missing video is the same video, moved or renamed
+        missing_by_size = {}
+        for video in missing:
+            if video.content_hash:
+                missing_by_size.setdefault(video.file_size, []).append(video)
+
+        for path, probe in probes.items():
+            candidates = missing_by_size.get(probe.size)
+            if path in known_paths or not candidates:
+                continue
+            digest = content_hash(path)
+            match = next((video for video in candidates if video.content_hash == digest), None)
+            if match is None:
+                continue
+            candidates.remove(match)
+            missing.remove(match)
+            renamed.append(f"{Path(match.file_path).name} -> {Path(path).name}")
+            match.file_path = path
+            set_fingerprint(match, probe, digest)
+            match.save()
+
+        for video in missing:
+            deleted.append(Path(video.file_path).name)
+            deleted_ids.append(video.id)
+        if deleted_ids:
+            purge_videos(deleted_ids)
+
+        for title, names in (("Re-linked {} moved or renamed video(s):", renamed),
+                             ("Content changed, reprocessing {} video(s):", changed),
+                             ("Removed {} video(s) no longer present:", deleted)):
+            if names:
+                self.stdout.write(self.style_info(title.format(len(names))))
+                for name in names:
+                    self.stdout.write(self.style_info(f"  - {name}"))
+
+    def import_video_file(self, full_path, meta=None):
+        """
+        Imports a single video file and returns its Video (None if it cannot be imported).
+
+        :param meta: Metadata from a previous probe; the file is probed (or read from the probe cache) if None.
+        """
         resolved_path = str(full_path.resolve())
-        if Video.objects.filter(file_path=resolved_path).exists():
+        existing = Video.objects.filter(file_path=resolved_path).first()
+        if existing:
             self.stdout.write(self.style_info(f"Already imported: {full_path.name} - skipping."))
-            return
+            return existing
 
-        meta = self.get_video_metadata(full_path)
+        if meta is None:
+            meta = self.get_video_metadata(full_path)
         if not meta:
             self.stdout.write(self.style_warning(f"Could not read metadata for {full_path.name} - skipping."))
-            return
+            return None
         if not meta['frame_count']:
             self.stdout.write(self.style_warning(f"{full_path.name} has 0 frames - skipping."))
-            return
+            return None
 
+        stat = full_path.stat()
         video = Video.objects.create(
             frame_count=meta['frame_count'],
             fps_num=meta['fps_num'],
             fps_den=meta['fps_den'],
             resolution=f"{meta['width']}x{meta['height']}",
             file_path=resolved_path,
+            file_size=stat.st_size,
+            file_mtime_ns=stat.st_mtime_ns,
+            content_hash=content_hash(full_path),
         )
         self.stdout.write(self.style_success(f"Imported {full_path.name} (ID {video.id})"))
+        return video
 
     def get_video_metadata(self, file_path, use_fallback = True):
-        try:
-            cmd = [
-                'ffprobe', '-v', 'error',
-                '-select_streams', 'v:0',
-                '-show_entries', 'stream=width,height,r_frame_rate,nb_frames',
-                '-of', 'default=noprint_wrappers=1:nokey=1',
-                str(file_path)
-            ]
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            output = result.stdout.decode().strip().split('\n')
-
-            width = int(output[0])
-            height = int(output[1])
-            fps_num, fps_den = map(int, output[2].split('/'))
-
-            try:
-                nb_frames = int(output[3])
-            except (IndexError, ValueError):
-                nb_frames = None
-
-            if not nb_frames and use_fallback:
-                self.stdout.write(self.style_warning(f"nb_frames not found in metadata, using fallback (this may take a while!): {file_path.name}"))
-                count_cmd = [
-                    'ffprobe', '-v', 'error',
-                    '-select_streams', 'v:0',
-                    '-count_frames',
-                    '-show_entries', 'stream=nb_read_frames',
-                    '-of', 'default=noprint_wrappers=1:nokey=1',
-                    str(file_path)
-                ]
-                count_result = subprocess.run(count_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                count_output = count_result.stdout.decode().strip()
-                if count_output.isdigit():
-                    nb_frames = int(count_output)
-
-                if not nb_frames:
-                    self.stdout.write(self.style_warning(f"{file_path.name}: ffprobe failed, decoding video to count frames..."))
-                    ffmpeg_cmd = [
-                        'ffmpeg', '-i', str(file_path),
-                        '-map', '0:v:0', '-f', 'null', '-'
-                    ]
-
-                    frame_count = 0
-                    last_print_time = time.time()
-
-                    try:
-                        process = subprocess.Popen(ffmpeg_cmd, stderr=subprocess.PIPE, universal_newlines=True)
-
-                        for line in process.stderr:
-                            if 'frame=' in line:
-                                parts = line.strip().split()
-                                for part in parts:
-                                    if part.startswith("frame="):
-                                        try:
-                                            current_frame = int(part.split('=')[1])
-                                            if current_frame > frame_count:
-                                                frame_count = current_frame
-                                        except ValueError:
-                                            continue
-
-                            if time.time() - last_print_time > 1:
-                                print(f"\r  → Decoded frames: {frame_count}", end='', flush=True)
-                                last_print_time = time.time()
-
-                        process.wait()
-                        self.stdout.write(self.style_success(f"Fully decoded video! Number of frames: {frame_count}"))
-                        nb_frames = frame_count if frame_count > 0 else None
-
-                    except Exception as decode_error:
-                        self.stdout.write(self.style_error(f"Error during ffmpeg decoding fallback: {decode_error}"))
-
-            return {
-                'width': width,
-                'height': height,
-                'fps_num': fps_num,
-                'fps_den': fps_den,
-                'frame_count': nb_frames
-            }
-        except Exception as e:
-            print(f"ffprobe failed: {e}")
-            return None
-
-def is_valid_video(file_path):
-    try:
-        result = subprocess.run(
-            ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
-             '-show_entries', 'stream=codec_type', '-of', 'default=nw=1', file_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        return 'codec_type=video' in result.stdout.decode()
-    except Exception:
-        return False
\ No newline at end of file
+        probe = probe_files([file_path], workers=1, count_fallback=use_fallback,
+                            log=lambda msg: self.stdout.write(self.style_warning(msg))).get(str(Path(file_path).resolve()))
+        return probe.metadata() if probe is not None else None
+
+def metadata_matches(video, meta) -> bool:
+    return (
+        video.frame_count == meta['frame_count'] and
+        video.fps_num == meta['fps_num'] and
+        video.fps_den == meta['fps_den'] and
+        video.resolution == f"{meta['width']}x{meta['height']}"
+    )
+
+def set_fingerprint(video, probe, digest):
+    video.file_size = probe.size
+    video.file_mtime_ns = probe.mtime_ns
+    video.content_hash = digest
+
+def reset_video(video, meta, probe, digest):
+    """Drops everything derived from the old content of a video and stores its new metadata; the video keeps its ID."""
+    with transaction.atomic():
+        purge_clips(Clip.objects.filter(video=video).values_list("id", flat=True))
+        VideoPredictionCache.objects.filter(video=video).delete()
+        video.frame_count = meta['frame_count']
+        video.fps_num = meta['fps_num']
+        video.fps_den = meta['fps_den']
+        video.resolution = f"{meta['width']}x{meta['height']}"
+        video.clip_params_hash = ""
+        video.proxy_hash = ""
+        set_fingerprint(video, probe, digest)
+        video.save()
+    remove_proxies([video.id])
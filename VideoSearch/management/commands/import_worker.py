@@ -0,0 +1,163 @@
+from VideoSearch.management.base import StyledCommand as BaseCommand
+from VideoSearch.management.commands.extract_clips import DEFAULT_CLIP_EXTRACTION_SETTINGS
+from VideoSearch.management.commands.extract_keyframes import add_keyframe_arguments
+from VideoSearch.models import ImportJob
+from VideoSearch.utils.shot_boundaries import TRANSNET_BACKENDS
+from VideoSearch.utils.frame_hash import DEFAULT_DEDUP_TOLERANCE
+import threading
+import socket
+import os
+import time
+
+class Command(BaseCommand):
+    help = "Process import jobs from the database queue (see enqueue_import_jobs).\nAny number of workers, on one machine or many sharing the database, can run at once; jobs of crashed workers are picked up again after their lease expires."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stages', nargs='+', choices=ImportJob.STAGES, default=ImportJob.STAGES, help='Stages this worker processes.')
+        parser.add_argument('--lease-seconds', type=int, default=300, help='Lease duration; a job is reclaimed if its worker stops heartbeating for this long.')
+        parser.add_argument('--heartbeat-seconds', type=int, default=60, help='Interval at which leases of running jobs are renewed.')
+        parser.add_argument('--max-attempts', type=int, default=3, help='Attempts before a job is marked failed.')
+        parser.add_argument('--poll-seconds', type=float, default=10.0, help='Wait time when no job is available.')
+        parser.add_argument('--exit-when-idle', action='store_true', help='Stop once no claimable jobs are left instead of polling.')
+        parser.add_argument('--threads', type=int, default=None, help='Threads of TransNetV2 and the embedding models (default: all cores).')
+
+        parser.add_argument('--backend', choices=TRANSNET_BACKENDS, default="tensorflow", help='Framework used for TransNetV2 inference.')
+        parser.add_argument('--batch-size', type=int, default=16, help='Number of 100-frame windows per TransNetV2 inference call.')
+        for key, default in DEFAULT_CLIP_EXTRACTION_SETTINGS.items():
+            arg_type = float if isinstance(default, float) else int
+            parser.add_argument(f"--{key.replace('_', '-')}", type=arg_type, default=default)
+
+        add_keyframe_arguments(parser)
+        parser.add_argument('--object-batch', type=int, default=4, help='Keyframes per YOLO inference call.')
+        parser.add_argument('--dedup-tolerance', type=float, default=DEFAULT_DEDUP_TOLERANCE, help='Mean thumbnail difference below which sampled frames skip model inference (0, the default, disables it; try 0.02).')
+        parser.add_argument('--quantize-embeddings', action='store_true', help='Run CLIP and DINO int8-quantized on the CPU.')
+
+    def handle(self, *args, **kwargs):
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.kwargs = kwargs
+        self.contexts = {}
+        self.stdout.write(self.style_info(f"Import worker {owner} processing stages: {', '.join(kwargs['stages'])}"))
+
+        processed = 0
+        while True:
+            job = self.claim_next(owner)
+            if job is None:
+                if kwargs.get("exit_when_idle"):
+                    break
+                time.sleep(kwargs["poll_seconds"])
+                continue
+
+            self.run_job(job)
+            processed += 1
+            if not self.kwargs["stages"]:
+                self.stdout.write(self.style_error("This worker cannot run any of its stages."))
+                break
+
+        self.stdout.write(self.style_success(f"No jobs left. Processed {processed} job(s)."))
+
+    def claim_next(self, owner):
+        # later stages first, so started videos are finished before new ones are begun
+        for stage in reversed(self.kwargs["stages"]):
+            jobs = ImportJob.claim(stage, owner, lease_seconds=self.kwargs["lease_seconds"], max_attempts=self.kwargs["max_attempts"])
+            if jobs:
+                return jobs[0]
+        return None
+
+    def run_job(self, job):
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self.heartbeat, args=(job, stop), daemon=True)
+        heartbeat.start()
+
+        try:
+            HANDLERS[job.stage](self, job)
+        except StageUnavailable as e:
+            job.release()
+            self.kwargs["stages"] = [stage for stage in self.kwargs["stages"] if stage != job.stage]
+            self.stdout.write(self.style_warning(f"{job} returned to the queue: {e} This worker no longer takes {job.stage} jobs."))
+        except Exception as e:
+            job.fail(str(e), max_attempts=self.kwargs["max_attempts"])
+            self.stdout.write(self.style_error(f"{job} failed: {e}"))
+        else:
+            if job.complete():
+                self.stdout.write(self.style_success(f"{job} completed."))
+            else:
+                self.stdout.write(self.style_warning(f"{job} lost its lease before completing; result kept, another worker may repeat it."))
+        finally:
+            stop.set()
+            heartbeat.join()
+
+    def heartbeat(self, job, stop):
+        from django.db import connection
+        try:
+            while not stop.wait(self.kwargs["heartbeat_seconds"]):
+                if not job.heartbeat(self.kwargs["lease_seconds"]):
+                    self.stdout.write(self.style_warning(f"{job}: lease was taken over by another worker."))
+                    return
+        finally:
+            connection.close()
+
+    def context(self, stage, factory, key=None):
+        """Loads a stage's model the first time this worker needs it, and again when key (e.g. the job's models) changes."""
+        cached = self.contexts.get(stage)
+        if cached is None or cached[0] != key:
+            self.contexts.pop(stage, None)
+            self.contexts[stage] = (key, factory())
+        return self.contexts[stage][1]
+
+class StageUnavailable(Exception):
+    """This worker cannot run jobs of a stage, e.g. because it cannot load the job's models."""
+
+def run_clips_job(command, job):
+    from VideoSearch.management.commands.extract_clips import process_videos_for_clips
+    from VideoSearch.management.commands.stream_import import init_segmenter
+    from VideoSearch.models import ClipPredictionCache
+
+    model = command.context(job.stage, lambda: init_segmenter(command.kwargs))
+    for msg in process_videos_for_clips([job.video_id], command.kwargs, model=model):
+        command.stdout.write(command.style_info(msg))
+
+    for entry in ClipPredictionCache.objects.select_related("clip").filter(clip__video_id=job.video_id):
+        ImportJob.enqueue(ImportJob.STAGE_KEYFRAMES, job.video, entry.clip, models=job.embedding_models)
+
+def run_keyframes_job(command, job):
+    from VideoSearch.management.commands.extract_keyframes import process_clip_entry
+    from VideoSearch.management.commands.stream_import import init_keyframe_extractor
+    from VideoSearch.models import ClipPredictionCache
+
+    entry = ClipPredictionCache.objects.select_related("clip", "clip__video").filter(clip_id=job.clip_id).first()
+    if entry is not None:  # no cache entry means the keyframes were already extracted
+        models = job.embedding_models
+        if models is None:
+            raise ValueError("Job was enqueued without embedding models. Run enqueue_import_jobs to assign them.")
+        kwargs = command.kwargs
+        try:
+            feature_extractor, _ = command.context(job.stage, lambda: init_keyframe_extractor(
+                quantize=kwargs["quantize_embeddings"], dedup_tolerance=kwargs["dedup_tolerance"], num_threads=kwargs["threads"], models=models,
+            ), key=models)
+        except Exception as e:
+            raise StageUnavailable(f"Cannot load CLIP={models[0]}, DINO={models[1] or 'none'} ({e}).") from e
+        process_clip_entry(
+            entry,
+            feature_extractor,
+            command.kwargs["threshold"],
+            command.kwargs["search_range_factor"],
+            command.kwargs["frames_to_compare"],
+        )
+
+    ImportJob.enqueue(ImportJob.STAGE_OBJECTS, job.video, job.clip, models=job.embedding_models)
+
+def run_objects_job(command, job):
+    from VideoSearch.management.commands.extract_objects import store_object_vectors
+    from VideoSearch.management.commands.stream_import import init_object_detector
+    from VideoSearch.models import Keyframe
+
+    keyframes = list(Keyframe.objects.select_related("clip").filter(clip_id=job.clip_id, object_vector__isnull=True))
+    if keyframes:
+        detector = command.context(job.stage, init_object_detector)
+        store_object_vectors(detector, keyframes, batch_size=command.kwargs["object_batch"])
+
+HANDLERS = {
+    ImportJob.STAGE_CLIPS: run_clips_job,
+    ImportJob.STAGE_KEYFRAMES: run_keyframes_job,
+    ImportJob.STAGE_OBJECTS: run_objects_job,
+}
@@ -0,0 +1,41 @@
+from VideoSearch.management.base import StyledCommand as BaseCommand
+from VideoSearch.management.commands.extract_clips import DEFAULT_CLIP_EXTRACTION_SETTINGS, store_clips
+from VideoSearch.models import Video, VideoPredictionCache
+
+class Command(BaseCommand):
+    help = "Recompute clips from stored shot-boundary predictions with new segmentation settings.\nUnchanged clips keep their keyframes; TransNetV2 is not run again."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--videos', type=int, nargs='*', default=None, help='Only re-segment these video IDs.')
+        for key, default in DEFAULT_CLIP_EXTRACTION_SETTINGS.items():
+            arg_name = f"--{key.replace('_', '-')}"
+            arg_type = float if isinstance(default, float) else int
+
+            if key == "passes":
+                parser.add_argument(arg_name, type=arg_type, default=default, choices=range(1, 101),
+                                    help="Number of detection passes (1-100)")
+            else:
+                parser.add_argument(arg_name, type=arg_type, default=default)
+
+    def handle(self, *args, **kwargs):
+        caches = VideoPredictionCache.objects.select_related("video")
+        if kwargs.get("videos"):
+            caches = caches.filter(video_id__in=kwargs["videos"])
+
+        missing = Video.objects.filter(videopredictioncache__isnull=True).count()
+        if missing:
+            self.stdout.write(self.style_warning(f"{missing} video(s) have no stored predictions. Run extract_clips --backfill-predictions to create them."))
+
+        totals = [0, 0, 0]
+        for cache in caches.iterator(chunk_size=100):
+            counts = store_clips(cache.video, cache.load_predictions(), **kwargs)
+            totals = [total + count for total, count in zip(totals, counts)]
+
+            kept, created, removed = counts
+            if created or removed:
+                self.stdout.write(self.style_info(f"{cache.video.file_name}: kept {kept}, created {created}, removed {removed} clip(s)."))
+
+        kept, created, removed = totals
+        self.stdout.write(self.style_success(f"Re-segmentation complete: kept {kept}, created {created}, removed {removed} clip(s)."))
+        if created:
+            self.stdout.write(self.style_info("Run extract_keyframes to process the new clips."))
@@ -0,0 +1,159 @@
+from VideoSearch.management.base import StyledCommand as BaseCommand
+from VideoSearch.management.commands.extract_clips import DEFAULT_CLIP_EXTRACTION_SETTINGS
+from VideoSearch.management.commands.extract_keyframes import add_keyframe_arguments
+from VideoSearch.utils.shot_boundaries import TRANSNET_BACKENDS
+from VideoSearch.utils.frame_hash import DEFAULT_DEDUP_TOLERANCE
+from pathlib import Path
+import time
+
+class Command(BaseCommand):
+    help = "Import videos through a streaming pipeline: probing, clip segmentation, keyframe extraction and object detection run concurrently, connected by bounded queues.\nEach video becomes searchable as soon as it passed all stages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--probe-workers', type=int, default=2, help='Threads probing and importing video files.')
+        parser.add_argument('--segment-workers', type=int, default=1, help='Threads running TransNetV2 (each loads its own model).')
+        parser.add_argument('--segment-batch', type=int, default=4, help='Videos whose windows are batched together during segmentation.')
+        parser.add_argument('--keyframe-workers', type=int, default=1, help='Threads extracting keyframes (each loads its own embedding models).')
+        parser.add_argument('--object-workers', type=int, default=1, help='Threads running object detection (each loads its own YOLO model).')
+        parser.add_argument('--object-batch', type=int, default=4, help='Keyframes per YOLO inference call.')
+        parser.add_argument('--inline-objects', action='store_true', help='Detect objects inside the keyframe workers on the freshly decoded keyframes instead of in a separate stage.')
+        parser.add_argument('--queue-size', type=int, default=8, help='Capacity of the queue in front of every stage.')
+        parser.add_argument('--stats-interval', type=float, default=30.0, help='Seconds between throughput reports.')
+        parser.add_argument('--watch', type=float, default=None, help='Keep running and rescan the video directory every WATCH seconds. A file is imported once it is unchanged between two scans, so files still being copied wait.')
+
+        parser.add_argument('--backend', choices=TRANSNET_BACKENDS, default="tensorflow", help='Framework used for TransNetV2 inference.')
+        parser.add_argument('--batch-size', type=int, default=16, help='Number of 100-frame windows per TransNetV2 inference call.')
+        for key, default in DEFAULT_CLIP_EXTRACTION_SETTINGS.items():
+            arg_type = float if isinstance(default, float) else int
+            parser.add_argument(f"--{key.replace('_', '-')}", type=arg_type, default=default)
+
+        add_keyframe_arguments(parser)
+        parser.add_argument('--dedup-tolerance', type=float, default=DEFAULT_DEDUP_TOLERANCE, help='Mean thumbnail difference below which sampled frames skip model inference (0, the default, disables it; try 0.02).')
+        parser.add_argument('--quantize-embeddings', action='store_true', help='Run CLIP and DINO int8-quantized on the CPU.')
+
+    def handle(self, *args, **kwargs):
+        from VideoSearch.utils.pipeline import Pipeline, Stage
+
+        video_dir = Path('./data/videos')
+        if not video_dir.exists():
+            video_dir.mkdir(parents=True)
+            self.stdout.write(self.style_warning(f"Directory '{video_dir}' did not exist, created it. Place videos into the folder and run the command again."))
+
+        queue_size = kwargs["queue_size"]
+        log = lambda msg: self.stdout.write(self.style_info(msg))
+        stages = [
+            Stage("probe", self.probe_stage(), workers=kwargs["probe_workers"], queue_size=queue_size),
+            Stage("segment", segment_stage(kwargs, log), workers=kwargs["segment_workers"], batch_size=kwargs["segment_batch"],
+                  init=lambda: init_segmenter(kwargs), queue_size=queue_size),
+            Stage("keyframes", keyframe_stage(kwargs), workers=kwargs["keyframe_workers"],
+                  init=lambda: init_keyframe_extractor(kwargs.get("inline_objects", False), kwargs.get("quantize_embeddings", False), kwargs.get("dedup_tolerance", DEFAULT_DEDUP_TOLERANCE)), queue_size=queue_size),
+        ]
+        if not kwargs.get("inline_objects"):
+            stages.append(Stage("objects", object_stage(kwargs, log), workers=kwargs["object_workers"], batch_size=kwargs["object_batch"],
+                                init=init_object_detector, queue_size=queue_size))
+
+        pipeline = Pipeline(stages, log=log, stats_interval=kwargs["stats_interval"])
+        pipeline.run(self.scan_videos(video_dir, kwargs.get("watch")))
+
+        self.stdout.write(self.style_success("Streaming import completed."))
+
+    def scan_videos(self, video_dir, watch=None):
+        """
+        Yields video files of the directory; in watch mode new files are yielded as they appear.
+        Files are remembered with their size and mtime, so a file that did not probe as a video
+        yet is probed again once it changes. In watch mode a file is only probed once its size
+        and mtime did not change since the previous scan: a file that is still being copied can
+        already probe as a video with a truncated frame count, and an imported video is never
+        imported again.
+        """
+        from VideoSearch.utils.probe import probe_files
+
+        seen, previous = {}, {}
+        while True:
+            new_paths, current = [], {}
+            for path in sorted(video_dir.rglob('*')):
+                if not path.is_file():
+                    continue
+                stat = path.stat()
+                current[path] = (stat.st_size, stat.st_mtime_ns)
+                if seen.get(path) == current[path] or (watch is not None and previous.get(path) != current[path]):
+                    continue
+                seen[path] = current[path]
+                new_paths.append(path)
+            previous = current
+            probes = probe_files(new_paths) if new_paths else {}
+            for path in new_paths:
+                probe = probes.get(str(path.resolve()))
+                if probe is not None and probe.is_video:
+                    yield path
+
+            if watch is None:
+                return
+            time.sleep(watch)
+
+    def probe_stage(self):
+        from VideoSearch.management.commands.import_videos import Command as ImportCommand
+
+        importer = ImportCommand(stdout=self.stdout, stderr=self.stderr)
+
+        def process(context, paths):
+            videos = [importer.import_video_file(path) for path in paths]
+            return [video.id for video in videos if video is not None]
+        return process
+
+def init_segmenter(kwargs):
+    from VideoSearch.utils.shot_boundaries import load_transnet
+    return load_transnet(kwargs["backend"], threads=kwargs.get("threads"))
+
+def segment_stage(kwargs, log=print):
+    def process(model, video_ids):
+        from VideoSearch.management.commands.extract_clips import process_videos_for_clips
+        for msg in process_videos_for_clips(video_ids, kwargs, model=model):
+            log(f"[ClipExtraction] {msg}")
+        return video_ids
+    return process
+
+def init_keyframe_extractor(detect_objects=False, quantize=False, dedup_tolerance=DEFAULT_DEDUP_TOLERANCE, num_threads=None, models=None):
+    """
+    Returns (feature_extractor, object_detector); the detector is None unless objects are detected inline.
+
+    :param models: (clip_model_name, dino_model_name, mode); chosen for this machine if None.
+    """
+    from VideoSearch.utils.visual_feature_extractor import VisualFeatureExtractor
+    feature_extractor = VisualFeatureExtractor(command=None, num_threads=num_threads, quantize=quantize, dedup_tolerance=dedup_tolerance, models=models)
+    return feature_extractor, init_object_detector() if detect_objects else None
+
+def keyframe_stage(kwargs):
+    def process(context, video_ids):
+        from VideoSearch.models import ClipPredictionCache
+        from VideoSearch.management.commands.extract_keyframes import process_clip_entry
+
+        feature_extractor, object_detector = context
+        entries = ClipPredictionCache.objects.select_related("clip", "clip__video").filter(clip__video_id__in=video_ids)
+        for entry in entries:
+            process_clip_entry(
+                entry,
+                feature_extractor,
+                kwargs["threshold"],
+                kwargs["search_range_factor"],
+                kwargs["frames_to_compare"],
+                object_detector=object_detector,
+                object_batch=kwargs["object_batch"],
+            )
+        return video_ids
+    return process
+
+def init_object_detector():
+    from VideoSearch.utils.objects import ObjectDetector
+    return ObjectDetector()
+
+def object_stage(kwargs, log=print):
+    def process(detector, video_ids):
+        from VideoSearch.models import Keyframe
+        from VideoSearch.management.commands.extract_objects import store_object_vectors
+
+        keyframes = list(Keyframe.objects.select_related("clip").filter(clip__video_id__in=video_ids, object_vector__isnull=True))
+        updated = store_object_vectors(detector, keyframes, batch_size=kwargs["object_batch"])
+        log(f"[ObjectExtraction] Stored {updated} object vector(s) for {len(video_ids)} video(s).")
+        return video_ids
+    return process
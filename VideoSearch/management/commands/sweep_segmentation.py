@@ -0,0 +1,70 @@
+from VideoSearch.management.base import StyledCommand as BaseCommand
+from VideoSearch.management.commands.extract_clips import DEFAULT_CLIP_EXTRACTION_SETTINGS
+from VideoSearch.models import VideoPredictionCache
+from VideoSearch.utils.shot_boundaries import multipass_schedule, sweep_accepted_cuts
+import numpy as np
+import itertools
+import csv
+
+class Command(BaseCommand):
+    help = "Evaluate a grid of clip segmentation settings on stored shot-boundary predictions.\nEvery setting option accepts several values; all combinations are evaluated at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--videos', type=int, nargs='*', default=None, help='Only evaluate these video IDs.')
+        parser.add_argument('--short-seconds', type=float, default=1.0, help='Clips shorter than this are reported as short.')
+        parser.add_argument('--csv', type=str, default=None, help='Also write the results to this CSV file.')
+        for key, default in DEFAULT_CLIP_EXTRACTION_SETTINGS.items():
+            arg_name = f"--{key.replace('_', '-')}"
+            arg_type = float if isinstance(default, float) else int
+            parser.add_argument(arg_name, type=arg_type, nargs='+', default=[default])
+
+    def handle(self, *args, **kwargs):
+        keys = list(DEFAULT_CLIP_EXTRACTION_SETTINGS)
+        grid = [dict(zip(keys, values)) for values in itertools.product(*(kwargs[key] for key in keys))]
+
+        caches = VideoPredictionCache.objects.select_related("video")
+        if kwargs.get("videos"):
+            caches = caches.filter(video_id__in=kwargs["videos"])
+
+        self.stdout.write(self.style_info(f"Evaluating {len(grid)} setting(s) on {caches.count()} video(s)."))
+
+        clip_seconds = [[] for _ in grid]
+        for cache in caches.iterator(chunk_size=100):
+            predictions = cache.load_predictions()
+            if len(predictions) == 0:
+                continue
+
+            fps = cache.video.fps()
+            schedules = [multipass_schedule(fps=fps, **setting) for setting in grid]
+            accepted, candidates = sweep_accepted_cuts(predictions, schedules)
+
+            for i in range(len(grid)):
+                cuts = candidates[accepted[:, i]]
+                bounds = np.concatenate([[-1], cuts, [len(predictions) - 1]])
+                clip_seconds[i].append((np.diff(bounds) / fps).astype(np.float32))
+
+        rows = []
+        for setting, seconds in zip(grid, clip_seconds):
+            seconds = np.concatenate(seconds) if seconds else np.zeros(0, dtype=np.float32)
+            rows.append({
+                **setting,
+                "clips": len(seconds),
+                "mean_seconds": float(seconds.mean()) if len(seconds) else 0.0,
+                "median_seconds": float(np.median(seconds)) if len(seconds) else 0.0,
+                "short_share": float((seconds < kwargs["short_seconds"]).mean()) if len(seconds) else 0.0,
+            })
+
+        header = keys + ["clips", "mean_seconds", "median_seconds", "short_share"]
+        self.stdout.write(" | ".join(f"{name:>16}" for name in header))
+        for row in rows:
+            self.stdout.write(" | ".join(
+                f"{row[name]:>16.3f}" if isinstance(row[name], float) else f"{row[name]:>16}"
+                for name in header
+            ))
+
+        if kwargs.get("csv"):
+            with open(kwargs["csv"], "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=header)
+                writer.writeheader()
+                writer.writerows(rows)
+            self.stdout.write(self.style_success(f"Wrote results to {kwargs['csv']}."))
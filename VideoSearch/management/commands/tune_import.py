@@ -0,0 +1,243 @@
+from VideoSearch.management.base import StyledCommand as BaseCommand
+from VideoSearch.utils.machine_profile import load_profile, save_profile, profile_path, command_defaults
+from VideoSearch.utils.shot_boundaries import TRANSNET_BACKENDS, TRANSNET_INPUT_SIZE, WINDOW_SIZE
+from multiprocessing import Pool, cpu_count
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import subprocess
+import tempfile
+import socket
+import time
+
+BENCHMARKS = ["decode", "transnet", "embedding", "color", "yolo"]
+
+class Command(BaseCommand):
+    help = "Benchmark the import stages on synthetic data and store the fastest batch sizes, worker and thread counts in a machine profile.\nImport commands read the profile (data/profiles/<hostname>.json) as their defaults; explicit options still take precedence."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS, default=BENCHMARKS, help='Stages to benchmark.')
+        parser.add_argument('--seconds', type=float, default=8.0, help='Measured duration of every single trial.')
+        parser.add_argument('--max-workers', type=int, default=cpu_count(), help='Largest worker count tried.')
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16, 32, 64], help='Batch sizes tried for the model benchmarks.')
+        parser.add_argument('--backend', choices=TRANSNET_BACKENDS, default="tensorflow", help='TransNetV2 backend to benchmark.')
+        parser.add_argument('--output', type=str, default=None, help='Profile path (default: data/profiles/<hostname>.json).')
+        parser.add_argument('--dry-run', action='store_true', help='Only print the results, do not write the profile.')
+
+    def handle(self, *args, **kwargs):
+        self.kwargs = kwargs
+        cores = cpu_count()
+        self.worker_counts = sorted({w for w in [1, 2, 4, 8, 16, 32, 64, 128] if w <= min(cores, kwargs["max_workers"])} | {max(1, min(cores, kwargs["max_workers"]))})
+        self.stdout.write(self.style_info(f"Tuning import on {socket.gethostname()} ({cores} cores), worker counts {self.worker_counts}."))
+
+        results = self.results = {}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.video_path = make_synthetic_video(Path(tmpdir) / "tune.mp4")
+            for name in kwargs["benchmarks"]:
+                self.stdout.write(self.style_info(f"=== {name} ==="))
+                try:
+                    results[name] = getattr(self, f"tune_{name}")()
+                except Exception as e:
+                    self.stdout.write(self.style_error(f"Benchmark {name} failed, keeping previous settings: {e}"))
+
+        path = Path(kwargs["output"]) if kwargs.get("output") else profile_path()
+        profile = load_profile(path)
+        profile.setdefault("commands", {})
+        profile.setdefault("benchmarks", {})
+        apply_results(profile, results, kwargs["backend"])
+        profile["host"] = socket.gethostname()
+        profile["cpu_count"] = cores
+        profile["tuned_at"] = datetime.now().isoformat(timespec="seconds")
+
+        for command, options in sorted(profile["commands"].items()):
+            self.stdout.write(f"{command}: " + ", ".join(f"{key}={value}" for key, value in sorted(options.items())))
+
+        if kwargs["dry_run"]:
+            self.stdout.write(self.style_warning("Dry run, profile not written."))
+            return
+        self.stdout.write(self.style_success(f"Wrote machine profile {save_profile(profile, path)}."))
+
+    def run_trial(self, target, workers, threads, batch_size):
+        """Runs target in `workers` processes at once and returns the combined items per second."""
+        args = [(target, threads, batch_size, self.kwargs["seconds"], str(self.video_path), self.kwargs["backend"])] * workers
+        if workers == 1:
+            counts = [benchmark_worker(*args[0])]
+        else:
+            with Pool(processes=workers) as pool:
+                counts = pool.starmap(benchmark_worker, args)
+        rate = sum(items / seconds for items, seconds in counts)
+        self.stdout.write(f"  workers={workers:<3} threads={threads:<3} batch={batch_size:<3} -> {rate:8.1f} items/s")
+        return rate
+
+    def sweep(self, target, batch_sizes):
+        """Picks the best batch size with one process using all cores, then the best worker/thread split."""
+        cores = cpu_count()
+        best_batch = max(batch_sizes, key=lambda batch: self.run_trial(target, 1, cores, batch)) if len(batch_sizes) > 1 else batch_sizes[0]
+
+        rates = {}
+        for workers in self.worker_counts:
+            rates[workers] = self.run_trial(target, workers, max(1, cores // workers), best_batch)
+        best_workers = max(rates, key=rates.get)
+        return {
+            "batch_size": best_batch,
+            "workers": best_workers,
+            "threads": max(1, cores // best_workers),
+            "items_per_second": round(rates[best_workers], 2),
+        }
+
+    def tune_decode(self):
+        return self.sweep("decode", [1])
+
+    def tune_transnet(self):
+        return self.sweep("transnet", self.kwargs["batch_sizes"])
+
+    def tune_embedding(self):
+        return self.sweep("embedding", self.kwargs["batch_sizes"])
+
+    def tune_yolo(self):
+        return self.sweep("yolo", self.kwargs["batch_sizes"])
+
+    def tune_color(self):
+        # color extraction runs in a thread pool inside every keyframe worker, so the pool size is
+        # measured with that many workers running at once, within each worker's share of the cores
+        keyframe_workers = self.keyframe_workers()
+        budget = max(1, cpu_count() // keyframe_workers)
+        thread_counts = sorted({threads for threads in [1, 2, 4, 8, 16, 32, 64] if threads <= budget} | {budget})
+        rates = {threads: self.run_trial("color", keyframe_workers, threads, 16) for threads in thread_counts}
+        best = max(rates, key=rates.get)
+        return {"workers": keyframe_workers, "threads": best, "items_per_second": round(rates[best], 2)}
+
+    def keyframe_workers(self) -> int:
+        """Keyframe worker count: tuned in this run, else from the stored profile, else the extract_keyframes default."""
+        if "embedding" in self.results:
+            return self.results["embedding"]["workers"]
+        path = Path(self.kwargs["output"]) if self.kwargs.get("output") else profile_path()
+        return command_defaults("extract_keyframes", load_profile(path)).get("workers", 4)
+
+def apply_results(profile: dict, results: dict, backend: str):
+    """
+    Translates benchmark winners into option defaults of the import commands. The decode benchmark
+    is only recorded: every stage that decodes for TransNetV2 also runs it, so its counts come from
+    the transnet benchmark.
+    """
+    commands = profile["commands"]
+    profile["benchmarks"].update(results)
+    # mapped by older versions to stream_import options that were not what the benchmarks measured
+    commands.get("stream_import", {}).pop("probe_workers", None)
+    commands.get("stream_import", {}).pop("keyframe_workers", None)
+
+    if "transnet" in results:
+        best = results["transnet"]
+        commands.setdefault("extract_clips", {}).update(
+            workers=best["workers"], threads=best["threads"], batch_size=best["batch_size"], backend=backend
+        )
+        commands.setdefault("stream_import", {}).update(batch_size=best["batch_size"], backend=backend)
+        commands.setdefault("import_worker", {}).update(batch_size=best["batch_size"], backend=backend)
+
+    if "embedding" in results:
+        # measured with one process per worker; stream_import's keyframe workers are threads sharing
+        # one process's torch threads, so the winner does not carry over to them
+        best = results["embedding"]
+        commands.setdefault("extract_keyframes", {}).update(workers=best["workers"], threads=best["threads"])
+
+    if "yolo" in results:
+        best = results["yolo"]
+        commands.setdefault("extract_objects", {}).update(batch_size=best["batch_size"])
+        commands.setdefault("extract_keyframes", {}).update(object_batch=best["batch_size"])
+        commands.setdefault("stream_import", {}).update(object_batch=best["batch_size"])
+        commands.setdefault("import_worker", {}).update(object_batch=best["batch_size"])
+
+    if "color" in results:
+        # threads per keyframe worker; replaces "workers" of older profiles, which was tuned for a single process
+        profile["color_features"] = {"threads": results["color"]["threads"]}
+
+def make_synthetic_video(path: Path, seconds: int = 10) -> Path:
+    """Encodes a moving test pattern with ffmpeg, used by the decode benchmark."""
+    subprocess.run([
+        "ffmpeg", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=25:duration={seconds}",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", str(path)
+    ], check=True)
+    return path
+
+def benchmark_worker(target, threads, batch_size, seconds, video_path, backend):
+    """Runs one benchmark in this process until `seconds` passed; returns (items, elapsed seconds)."""
+    import os
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ContentBasedVideoRetrieval.settings")
+    import django
+    django.setup()
+
+    step = BENCHMARK_SETUPS[target](threads, batch_size, video_path, backend)
+    step()  # warm-up, e.g. lazy initialization and first-call allocations
+
+    items = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        items += step()
+    return items, time.perf_counter() - start
+
+def _random_frames(count, height=270, width=480):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+def _setup_decode(threads, batch_size, video_path, backend):
+    from VideoSearch.utils.shot_boundaries import load_transnet_frames
+
+    def step():
+        return len(load_transnet_frames(video_path))
+    return step
+
+def _setup_transnet(threads, batch_size, video_path, backend):
+    from VideoSearch.utils.shot_boundaries import load_transnet
+
+    model = load_transnet(backend, threads=threads)
+    windows = np.random.default_rng(0).integers(0, 256, (batch_size, WINDOW_SIZE, *TRANSNET_INPUT_SIZE), dtype=np.uint8)
+
+    def step():
+        model.predict_raw(windows)
+        return batch_size
+    return step
+
+def _setup_embedding(threads, batch_size, video_path, backend):
+    from VideoSearch.utils.embeddings import ImageEmbedder
+
+    embedder = ImageEmbedder(command=None, num_threads=threads, batch_size=batch_size)
+    frames = _random_frames(batch_size)
+
+    def step():
+        embedder.get_combined_embedding_batch(frames)
+        return batch_size
+    return step
+
+def _setup_color(threads, batch_size, video_path, backend):
+    from VideoSearch.utils.color_features import ColorFeatureExtractor
+
+    extractor = ColorFeatureExtractor(workers=threads)
+    frames = _random_frames(batch_size)
+
+    def step():
+        extractor.extract_all_batch(frames)
+        return batch_size
+    return step
+
+def _setup_yolo(threads, batch_size, video_path, backend):
+    import torch
+    from PIL import Image
+    from VideoSearch.utils.objects import ObjectDetector
+
+    torch.set_num_threads(threads)
+    detector = ObjectDetector()
+    images = [Image.fromarray(frame) for frame in _random_frames(batch_size)]
+
+    def step():
+        detector.extract_vector_batch(images)
+        return batch_size
+    return step
+
+BENCHMARK_SETUPS = {
+    "decode": _setup_decode,
+    "transnet": _setup_transnet,
+    "embedding": _setup_embedding,
+    "color": _setup_color,
+    "yolo": _setup_yolo,
+}
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.3 on 2026-10-19 10:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VideoSearch', '0006_remove_keyframe_object_labels_keyframe_object_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoPredictionCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('probabilities', models.BinaryField()),
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='VideoSearch.video')),
+            ],
+        ),
+    ]
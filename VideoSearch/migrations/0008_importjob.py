@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-19 10:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VideoSearch', '0007_videopredictioncache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('clips', 'clips'), ('keyframes', 'keyframes'), ('objects', 'objects')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], default='pending', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('lease_owner', models.CharField(blank=True, default='', max_length=200)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('clip', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='VideoSearch.clip')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='VideoSearch.video')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['stage', 'status', 'lease_expires_at'], name='VideoSearch_stage_95eaf3_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('clip__isnull', True)), fields=('video', 'stage'), name='unique_video_stage_job'), models.UniqueConstraint(condition=models.Q(('clip__isnull', False)), fields=('clip', 'stage'), name='unique_clip_stage_job')],
+            },
+        ),
+    ]
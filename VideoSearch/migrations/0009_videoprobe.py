@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-19 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VideoSearch', '0008_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoProbe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('mtime_ns', models.BigIntegerField()),
+                ('is_video', models.BooleanField(default=False)),
+                ('width', models.IntegerField(null=True)),
+                ('height', models.IntegerField(null=True)),
+                ('fps_num', models.IntegerField(null=True)),
+                ('fps_den', models.IntegerField(null=True)),
+                ('frame_count', models.IntegerField(null=True)),
+                ('frame_count_source', models.CharField(blank=True, max_length=16)),
+                ('probed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
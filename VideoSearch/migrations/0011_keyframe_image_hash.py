@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 11:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VideoSearch', '0010_clip_keyframe_params_hash_video_clip_params_hash_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='keyframe',
+            name='image_hash',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+    ]
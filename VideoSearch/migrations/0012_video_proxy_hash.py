@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 11:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VideoSearch', '0011_keyframe_image_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='proxy_hash',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+    ]
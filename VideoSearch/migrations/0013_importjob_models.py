@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-19 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VideoSearch', '0012_video_proxy_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='clip_model',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='dino_model',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
@@ -1,6 +1,9 @@
 import os
+from datetime import timedelta
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 from pathlib import Path
 import numpy as np
 import zlib
@@ -11,6 +14,7 @@ from PIL import Image
 import io
 
 KEYFRAME_ROOT = Path("data/keyframes")
+PROXY_ROOT = Path("data/proxies")
 
 class Video(models.Model):
     frame_count = models.IntegerField()
@@ -18,6 +22,14 @@ class Video(models.Model):
     fps_den = models.IntegerField()
     resolution = models.CharField(max_length=50)
     file_path = models.FilePathField(path="./data/videos/", max_length=500, unique=True)
+
+    # Content manifest, see utils/manifest.py
+    file_size = models.BigIntegerField(null=True, blank=True)
+    file_mtime_ns = models.BigIntegerField(null=True, blank=True)
+    content_hash = models.CharField(max_length=32, blank=True, db_index=True)
+    clip_params_hash = models.CharField(max_length=16, blank=True)
+    # Low-bitrate preview encode, see utils/proxies.py; empty if there is none
+    proxy_hash = models.CharField(max_length=16, blank=True)
     
     @property
     def media_url(self):
@@ -54,7 +66,7 @@ class Video(models.Model):
         Extract a frame using ffmpeg instead of OpenCV.
         This method is more robust for corrupted or complex videos.
         """
-        fps = self.frame_rate
+        fps = self.fps()
         time_sec = frame_index / fps
 
         command = [
@@ -86,7 +98,7 @@ class Video(models.Model):
         if start_frame < 0 or end_frame >= self.frame_count or end_frame < start_frame:
             return []
 
-        fps = self.frame_rate
+        fps = self.fps()
         with tempfile.TemporaryDirectory() as tmpdir:
             out_pattern = Path(tmpdir) / "frame_%05d.png"
             cmd = [
@@ -115,7 +127,7 @@ class Video(models.Model):
         Extracts selected frames using ffmpeg by seeking to each one individually.
         """
         images = {}
-        fps = self.frame_rate
+        fps = self.fps()
 
         for frame_index in sorted(set(frame_numbers)):
             time_sec = frame_index / fps
@@ -142,6 +154,20 @@ class Video(models.Model):
     def media_url(self):
         rel_path = os.path.relpath(self.file_path, settings.MEDIA_ROOT)
         return f"{settings.MEDIA_URL}{rel_path.replace(os.sep, '/')}"
+
+    def get_proxy_path(self) -> Path:
+        return PROXY_ROOT / f"{self.id}.mp4"
+
+    def proxy_url(self):
+        """
+        URL of the low-bitrate preview encode (see build_proxies), versioned by its hash so browsers
+        never play an outdated proxy. Falls back to the source file while the video has no proxy.
+        """
+        proxy_path = self.get_proxy_path()
+        if not self.proxy_hash or not proxy_path.exists():
+            return self.media_url()
+        rel_path = os.path.relpath(proxy_path.resolve(), settings.MEDIA_ROOT)
+        return f"{settings.MEDIA_URL}{rel_path.replace(os.sep, '/')}?v={self.proxy_hash}"
     
     def __str__(self):
         return f"Video {self.id}: {self.file_path} ({self.resolution}, {self.fps_num}/{self.fps_den}, {self.frame_count}f)"
@@ -150,6 +176,7 @@ class Clip(models.Model):
     video = models.ForeignKey(Video, on_delete=models.CASCADE)
     start_frame = models.IntegerField()
     end_frame = models.IntegerField()
+    keyframe_params_hash = models.CharField(max_length=16, blank=True)
 
     def fps(self) -> float:
         return self.video.fps()
@@ -171,9 +198,10 @@ class Clip(models.Model):
         if absolute_frame > self.end_frame:
             return None
         try:
-            frame = self.video.get_frame_image(absolute_frame)
+            frame = self.video.get_frame_image(absolute_frame, as_pil=as_pil)
         except Exception as e:
             print(f"Error reading frame {absolute_frame} from video {self.video.file_path}: {e}")
+            frame = None
         return frame
 
     def get_frame_range_images(self, start: int = 0, end: int = None, as_pil: bool = True):
@@ -195,6 +223,7 @@ class Clip(models.Model):
             frames = self.video.get_frame_range_images(absolute_start, absolute_end, as_pil=as_pil)
         except Exception as e:
             print(f"Error reading frame {absolute_start}-{absolute_end} from video {self.video.file_path}: {e}")
+            frames = []
         return frames
 
     def get_selected_frame_images(self, relative_indices: list[int], as_pil: bool = True):
@@ -235,6 +264,70 @@ class ClipPredictionCache(models.Model):
     def load_predictions(self) -> np.ndarray:
         return self.decompress_array(self.probabilities)
 
+class VideoPredictionCache(models.Model):
+    """
+    Full per-frame TransNetV2 shot-boundary predictions of a video, stored once as a
+    zlib-compressed float32 blob so clips can be re-segmented without running the model again.
+    Re-segmenting must see exactly the values the first segmentation saw, otherwise cuts move.
+    """
+    video = models.OneToOneField(Video, on_delete=models.CASCADE)
+    probabilities = models.BinaryField()
+
+    @staticmethod
+    def compress_array(array: np.ndarray) -> bytes:
+        return zlib.compress(array.astype(np.float32).tobytes())
+
+    @staticmethod
+    def decompress_array(blob: bytes, dtype=np.float32) -> np.ndarray:
+        return np.frombuffer(zlib.decompress(blob), dtype=dtype).copy()
+
+    @classmethod
+    def store(cls, video: Video, predictions: np.ndarray):
+        compressed = cls.compress_array(predictions)
+        return cls.objects.update_or_create(video=video, defaults={"probabilities": compressed})[0]
+
+    def load_predictions(self) -> np.ndarray:
+        return self.decompress_array(self.probabilities)
+
+class VideoProbe(models.Model):
+    """
+    Cached ffprobe result of a file in the video directory, valid as long as size and
+    modification time of the file are unchanged. Rescans only probe new or changed files.
+    """
+    FRAMES_FROM_HEADER = "nb_frames"
+    FRAMES_FROM_PACKETS = "packets"
+    FRAMES_FROM_DECODE = "decode"
+
+    path = models.CharField(max_length=500, unique=True)
+    size = models.BigIntegerField()
+    mtime_ns = models.BigIntegerField()
+    is_video = models.BooleanField(default=False)
+    width = models.IntegerField(null=True)
+    height = models.IntegerField(null=True)
+    fps_num = models.IntegerField(null=True)
+    fps_den = models.IntegerField(null=True)
+    frame_count = models.IntegerField(null=True)
+    frame_count_source = models.CharField(max_length=16, blank=True)
+    probed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Probe {self.path} ({'video' if self.is_video else 'no video'})"
+
+    def matches(self, stat) -> bool:
+        return self.size == stat.st_size and self.mtime_ns == stat.st_mtime_ns
+
+    def metadata(self) -> dict | None:
+        """Metadata in the format of import_videos.get_video_metadata, None for files without a video stream."""
+        if not self.is_video or self.width is None:
+            return None
+        return {
+            'width': self.width,
+            'height': self.height,
+            'fps_num': self.fps_num,
+            'fps_den': self.fps_den,
+            'frame_count': self.frame_count
+        }
+
 class Keyframe(models.Model):
     clip = models.ForeignKey(Clip, on_delete=models.CASCADE)
     frame = models.IntegerField()
@@ -251,6 +344,9 @@ class Keyframe(models.Model):
     # Object
     object_vector = models.BinaryField(null=True, blank=True)
 
+    # Content hash of the stored image, part of the immutable image URLs (see utils/thumbnails.py)
+    image_hash = models.CharField(max_length=16, blank=True)
+
     class Meta:
         unique_together = ("clip", "frame")
 
@@ -278,18 +374,47 @@ class Keyframe(models.Model):
         arr = self.decompress_array(self.dominant_colors) if self.dominant_colors else None
         return arr.reshape(-1, 3) if arr is not None else None
 
-    def get_image_path(self) -> Path:
-        """Returns the expected disk path for the keyframe image."""
-        return KEYFRAME_ROOT / str(self.clip.id) / f"frame{self.frame}.jpg"
+    def get_image_path(self, tier: str = "full") -> Path:
+        """Returns the expected disk path for the keyframe image or one of its thumbnail tiers."""
+        from VideoSearch.utils.thumbnails import tier_path
+        return tier_path(KEYFRAME_ROOT / str(self.clip_id) / f"frame{self.frame}.jpg", tier)
 
-    def save_image(self):
-        """Extracts and saves the keyframe image to disk."""
-        img = self.clip.get_frame_image(self.frame)
+    def save_image(self, img=None):
+        """
+        Saves the keyframe image and its thumbnail tiers to disk, extracting it from the video unless
+        an already decoded PIL image is passed. Sets image_hash; the caller saves the row.
+        Returns the image, or None if the frame could not be read.
+        """
+        from VideoSearch.utils.thumbnails import save_thumbnails, file_hash
+
+        if img is None:
+            img = self.clip.get_frame_image(self.frame)
         if img is None:
-            return
+            return None
         img_path = self.get_image_path()
         img_path.parent.mkdir(parents=True, exist_ok=True)
         img.save(img_path)
+        save_thumbnails(img, img_path)
+        self.image_hash = file_hash(img_path)
+        return img
+
+    def image_url(self, tier: str = None) -> str | None:
+        """
+        Content-addressed URL of the image (tier "full" or a thumbnail tier, default: the grid tier), served with
+        immutable cache headers. Keyframes stored before thumbnails existed fall back to the full-size media URL
+        until build_thumbnails ran.
+        """
+        from django.urls import reverse
+        from VideoSearch.utils.thumbnails import grid_tier, image_version
+
+        if self.image_hash:
+            tier = tier or grid_tier()
+            return reverse("keyframe_image", args=[self.id, tier, image_version(self.image_hash, tier)])
+        try:
+            relative_path = self.get_image_path().resolve().relative_to(Path(settings.MEDIA_ROOT).resolve())
+        except ValueError:
+            return None
+        return settings.MEDIA_URL.rstrip("/") + "/" + str(relative_path).replace("\\", "/")
 
     def load_image(self) -> Image.Image | None:
         """Loads the saved keyframe image from disk."""
@@ -310,7 +435,7 @@ class Keyframe(models.Model):
         }
 
     @classmethod
-    def create(
+    def build(
         cls,
         clip,
         frame,
@@ -321,7 +446,8 @@ class Keyframe(models.Model):
         colorfulness: float = None,
         object_vector: dict = None
     ):
-        keyframe = cls.objects.create(
+        """Returns an unsaved keyframe with compressed features, e.g. for bulk_create."""
+        return cls(
             clip=clip,
             frame=frame,
             embedding_clip=cls.compress_array(embedding_clip),
@@ -331,5 +457,152 @@ class Keyframe(models.Model):
             colorfulness=colorfulness,
             object_vector=cls.compress_array(object_vector) if object_vector is not None else None,
         )
+
+    @classmethod
+    def create(
+        cls,
+        clip,
+        frame,
+        embedding_clip: np.ndarray,
+        embedding_dino: np.ndarray = None,
+        histogram_hsv: np.ndarray = None,
+        dominant_colors: np.ndarray = None,
+        colorfulness: float = None,
+        object_vector: dict = None
+    ):
+        keyframe = cls.build(
+            clip,
+            frame,
+            embedding_clip,
+            embedding_dino,
+            histogram_hsv,
+            dominant_colors,
+            colorfulness,
+            object_vector,
+        )
         keyframe.save_image()
-        return keyframe
\ No newline at end of file
+        keyframe.save()
+        return keyframe
+
+class ImportJob(models.Model):
+    """
+    One unit of import work (a video or clip for one stage).
+
+    Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED and hold a lease that they
+    renew with heartbeats. Jobs whose lease expired (crashed worker) are claimed again;
+    every stage handler is idempotent, so re-running a job is safe.
+    """
+    STAGE_CLIPS = "clips"
+    STAGE_KEYFRAMES = "keyframes"
+    STAGE_OBJECTS = "objects"
+    STAGES = [STAGE_CLIPS, STAGE_KEYFRAMES, STAGE_OBJECTS]
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE)
+    clip = models.ForeignKey(Clip, on_delete=models.CASCADE, null=True, blank=True)
+    stage = models.CharField(max_length=20, choices=[(s, s) for s in STAGES])
+    status = models.CharField(max_length=20, default=STATUS_PENDING, choices=[
+        (s, s) for s in (STATUS_PENDING, STATUS_RUNNING, STATUS_DONE, STATUS_FAILED)
+    ])
+    attempts = models.IntegerField(default=0)
+    lease_owner = models.CharField(max_length=200, blank=True, default="")
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # embedding models of the whole queue, chosen once by enqueue_import_jobs, so every worker
+    # writes keyframe embeddings of the same space regardless of its hardware
+    clip_model = models.CharField(max_length=100, blank=True, default="")
+    dino_model = models.CharField(max_length=100, blank=True, default="")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["video", "stage"], condition=Q(clip__isnull=True), name="unique_video_stage_job"),
+            models.UniqueConstraint(fields=["clip", "stage"], condition=Q(clip__isnull=False), name="unique_clip_stage_job"),
+        ]
+        indexes = [
+            models.Index(fields=["stage", "status", "lease_expires_at"]),
+        ]
+
+    def __str__(self):
+        target = f"Clip {self.clip_id}" if self.clip_id else f"Video {self.video_id}"
+        return f"ImportJob {self.id}: {self.stage} for {target} ({self.status})"
+
+    @classmethod
+    def enqueue(cls, stage: str, video: Video, clip: Clip = None, models: tuple = None):
+        """
+        Creates the job unless it already exists; finished jobs are left untouched.
+
+        :param models: (clip_model_name, dino_model_name, ...) stored with a new job.
+        """
+        defaults = {"clip_model": models[0], "dino_model": models[1] or ""} if models else {}
+        return cls.objects.get_or_create(video=video, clip=clip, stage=stage, defaults=defaults)[0]
+
+    @property
+    def embedding_models(self) -> tuple | None:
+        """(clip_model_name, dino_model_name, mode) as taken by ImageEmbedder; None if the job has no models."""
+        if not self.clip_model:
+            return None
+        return self.clip_model, self.dino_model or None, "full" if self.dino_model else "clip-only"
+
+    @classmethod
+    def claim(cls, stage: str, owner: str, lease_seconds: int = 300, limit: int = 1, max_attempts: int = 3) -> list:
+        """
+        Atomically leases up to limit claimable jobs of a stage: pending ones, and running ones
+        whose lease has expired. Rows locked by other workers are skipped instead of waited on.
+        Expired jobs that already used their last attempt (the worker died during it) are marked
+        as failed, so enqueue_import_jobs --retry-failed can reset them.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            cls.objects.filter(
+                stage=stage, status=cls.STATUS_RUNNING, lease_expires_at__lt=now, attempts__gte=max_attempts
+            ).update(
+                status=cls.STATUS_FAILED, lease_owner="", lease_expires_at=None,
+                last_error="Lease expired during the last attempt (worker stopped or crashed).",
+            )
+            jobs = list(
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(stage=stage, attempts__lt=max_attempts)
+                .filter(Q(status=cls.STATUS_PENDING) | Q(status=cls.STATUS_RUNNING, lease_expires_at__lt=now))
+                .order_by("id")[:limit]
+            )
+            if jobs:
+                cls.objects.filter(id__in=[job.id for job in jobs]).update(
+                    status=cls.STATUS_RUNNING,
+                    lease_owner=owner,
+                    lease_expires_at=now + timedelta(seconds=lease_seconds),
+                    heartbeat_at=now,
+                    attempts=F("attempts") + 1,
+                )
+        for job in jobs:
+            job.refresh_from_db()
+        return jobs
+
+    def _owned(self):
+        return ImportJob.objects.filter(id=self.id, lease_owner=self.lease_owner, status=self.STATUS_RUNNING)
+
+    def heartbeat(self, lease_seconds: int = 300) -> bool:
+        """Extends the lease. Returns False if the job was taken over by another worker."""
+        now = timezone.now()
+        return self._owned().update(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=lease_seconds)) > 0
+
+    def complete(self) -> bool:
+        return self._owned().update(
+            status=self.STATUS_DONE, completed_at=timezone.now(), lease_expires_at=None, last_error=""
+        ) > 0
+
+    def release(self) -> bool:
+        """Returns the job to the queue without counting the attempt, e.g. if this worker cannot run it."""
+        return self._owned().update(
+            status=self.STATUS_PENDING, attempts=F("attempts") - 1, lease_owner="", lease_expires_at=None
+        ) > 0
+
+    def fail(self, error: str, max_attempts: int = 3) -> bool:
+        status = self.STATUS_PENDING if self.attempts < max_attempts else self.STATUS_FAILED
+        return self._owned().update(status=status, lease_owner="", lease_expires_at=None, last_error=error) > 0
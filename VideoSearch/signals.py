@@ -6,9 +6,10 @@ from .models import Keyframe, Clip
 
 @receiver(post_delete, sender=Keyframe)
 def delete_keyframe_image(sender, instance: Keyframe, **kwargs):
+    from VideoSearch.utils.thumbnails import image_files
     image_path = instance.get_image_path()
-    if image_path.exists():
-        image_path.unlink()
+    for path in image_files(image_path):
+        path.unlink(missing_ok=True)
 
     dir_path = image_path.parent
     if dir_path.exists() and not any(dir_path.iterdir()):
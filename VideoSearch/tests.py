@@ -1,3 +1,677 @@
-from django.test import TestCase
+import importlib.util
+import unittest
+import numpy as np
+from datetime import timedelta
+from django.core.management import call_command
+from django.db import transaction
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from io import StringIO
+from pathlib import Path
+from PIL import Image
+import tempfile
+import time
+import os
+from unittest import mock
+from VideoSearch.models import Video, Clip, ClipPredictionCache, Keyframe, ImportJob, VideoPredictionCache, VideoProbe
+from VideoSearch.utils.shot_boundaries import TRANSNET_PYTORCH_WEIGHTS, load_transnet, predict_videos, multipass_schedule, multipass_cuts, sweep_accepted_cuts, WindowBatchScheduler
+from scipy.signal import argrelextrema
 
-# Create your tests here.
+def synthetic_video(shot_lengths=(60, 45, 80, 30), seed=0) -> np.ndarray:
+    """Builds a 48x27 test video of textured, slowly moving shots separated by hard cuts."""
+    rng = np.random.default_rng(seed)
+    shots = []
+    for length in shot_lengths:
+        base = rng.integers(0, 256, size=(27, 48, 3)).astype(np.int16)
+        drift = rng.integers(-2, 3, size=3)
+        frames = [np.clip(base + drift * t, 0, 255) for t in range(length)]
+        shots.append(np.stack(frames).astype(np.uint8))
+    return np.concatenate(shots)
+
+@unittest.skipUnless(
+    importlib.util.find_spec("tensorflow") and importlib.util.find_spec("torch") and TRANSNET_PYTORCH_WEIGHTS.is_file(),
+    "TensorFlow, PyTorch and converted TransNetV2 weights are required."
+)
+class TransNetBackendParityTest(SimpleTestCase):
+    def test_pytorch_matches_tensorflow(self):
+        video = synthetic_video()
+        tf_predictions = dict(predict_videos(load_transnet("tensorflow"), [("video", video)], batch_size=4))["video"]
+        torch_predictions = dict(predict_videos(load_transnet("pytorch", threads=1), [("video", video)], batch_size=4))["video"]
+
+        self.assertEqual(tf_predictions.shape, (len(video),))
+        np.testing.assert_allclose(torch_predictions, tf_predictions, atol=1e-3)
+        np.testing.assert_array_equal(np.flatnonzero(torch_predictions > 0.5), np.flatnonzero(tf_predictions > 0.5))
+
+class WindowCodeModel:
+    """Fake TransNetV2 whose prediction for a frame encodes the video, frame index and window position it saw."""
+
+    def __init__(self):
+        self.batches = []
+
+    @staticmethod
+    def frames(video: int, count: int) -> np.ndarray:
+        frames = np.zeros((count, 27, 48, 3), dtype=np.uint8)
+        frames[:, 0, 0, 0] = video
+        frames[:, 0, 0, 1] = np.arange(count) % 256
+        frames[:, 0, 0, 2] = np.arange(count) // 256
+        return frames
+
+    def predict_raw(self, windows: np.ndarray):
+        self.batches.append(sorted(set(windows[:, 0, 0, 0, 0].tolist())))
+        pixels = windows[:, :, 0, 0, :].astype(np.float64)
+        codes = (pixels[..., 0] * 1000 + pixels[..., 1] + pixels[..., 2] * 256) * 100 + np.arange(windows.shape[1])
+        return codes[..., None], codes[..., None]
+
+def reference_predictions(model, frames: np.ndarray) -> np.ndarray:
+    """The windowing of TransNetV2.predict_frames, one window per predict_raw call."""
+    no_padded_frames_start = 25
+    no_padded_frames_end = 25 + 50 - (len(frames) % 50 if len(frames) % 50 != 0 else 50)
+    padded_inputs = np.concatenate([frames[:1]] * no_padded_frames_start + [frames] + [frames[-1:]] * no_padded_frames_end, 0)
+
+    predictions = []
+    ptr = 0
+    while ptr + 100 <= len(padded_inputs):
+        single_frame_pred, _ = model.predict_raw(padded_inputs[ptr:ptr + 100][np.newaxis])
+        predictions.append(single_frame_pred[0, 25:75, 0])
+        ptr += 50
+    return np.concatenate(predictions)[:len(frames)]
+
+class WindowBatchSchedulerTest(SimpleTestCase):
+    LENGTHS = [0, 1, 30, 50, 99, 100, 175, 301]
+
+    def test_matches_predict_frames_windowing(self):
+        videos = [(video, WindowCodeModel.frames(video, length)) for video, length in enumerate(self.LENGTHS, start=1)]
+        expected = {video: reference_predictions(WindowCodeModel(), frames) for video, frames in videos if len(frames)}
+
+        for batch_size in (1, 3, 16):
+            with self.subTest(batch_size=batch_size):
+                model = WindowCodeModel()
+                results = dict(predict_videos(model, videos, batch_size=batch_size))
+
+                self.assertEqual(set(results), {video for video, _ in videos})
+                for video, frames in videos:
+                    self.assertEqual(results[video].shape, (len(frames),))
+                    if len(frames):
+                        np.testing.assert_array_equal(results[video], expected[video])
+                if batch_size > 1:
+                    self.assertTrue(any(len(batch) > 1 for batch in model.batches), "windows of several videos share batches")
+
+    def test_results_are_returned_once_complete(self):
+        model = WindowCodeModel()
+        scheduler = WindowBatchScheduler(model, batch_size=4)
+        self.assertEqual(scheduler.submit("a", WindowCodeModel.frames(1, 120)), [])  # 3 windows, batch not full
+        finished = scheduler.submit("b", WindowCodeModel.frames(2, 60))  # 2 windows, one runs with those of "a"
+        self.assertEqual([key for key, _ in finished], ["a"])
+        self.assertEqual([key for key, _ in scheduler.flush()], ["b"])
+        self.assertEqual((scheduler.batches_run, scheduler.windows_run), (2, 5))
+
+class MultipassCutsTest(SimpleTestCase):
+    def reference_cuts(self, predictions, thresholds, orders):
+        """The former per-pass argrelextrema loop of multipass_predictions_to_scenes."""
+        cuts = set()
+        for threshold, order in zip(thresholds, orders):
+            local_maxima = argrelextrema(predictions, np.greater, order=int(order))[0]
+            cuts.update(idx for idx in local_maxima if predictions[idx] > predictions.dtype.type(threshold))
+        return sorted(cuts)
+
+    def random_predictions(self, rng, length):
+        # rounding creates plateaus, which are no strict local maxima
+        return np.round(rng.random(length), 1 + length % 3).astype(np.float32)
+
+    def test_matches_argrelextrema(self):
+        rng = np.random.default_rng(0)
+        for length in (0, 1, 2, 3, 17, 250, 1000):
+            predictions = self.random_predictions(rng, length)
+            for fps, passes in ((25, 1), (25, 5), (60, 8)):
+                thresholds, orders = multipass_schedule(0.3, 0.9, 2, 3.0, passes, fps)
+                np.testing.assert_array_equal(multipass_cuts(predictions, thresholds, orders), self.reference_cuts(predictions, thresholds, orders))
+
+    def test_sweep_matches_argrelextrema(self):
+        rng = np.random.default_rng(1)
+        predictions = self.random_predictions(rng, 600)
+        schedules = [multipass_schedule(low, 0.8, 1, seconds, passes, 25) for low in (0.2, 0.5) for seconds in (1.0, 4.0) for passes in (1, 3, 6)]
+
+        accepted, candidates = sweep_accepted_cuts(predictions, schedules)
+        self.assertEqual(accepted.shape, (len(candidates), len(schedules)))
+        for i, (thresholds, orders) in enumerate(schedules):
+            np.testing.assert_array_equal(candidates[accepted[:, i]], self.reference_cuts(predictions, thresholds, orders))
+
+def random_features(rng, count: int) -> list[dict]:
+    """Feature dicts like VisualFeatureExtractor produces; every third frame lacks a DINO embedding."""
+    features = []
+    for i in range(count):
+        histogram = rng.random(64).astype(np.float32)
+        features.append({
+            "clip_emb": rng.normal(size=32).astype(np.float32),
+            "dino_emb": rng.normal(size=24).astype(np.float32) if i % 3 else None,
+            "histogram": histogram / histogram.sum(),
+            "palette": rng.integers(0, 256, size=(5, 3)).astype(np.float32),
+            "colorfulness": float(rng.uniform(0, 120)),
+        })
+    return features
+
+@unittest.skipUnless(
+    importlib.util.find_spec("torch") and importlib.util.find_spec("ultralytics"),
+    "PyTorch and ultralytics are required to import the per-pair distance functions."
+)
+class CandidatePoolTest(SimpleTestCase):
+    def reference_representative(self, candidates):
+        """The former pair-by-pair select_representative."""
+        from VideoSearch.utils.visual_feature_extractor import compute_distance
+
+        if len(candidates) == 1:
+            return candidates[0]
+        best_frame, best_score = None, float("inf")
+        for i, (frame_i, feat_i) in enumerate(candidates):
+            median_dist = np.median([compute_distance(feat_i, feat_j) for j, (_, feat_j) in enumerate(candidates) if i != j])
+            if median_dist < best_score:
+                best_score, best_frame = median_dist, (frame_i, feat_i)
+        return best_frame
+
+    def test_distance_matrix_matches_compute_distance(self):
+        from VideoSearch.utils.feature_matrix import FeatureMatrix, combined_distance_matrix
+        from VideoSearch.utils.visual_feature_extractor import compute_distance
+
+        features = random_features(np.random.default_rng(0), 12)
+        matrix = FeatureMatrix(features)
+        expected = [[compute_distance(a, b) for b in features] for a in features]
+        np.testing.assert_allclose(combined_distance_matrix(matrix, matrix), expected, atol=1e-5)
+
+    def test_medoid_matches_select_representative(self):
+        from VideoSearch.utils.feature_matrix import CandidatePool
+
+        rng = np.random.default_rng(1)
+        for count in (1, 2, 5, 16):
+            candidates = list(enumerate(random_features(rng, count), start=100))
+            pool = CandidatePool(candidates)
+            self.assertEqual(pool.medoid()[0], self.reference_representative(candidates)[0])
+
+            mask = rng.random(count) < 0.6
+            mask[0] = True
+            pool.keep(mask)
+            remaining = [candidate for candidate, kept in zip(candidates, mask) if kept]
+            self.assertEqual([frame for frame, _ in pool.remaining()], [frame for frame, _ in remaining])
+            self.assertEqual(pool.medoid()[0], self.reference_representative(remaining)[0])
+
+class ImportJobLeaseTest(TestCase):
+    def setUp(self):
+        self.video = Video.objects.create(frame_count=10, fps_num=25, fps_den=1, resolution="1x1", file_path="/tmp/video.mp4")
+        self.job = ImportJob.enqueue(ImportJob.STAGE_CLIPS, self.video)
+
+    def expire(self, job):
+        ImportJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_claim_leases_once(self):
+        [job] = ImportJob.claim(ImportJob.STAGE_CLIPS, "worker-a")
+        self.assertEqual((job.status, job.attempts, job.lease_owner), (ImportJob.STATUS_RUNNING, 1, "worker-a"))
+        self.assertEqual(ImportJob.claim(ImportJob.STAGE_CLIPS, "worker-b"), [])
+
+    def test_expired_lease_is_claimed_again(self):
+        [job] = ImportJob.claim(ImportJob.STAGE_CLIPS, "worker-a")
+        self.expire(job)
+        [taken] = ImportJob.claim(ImportJob.STAGE_CLIPS, "worker-b")
+        self.assertEqual((taken.lease_owner, taken.attempts), ("worker-b", 2))
+        self.assertFalse(job.complete())
+        self.assertTrue(taken.complete())
+
+    def test_fail_retries_until_max_attempts(self):
+        for attempt in range(1, 4):
+            [job] = ImportJob.claim(ImportJob.STAGE_CLIPS, "worker", max_attempts=3)
+            self.assertTrue(job.fail("error", max_attempts=3))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (ImportJob.STATUS_FAILED, 3))
+        self.assertEqual(ImportJob.claim(ImportJob.STAGE_CLIPS, "worker", max_attempts=3), [])
+
+    def test_expired_last_attempt_fails_and_can_be_retried(self):
+        for attempt in range(3):
+            [job] = ImportJob.claim(ImportJob.STAGE_CLIPS, "worker", max_attempts=3)
+            self.expire(job)
+        self.assertEqual(ImportJob.claim(ImportJob.STAGE_CLIPS, "worker", max_attempts=3), [])
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+        self.assertIn("Lease expired", job.last_error)
+
+        call_command("enqueue_import_jobs", retry_failed=True, clip_model="openai/clip-vit-base-patch32", stdout=StringIO())
+        [job] = ImportJob.claim(ImportJob.STAGE_CLIPS, "worker", max_attempts=3)
+        self.assertEqual(job.attempts, 1)
+
+class ImportQueueModelsTest(TestCase):
+    def setUp(self):
+        self.video = Video.objects.create(frame_count=10, fps_num=25, fps_den=1, resolution="1x1", file_path="/tmp/video.mp4")
+        self.clip = Clip.objects.create(video=self.video, start_frame=0, end_frame=9)
+        ClipPredictionCache.objects.create(clip=self.clip, probabilities=b"")
+
+    def enqueue(self, **kwargs):
+        call_command("enqueue_import_jobs", stdout=StringIO(), **kwargs)
+
+    def test_models_are_chosen_once_for_the_queue(self):
+        self.enqueue(clip_model="openai/clip-vit-large-patch14", dino_model="vit_base_patch16_224_dino")
+        job = ImportJob.objects.get(stage=ImportJob.STAGE_KEYFRAMES)
+        self.assertEqual(job.embedding_models, ("openai/clip-vit-large-patch14", "vit_base_patch16_224_dino", "full"))
+
+        # later runs keep the queue's models instead of choosing them for the enqueuing machine
+        ImportJob.objects.filter(stage=ImportJob.STAGE_CLIPS).delete()
+        self.enqueue()
+        self.assertEqual(set(ImportJob.objects.values_list("clip_model", "dino_model")), {("openai/clip-vit-large-patch14", "vit_base_patch16_224_dino")})
+
+        self.enqueue(clip_model="openai/clip-vit-base-patch32")
+        job.refresh_from_db()
+        self.assertEqual(job.embedding_models, ("openai/clip-vit-base-patch32", None, "clip-only"))
+
+    def test_worker_returns_jobs_whose_models_it_cannot_load(self):
+        from VideoSearch.management.commands.import_worker import Command as WorkerCommand
+
+        self.enqueue(clip_model="openai/clip-vit-large-patch14", dino_model="none")
+        ImportJob.objects.filter(stage=ImportJob.STAGE_CLIPS).update(status=ImportJob.STATUS_DONE)
+        output = StringIO()
+        with mock.patch("VideoSearch.management.commands.stream_import.init_keyframe_extractor", side_effect=RuntimeError("out of memory")) as init:
+            call_command(WorkerCommand(), stages=[ImportJob.STAGE_KEYFRAMES], exit_when_idle=True, threads=2, stdout=output)
+
+        self.assertEqual(init.call_args.kwargs["models"], ("openai/clip-vit-large-patch14", None, "clip-only"))
+        self.assertEqual(init.call_args.kwargs["num_threads"], 2)
+        job = ImportJob.objects.get(stage=ImportJob.STAGE_KEYFRAMES)
+        self.assertEqual((job.status, job.attempts, job.lease_owner), (ImportJob.STATUS_PENDING, 0, ""))
+        self.assertIn("no longer takes keyframes jobs", output.getvalue())
+
+class VideoPredictionCacheTest(TestCase):
+    def test_predictions_round_trip_exactly(self):
+        video = Video.objects.create(frame_count=1000, fps_num=25, fps_den=1, resolution="1x1", file_path="/tmp/video.mp4")
+        predictions = np.random.default_rng(0).random(1000, dtype=np.float32)
+        VideoPredictionCache.store(video, predictions)
+
+        cache = VideoPredictionCache.objects.get(video=video)
+        np.testing.assert_array_equal(cache.load_predictions(), predictions)
+
+class ClipExtractionSkipTest(TestCase):
+    def setUp(self):
+        self.video = Video.objects.create(frame_count=100, fps_num=25, fps_den=1, resolution="1x1", file_path="/tmp/video.mp4")
+        Clip.objects.create(video=self.video, start_frame=0, end_frame=59)
+        Clip.objects.create(video=self.video, start_frame=60, end_frame=99)
+
+    def process(self, **kwargs):
+        from VideoSearch.management.commands.extract_clips import process_videos_for_clips
+
+        predictions = np.zeros(100, dtype=np.float32)
+        with mock.patch("VideoSearch.utils.shot_boundaries.load_transnet_frames", return_value=np.zeros((100, 27, 48, 3), dtype=np.uint8)), \
+                mock.patch("VideoSearch.utils.shot_boundaries.predict_videos", side_effect=lambda model, videos, batch_size: [(key, predictions) for key, _ in videos]):
+            return process_videos_for_clips([self.video.id], kwargs, model=object())
+
+    def test_complete_videos_without_predictions_are_skipped(self):
+        messages = self.process()
+        self.assertIn("clips fully exist", messages[0])
+        self.assertFalse(VideoPredictionCache.objects.exists())
+
+        Video.objects.filter(id=self.video.id).update(clip_params_hash="other")
+        messages = self.process()
+        self.assertIn("--backfill-predictions", messages[0])
+        self.assertEqual(Clip.objects.filter(video=self.video).count(), 2)
+
+    def test_backfill_keeps_clips_made_with_the_current_settings(self):
+        messages = self.process(backfill_predictions=True)
+        self.assertIn("clips are unchanged", messages[0])
+        self.assertTrue(VideoPredictionCache.objects.filter(video=self.video).exists())
+        self.assertEqual(Clip.objects.filter(video=self.video).count(), 2)
+
+class ThumbnailVersionTest(SimpleTestCase):
+    def test_tier_settings_change_file_and_url(self):
+        from VideoSearch.utils.thumbnails import image_version, save_thumbnails, tier_path
+
+        with tempfile.TemporaryDirectory() as folder:
+            full_path = Path(folder) / "frame12.jpg"
+            image = Image.new("RGB", (640, 360), (200, 30, 30))
+            image.save(full_path)
+
+            with override_settings(KEYFRAME_THUMBNAIL_TIERS={"thumb": 320}, KEYFRAME_THUMBNAIL_QUALITY=80):
+                save_thumbnails(image, full_path)
+                old_path, old_version = tier_path(full_path, "thumb"), image_version("abc", "thumb")
+            with override_settings(KEYFRAME_THUMBNAIL_TIERS={"thumb": 320}, KEYFRAME_THUMBNAIL_QUALITY=60):
+                save_thumbnails(image, full_path)
+                new_path, new_version = tier_path(full_path, "thumb"), image_version("abc", "thumb")
+
+            self.assertNotEqual(old_version, new_version)
+            self.assertNotEqual(old_path, new_path)
+            self.assertEqual(sorted(Path(folder).iterdir()), sorted([full_path, new_path]))
+            self.assertEqual(image_version("abc", "full"), "abc")
+
+class SpriteWriteTest(SimpleTestCase):
+    def test_sheet_and_layout_leave_no_partial_files(self):
+        from VideoSearch.utils import sprites
+
+        keyframes = [mock.Mock(id=1, image_hash="a"), mock.Mock(id=2, image_hash="b")]
+        tile = Image.new("RGB", sprites.SPRITE_TILE_SIZE, (10, 200, 10))
+        with tempfile.TemporaryDirectory() as folder, \
+                mock.patch.object(sprites, "SPRITE_ROOT", Path(folder)), \
+                mock.patch.object(sprites, "load_tile", return_value=tile):
+            key = sprites.sprite_key(keyframes)
+            layout = sprites.get_sprite(keyframes)
+            self.assertEqual(sorted(path.name for path in Path(folder).iterdir()),
+                             sorted([f"{key}.json", sprites.sprite_path(key).name]))
+            self.assertEqual(sprites.get_sprite(keyframes), layout)
+            with Image.open(sprites.sprite_path(key)) as sheet:
+                self.assertEqual(sheet.size, (layout["width"], layout["height"]))
+
+class ProxyPruneTest(SimpleTestCase):
+    def test_keeps_proxies_of_videos_and_running_encodes(self):
+        from VideoSearch.utils import proxies
+
+        with tempfile.TemporaryDirectory() as folder, mock.patch.object(proxies, "PROXY_ROOT", Path(folder)):
+            names = ["1.mp4", "2.mp4", "1.partial.mp4", "3.partial.mp4", "4.partial.mp4"]
+            for name in names:
+                (Path(folder) / name).write_bytes(b"proxy")
+            # cancelled a day ago
+            old = time.time() - 24 * 3600
+            os.utime(Path(folder) / "4.partial.mp4", (old, old))
+
+            self.assertEqual(proxies.prune_proxies([1, 3]), 2)
+            self.assertEqual(sorted(path.name for path in Path(folder).iterdir()), ["1.mp4", "1.partial.mp4", "3.partial.mp4"])
+
+class RequeueStaleClipsTest(TestCase):
+    def test_stale_clips_are_queued_or_reported(self):
+        from VideoSearch.management.commands.extract_keyframes import requeue_stale_clips
+        from VideoSearch.utils.manifest import keyframe_params_hash
+
+        params = (0.35, 0.95, 25, 0.0, False)
+        current = keyframe_params_hash(*params, ("clip-model", "dino-model"))
+        legacy = keyframe_params_hash(*params)
+        other_models = keyframe_params_hash(*params, ("other-clip-model", None))
+        self.assertNotEqual(current, legacy)
+
+        with_predictions = Video.objects.create(frame_count=100, fps_num=25, fps_den=1, resolution="1x1", file_path="/tmp/a.mp4")
+        without_predictions = Video.objects.create(frame_count=100, fps_num=25, fps_den=1, resolution="1x1", file_path="/tmp/b.mp4")
+        VideoPredictionCache.store(with_predictions, np.zeros(100, dtype=np.float32))
+
+        stale = Clip.objects.create(video=with_predictions, start_frame=0, end_frame=49, keyframe_params_hash=other_models)
+        Clip.objects.create(video=with_predictions, start_frame=50, end_frame=99, keyframe_params_hash=legacy)
+        Clip.objects.create(video=without_predictions, start_frame=0, end_frame=49, keyframe_params_hash=other_models)
+        Clip.objects.create(video=without_predictions, start_frame=50, end_frame=99, keyframe_params_hash=current)
+
+        # without --requeue-stale the clips are only counted
+        self.assertEqual(requeue_stale_clips(current, legacy, dry_run=True), (1, 1))
+        self.assertFalse(ClipPredictionCache.objects.exists())
+
+        self.assertEqual(requeue_stale_clips(current, legacy), (1, 1))
+        self.assertEqual(list(ClipPredictionCache.objects.values_list("clip_id", flat=True)), [stale.id])
+
+class PurgeTest(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.previous_dir = os.getcwd()
+        os.chdir(self.folder.name)
+        self.video = Video.objects.create(frame_count=100, fps_num=25, fps_den=1, resolution="1x1", file_path="/tmp/video.mp4")
+        self.clip = Clip.objects.create(video=self.video, start_frame=0, end_frame=99)
+        Keyframe.objects.create(clip=self.clip, frame=10)
+        ClipPredictionCache.objects.create(clip=self.clip, probabilities=b"")
+        self.clip_folder = Path("data/keyframes") / str(self.clip.id)
+        self.clip_folder.mkdir(parents=True)
+        (self.clip_folder / "frame10.jpg").touch()
+
+    def tearDown(self):
+        os.chdir(self.previous_dir)
+        self.folder.cleanup()
+
+    def test_rollback_keeps_keyframe_images(self):
+        from VideoSearch.utils.purge import purge_clips
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    purge_clips([self.clip.id])
+                    raise RuntimeError("rollback")
+            except RuntimeError:
+                pass
+        self.assertTrue(Keyframe.objects.filter(clip=self.clip).exists())
+        self.assertTrue(self.clip_folder.exists())
+
+    def test_purge_videos_deletes_rows_and_files_on_commit(self):
+        from VideoSearch.utils.purge import purge_videos
+
+        with self.captureOnCommitCallbacks(execute=True):
+            purge_videos([self.video.id])
+            self.assertTrue(self.clip_folder.exists())
+        self.assertFalse(Video.objects.exists() or Clip.objects.exists() or Keyframe.objects.exists() or ClipPredictionCache.objects.exists())
+        self.assertFalse(self.clip_folder.exists())
+
+class ProbeCacheTest(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = Path(self.folder.name) / "video.mp4"
+        self.path.write_bytes(b"video")
+        self.key = str(self.path.resolve())
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def fake_ffprobe(self, path, count_fallback=True, log=print):
+        return {"is_video": True, "width": 64, "height": 36, "fps_num": 25, "fps_den": 1,
+                "frame_count": 250 if count_fallback else None,
+                "frame_count_source": VideoProbe.FRAMES_FROM_PACKETS if count_fallback else ""}
+
+    def probe(self, **kwargs):
+        from VideoSearch.utils.probe import probe_files
+        return probe_files([self.path], workers=1, log=lambda msg: None, **kwargs)[self.key]
+
+    def test_unchanged_files_reuse_the_cache(self):
+        with mock.patch("VideoSearch.utils.probe.run_ffprobe", side_effect=self.fake_ffprobe) as ffprobe:
+            self.assertEqual(self.probe().frame_count, 250)
+            self.assertEqual(self.probe().frame_count, 250)
+            self.assertEqual(ffprobe.call_count, 1)
+
+            stat = self.path.stat()
+            os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+            self.probe()
+            self.assertEqual(ffprobe.call_count, 2)
+        self.assertEqual(VideoProbe.objects.count(), 1)
+
+    def test_probes_without_count_fallback_are_not_cached(self):
+        with mock.patch("VideoSearch.utils.probe.run_ffprobe", side_effect=self.fake_ffprobe) as ffprobe:
+            self.assertIsNone(self.probe(count_fallback=False).frame_count)
+            self.assertFalse(VideoProbe.objects.exists())
+
+            self.assertEqual(self.probe().frame_count, 250)
+            self.assertEqual(ffprobe.call_args_list[-1].args, (self.key, True, mock.ANY))
+
+            # a complete probe also serves later calls without the fallback
+            self.assertEqual(self.probe(count_fallback=False).frame_count, 250)
+            self.assertEqual(ffprobe.call_count, 2)
+
+class MediaServingTest(SimpleTestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.root = Path(self.folder.name)
+        self.data = bytes(range(100))
+        (self.root / "videos").mkdir()
+        self.path = self.root / "videos" / "video.mp4"
+        self.path.write_bytes(self.data)
+        (self.root / "secret.txt").write_bytes(b"secret")
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def serve(self, **headers):
+        from VideoSearch.utils.media import serve_file
+
+        response = serve_file(self.factory.get("/media/videos/video.mp4", headers=headers), self.path)
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, content
+
+    def test_parse_range(self):
+        from VideoSearch.utils.media import parse_range
+
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range("items=0-9", 100))
+        self.assertIsNone(parse_range("bytes=-", 100))
+        self.assertIsNone(parse_range("bytes=20-10", 100))
+        self.assertEqual(parse_range("bytes=0-9", 100), (0, 9))
+        self.assertEqual(parse_range("bytes=90-", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=50-500", 100), (50, 99))
+        self.assertEqual(parse_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=-500", 100), (0, 99))
+        for header, size in (("bytes=100-", 100), ("bytes=-0", 100), ("bytes=0-", 0)):
+            with self.subTest(header=header, size=size), self.assertRaises(ValueError):
+                parse_range(header, size)
+
+    def test_whole_file(self):
+        response, content = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, self.data)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_ranges(self):
+        response, content = self.serve(Range="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(content, self.data[10:20])
+        self.assertEqual(response["Content-Range"], "bytes 10-19/100")
+        self.assertEqual(response["Content-Length"], "10")
+
+        response, content = self.serve(Range="bytes=-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(content, self.data[-5:])
+        self.assertEqual(response["Content-Range"], "bytes 95-99/100")
+
+        response, _ = self.serve(Range="bytes=100-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */100")
+
+    def test_conditional_requests(self):
+        etag = self.serve()[0]["ETag"]
+
+        response, content = self.serve(If_None_Match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(content, b"")
+
+        response, content = self.serve(Range="bytes=0-9", If_Range=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(content, self.data[:10])
+
+        # the file changed since the client cached the start of it: send the whole file again
+        response, content = self.serve(Range="bytes=0-9", If_Range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, self.data)
+
+    def test_media_view_stays_in_served_dirs(self):
+        from VideoSearch.views import media_view
+
+        with override_settings(MEDIA_ROOT=str(self.root), MEDIA_SERVED_DIRS=["videos"]):
+            response = media_view(self.factory.get("/media/videos/video.mp4"), "videos/video.mp4")
+            self.assertEqual(response.status_code, 200)
+            response.close()
+
+            for path in ("secret.txt", "videos/../secret.txt", "../secret.txt", "videos/../../secret.txt",
+                         "videos\\..\\secret.txt", "/videos/../secret.txt", "videos/missing.mp4", str(self.root / "secret.txt")):
+                with self.subTest(path=path), self.assertRaises(Http404):
+                    media_view(self.factory.get("/media/"), path)
+
+class WatchScanTest(SimpleTestCase):
+    def scan(self, folder, watch, sleep=None):
+        from VideoSearch.management.commands.stream_import import Command as StreamCommand
+
+        probe = lambda paths: {str(Path(path).resolve()): mock.Mock(is_video=True) for path in paths}
+        with mock.patch("VideoSearch.management.commands.stream_import.time.sleep", side_effect=sleep), \
+                mock.patch("VideoSearch.utils.probe.probe_files", side_effect=probe):
+            yield from StreamCommand(stdout=StringIO()).scan_videos(Path(folder), watch)
+
+    def test_single_scan_yields_all_videos(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = Path(folder) / "video.mp4"
+            path.write_bytes(b"video")
+            self.assertEqual(list(self.scan(folder, None)), [path])
+
+    def test_watch_waits_until_files_stop_growing(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = Path(folder) / "video.ts"
+            path.write_bytes(b"a")
+            # the file is still being copied during the first two scans
+            writes = iter([b"ab", b"abc", None])
+
+            def sleep(seconds):
+                data = next(writes)
+                if data:
+                    path.write_bytes(data)
+
+            scans = self.scan(folder, 1.0, sleep)
+            self.assertEqual(next(scans), path)
+            self.assertEqual(path.read_bytes(), b"abc")
+            scans.close()
+
+class SyncVideosTest(TestCase):
+    def setUp(self):
+        # purging removes keyframe folders and proxies relative to the working directory
+        self.folder = tempfile.TemporaryDirectory()
+        self.previous_dir = os.getcwd()
+        os.chdir(self.folder.name)
+        self.videos = Path(self.folder.name).resolve() / "videos"
+        self.hashes = {}
+
+    def tearDown(self):
+        os.chdir(self.previous_dir)
+        self.folder.cleanup()
+
+    def create_video(self, name, content_hash="hash-a", size=1000, mtime_ns=1):
+        video = Video.objects.create(frame_count=100, fps_num=25, fps_den=1, resolution="64x36", file_path=str(self.videos / name),
+                                     file_size=size, file_mtime_ns=mtime_ns, content_hash=content_hash, clip_params_hash="clips")
+        Clip.objects.create(video=video, start_frame=0, end_frame=99)
+        VideoPredictionCache.store(video, np.zeros(100, dtype=np.float32))
+        return video
+
+    def probe(self, name, content_hash="hash-a", size=1000, mtime_ns=1, frame_count=100):
+        path = str(self.videos / name)
+        self.hashes[path] = content_hash
+        return path, VideoProbe(path=path, size=size, mtime_ns=mtime_ns, is_video=True, width=64, height=36, fps_num=25, fps_den=1, frame_count=frame_count)
+
+    def sync(self, *probes):
+        from VideoSearch.management.commands.import_videos import Command as ImportCommand
+
+        with mock.patch("VideoSearch.management.commands.import_videos.content_hash", side_effect=lambda path: self.hashes[str(path)]) as content_hash:
+            ImportCommand(stdout=StringIO()).sync_videos(dict(probes))
+        return content_hash.call_count
+
+    def assertKeepsDerivedData(self, video):
+        self.assertTrue(Clip.objects.filter(video=video).exists())
+        self.assertTrue(VideoPredictionCache.objects.filter(video=video).exists())
+
+    def test_unchanged_files_are_not_hashed(self):
+        video = self.create_video("a.mp4")
+        self.assertEqual(self.sync(self.probe("a.mp4")), 0)
+        self.assertKeepsDerivedData(video)
+
+    def test_touched_file_keeps_its_clips(self):
+        video = self.create_video("a.mp4")
+        self.sync(self.probe("a.mp4", mtime_ns=2))
+        video.refresh_from_db()
+        self.assertEqual((video.file_mtime_ns, video.content_hash), (2, "hash-a"))
+        self.assertKeepsDerivedData(video)
+
+    def test_legacy_video_gets_its_fingerprint(self):
+        video = self.create_video("a.mp4", content_hash="", size=None, mtime_ns=None)
+        self.sync(self.probe("a.mp4"))
+        video.refresh_from_db()
+        self.assertEqual((video.file_size, video.content_hash), (1000, "hash-a"))
+        self.assertKeepsDerivedData(video)
+
+    def test_changed_content_resets_the_video(self):
+        video = self.create_video("a.mp4")
+        self.sync(self.probe("a.mp4", content_hash="hash-b", mtime_ns=2, frame_count=150))
+        reset = Video.objects.get(id=video.id)
+        self.assertEqual((reset.frame_count, reset.content_hash, reset.clip_params_hash), (150, "hash-b", ""))
+        self.assertFalse(Clip.objects.filter(video=video).exists())
+        self.assertFalse(VideoPredictionCache.objects.filter(video=video).exists())
+
+    def test_moved_file_is_relinked(self):
+        video = self.create_video("a.mp4")
+        self.sync(self.probe("sub/renamed.mp4", mtime_ns=5))
+        video.refresh_from_db()
+        self.assertEqual(video.file_path, str(self.videos / "sub" / "renamed.mp4"))
+        self.assertKeepsDerivedData(video)
+
+    def test_missing_files_are_deleted(self):
+        moved_legacy = self.create_video("legacy.mp4", content_hash="")
+        other_content = self.create_video("a.mp4")
+        unreadable = self.create_video("broken.mp4")
+        # same size as both missing videos, but neither a fingerprint match nor their file
+        self.sync(self.probe("new.mp4", content_hash="hash-new"), self.probe("broken.mp4", frame_count=None))
+
+        self.assertFalse(Video.objects.filter(id__in=[moved_legacy.id, other_content.id, unreadable.id]).exists())
+        self.assertFalse(Clip.objects.exists() or VideoPredictionCache.objects.exists())
@@ -3,25 +3,39 @@ import cv2
 from PIL import Image
 from scipy.spatial import distance
 from VideoSearch.models import Keyframe
+from VideoSearch.utils.machine_profile import setting
+from VideoSearch.utils.frame_reader import rgb_array
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
+import os
 
 max_palette_dist = np.sqrt(15 * 255**2)
 
+DEFAULT_COLOR_WEIGHTS = {
+    "histogram": 1.0,
+    "palette": 0.5,
+    "colorfulness": 0.2
+}
+COLORFULNESS_MAX = 100.0
+
 class ColorFeatureExtractor:
 
-    def __init__(self, hist_bins=(32, 8, 8), use_palette=True, use_colorfulness=True, command=None):
+    def __init__(self, hist_bins=(32, 8, 8), use_palette=True, use_colorfulness=True, command=None, workers=None):
         self.command = command
         self.hist_bins = hist_bins
         self.use_palette = use_palette
         self.use_colorfulness = use_colorfulness
+        self.workers = workers or setting("color_features", "threads") or os.cpu_count() or 1
+        self._pool = None
 
-    def extract_hsv_histogram(self, image: Image.Image) -> np.ndarray:
-        img = np.array(image.convert("RGB"))
-        hsv = cv2.cvtColor(img, cv2.COLOR_RGB2HSV)
+    def extract_hsv_histogram(self, image: Image.Image | np.ndarray) -> np.ndarray:
+        hsv = cv2.cvtColor(rgb_array(image), cv2.COLOR_RGB2HSV)
         hist = cv2.calcHist([hsv], [0, 1, 2], None, self.hist_bins, [0, 180, 0, 256, 0, 256])
         return cv2.normalize(hist, hist).flatten()
 
-    def extract_dominant_colors(self, image: Image.Image, k=5) -> np.ndarray:
+    def extract_dominant_colors(self, image: Image.Image | np.ndarray, k=5) -> np.ndarray:
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
         resized_image  = image.resize((128, 128), Image.BILINEAR)
         img = np.array(resized_image .convert("RGB"))  
         pixels = img.reshape((-1, 3)).astype(np.float32)
@@ -39,13 +53,19 @@ class ColorFeatureExtractor:
         sorted_centers = centers[np.argsort(np.mean(centers, axis=1))]
         return sorted_centers.flatten()
 
-    def calculate_colorfulness(self, image: Image.Image) -> float:
-        img = np.array(image.convert("RGB")).astype("float")
-        rg = np.abs(img[:, :, 0] - img[:, :, 1])
-        yb = np.abs(0.5 * (img[:, :, 0] + img[:, :, 1]) - img[:, :, 2])
-        return np.sqrt(np.std(rg) ** 2 + np.std(yb) ** 2) + 0.3 * np.sqrt(np.mean(rg) ** 2 + np.mean(yb) ** 2)
-
-    def extract_all(self, image: Image.Image) -> dict:
+    def calculate_colorfulness(self, image: Image.Image | np.ndarray) -> float:
+        # integer cv2 kernels instead of float64 numpy passes; |0.5 * (R + G) - B| is computed as |R + G - 2B| / 2
+        r, g, b = cv2.split(rgb_array(image))
+        rg = cv2.absdiff(r, g)
+        yb = cv2.absdiff(cv2.add(r, g, dtype=cv2.CV_16S), cv2.add(b, b, dtype=cv2.CV_16S))
+        rg_mean, rg_std = cv2.meanStdDev(rg)
+        yb_mean, yb_std = cv2.meanStdDev(yb)
+        rg_mean, rg_std = rg_mean[0, 0], rg_std[0, 0]
+        yb_mean, yb_std = yb_mean[0, 0] / 2, yb_std[0, 0] / 2
+        return np.sqrt(rg_std ** 2 + yb_std ** 2) + 0.3 * np.sqrt(rg_mean ** 2 + yb_mean ** 2)
+
+    def extract_all(self, image: Image.Image | np.ndarray) -> dict:
+        image = rgb_array(image)
         result = {}
         result["histogram"] = self.extract_hsv_histogram(image)
 
@@ -57,14 +77,17 @@ class ColorFeatureExtractor:
 
         return result
 
-    def extract_all_batch(self, images: List[Image.Image]) -> List[dict]:
-        results = []
-
-        for image in images:
-            result = self.extract_all(image)
-            results.append(result)
-
-        return results
+    def extract_all_batch(self, images: List[Image.Image | np.ndarray]) -> List[dict]:
+        """
+        Batched extract_all. Images are processed in a thread pool: the OpenCV and PIL kernels
+        (including the expensive k-means) release the GIL, so frames are handled in parallel.
+        """
+        if len(images) <= 1 or self.workers == 1:
+            return [self.extract_all(image) for image in images]
+
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="color")
+        return list(self._pool.map(self.extract_all, images))
     
     def _log(self, msg, level="info"):
         if self.command:
@@ -93,14 +116,7 @@ def distance_to_feature_set(query_feat: dict, feature_list: list[dict], weights=
     return min(distances), max(distances)
 
 def compute_distance(a: dict, b: dict, weights=None) -> float:
-    DEFAULT_WEIGHTS = {
-        "histogram": 1.0,
-        "palette": 0.5,
-        "colorfulness": 0.2
-    }
-    COLORFULNESS_MAX = 100.0
-
-    weights = weights or DEFAULT_WEIGHTS
+    weights = weights or DEFAULT_COLOR_WEIGHTS
     dist = 0.0
     norm = 0.0
 
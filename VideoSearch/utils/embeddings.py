@@ -1,33 +1,70 @@
 import torch
 import torchvision.transforms as T
-from transformers import CLIPProcessor, CLIPModel
-import timm
 from PIL import Image
 from VideoSearch.utils.hardware import EmbeddingModelSelector
+from VideoSearch.utils.model_registry import load_clip, load_dino
+from VideoSearch.utils.frame_reader import rgb_array
 from VideoSearch.models import Keyframe
 import numpy as np
+import cv2
+import queue
+import threading
 from scipy.spatial.distance import cosine
 from typing import List
 
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+DINO_RESIZE = 256
+DINO_CROP = 224
+
 class ImageEmbedder:
-    def __init__(self, device=None, command=None):
+    """
+    :param num_threads: torch intra-op threads for this process (e.g. cpu_count // workers); None keeps torch's default.
+    :param batch_size: Images per model call in get_combined_embedding_batch; the next chunk is preprocessed while the current one runs.
+    :param quantize: Run the image encoders with int8 dynamically quantized linear layers (CPU only).
+    :param models: Optional (clip_model_name, dino_model_name, mode) overriding EmbeddingModelSelector.
+    """
+
+    def __init__(self, device=None, command=None, num_threads=None, batch_size=16, quantize=False, models=None):
         self.command = command
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.batch_size = max(1, batch_size)
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        if quantize and self.device != "cpu":
+            raise ValueError("Quantized embedding models are only supported on the CPU.")
+        self.quantized = quantize
 
-        clip_model_name, dino_model_name, mode = EmbeddingModelSelector.select(command=self.command)
+        clip_model_name, dino_model_name, mode = models or EmbeddingModelSelector.select(command=self.command, quantized=quantize)
         self.mode = mode
+        self.model_names = (clip_model_name, dino_model_name)
 
         self._log(f"[Embedding] Loading CLIP model: {clip_model_name}", "info")
-        self.clip_model = CLIPModel.from_pretrained(clip_model_name).to(self.device)
-        self.clip_processor = CLIPProcessor.from_pretrained(clip_model_name)
+        self.clip_model, self.clip_processor, _ = load_clip(clip_model_name)
+        self.clip_model = self.clip_model.to(self.device)
 
         self.dino_model = None
         if mode != "clip-only":
             self._log(f"[Embedding] Loading DINO model: {dino_model_name}", "info")
-            self.dino_model = timm.create_model(dino_model_name, pretrained=True).to(self.device)
+            self.dino_model = load_dino(dino_model_name).to(self.device)
             self.dino_model.eval()
 
-        self._log(f"[Embedding] Initialized mode: {mode} | Device: {self.device}", "success")
+        self.clip_model.eval()
+        if quantize:
+            self.clip_model = quantize_encoder(self.clip_model)
+            if self.dino_model is not None:
+                self.dino_model = quantize_encoder(self.dino_model)
+
+        if self.device == "cpu":
+            self.clip_model = self.clip_model.to(memory_format=torch.channels_last)
+            if self.dino_model is not None:
+                self.dino_model = self.dino_model.to(memory_format=torch.channels_last)
+
+        self.preprocessor = TensorPreprocessor(self.clip_processor, use_dino=self.dino_model is not None)
+
+        self._log(f"[Embedding] Initialized mode: {mode} | Device: {self.device} | Threads: {torch.get_num_threads()}"
+                  f"{' | int8' if quantize else ''}", "success")
 
         self.dino_transform = T.Compose([
             T.Resize(256),
@@ -62,41 +99,39 @@ class ImageEmbedder:
         return emb.detach().cpu().numpy()
 
     def get_combined_embedding(self, image: Image.Image) -> dict:
-        features = {
-            "clip_emb": self.get_clip_embedding(image)
-        }
-
-        if self.mode != "clip-only":
-            dino_emb = self.get_dino_embedding(image)
-            features["dino_emb"] = dino_emb
-        else:
-            features["dino_emb"] = None
+        # same preprocessing as the batch path, so single and batched embeddings agree
+        return self.get_combined_embedding_batch([image])[0]
 
-        return features
-
-    def get_combined_embedding_batch(self, images: List[Image.Image]) -> List[dict]:
+    def get_combined_embedding_batch(self, images: List[Image.Image | np.ndarray]) -> List[dict]:
+        """
+        Embeds images in chunks of batch_size. Tensors for both models are built from one shared
+        resized uint8 array per image; a producer thread prepares the next chunk while the models run.
+        """
+        chunks = [images[i:i + self.batch_size] for i in range(0, len(images), self.batch_size)]
         features_list = []
+        for clip_inputs, dino_inputs in prefetch(self.preprocessor, chunks):
+            features_list.extend(self._embed_tensors(clip_inputs, dino_inputs))
+        return features_list
 
-        clip_inputs = self.clip_processor(images=images, return_tensors="pt", padding=True).to(self.device)
-        with torch.no_grad():
-            clip_embs = self.clip_model.get_image_features(**clip_inputs)
+    def _embed_tensors(self, clip_inputs, dino_inputs) -> List[dict]:
+        with torch.inference_mode():
+            clip_embs = self.clip_model.get_image_features(pixel_values=clip_inputs.to(self.device))
             clip_embs = clip_embs / clip_embs.norm(dim=-1, keepdim=True)
-            clip_embs = clip_embs.detach().cpu().numpy()
+            clip_embs = clip_embs.cpu().numpy()
 
-        if self.mode != "clip-only":
-            dino_tensors = torch.stack([self.dino_transform(img) for img in images]).to(self.device)
-            with torch.no_grad():
-                dino_embs = self.dino_model(dino_tensors)
+            dino_embs = None
+            if self.mode != "clip-only":
+                dino_embs = self.dino_model(dino_inputs.to(self.device))
                 dino_embs = dino_embs / dino_embs.norm(dim=-1, keepdim=True)
-                dino_embs = dino_embs.detach().cpu().numpy()
+                dino_embs = dino_embs.cpu().numpy()
 
-        for i in range(len(images)):
-            features_list.append({
+        return [
+            {
                 "clip_emb": clip_embs[i],
-                "dino_emb": dino_embs[i] if self.mode != "clip-only" else None
-            })
-
-        return features_list
+                "dino_emb": dino_embs[i] if dino_embs is not None else None
+            }
+            for i in range(len(clip_embs))
+        ]
 
     def get_combined_distance_to_set(self, query: dict, feature_set: list[dict]):
         """
@@ -111,6 +146,121 @@ class ImageEmbedder:
             for q in queries
         ]
 
+def quantize_encoder(model):
+    """
+    Dynamic int8 quantization of all linear layers. The transformer encoders of CLIP and DINO
+    spend nearly all their time in them; weights are stored as int8 and activations are
+    quantized on the fly, so no calibration data is needed.
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+class TensorPreprocessor:
+    """
+    Builds normalized, channels_last input batches for CLIP and DINO.
+
+    Each image is resized once (shortest side to the larger of both model sizes) into a uint8
+    array shared by both models, which replaces running CLIPProcessor and the torchvision
+    Compose separately. Only the final crop, scaling and normalization happen in torch.
+    """
+
+    def __init__(self, clip_processor, use_dino=True):
+        image_processor = getattr(clip_processor, "image_processor", clip_processor)
+        size = image_processor.size
+        crop = image_processor.crop_size
+        self.clip_resize = size["shortest_edge"] if isinstance(size, dict) else int(size)
+        self.clip_crop = (crop["height"], crop["width"]) if isinstance(crop, dict) else (int(crop), int(crop))
+        self.clip_scale, self.clip_shift = _normalization(image_processor.image_mean, image_processor.image_std)
+
+        self.use_dino = use_dino
+        self.dino_scale, self.dino_shift = _normalization(IMAGENET_MEAN, IMAGENET_STD)
+        self.shared_resize = max(self.clip_resize, DINO_RESIZE) if use_dino else self.clip_resize
+
+    def __call__(self, images):
+        """Returns (clip_pixel_values, dino_pixel_values or None) for a list of images."""
+        shared = [resize_shortest_side(rgb_array(image), self.shared_resize) for image in images]
+
+        clip_frames = np.stack([
+            center_crop(resize_shortest_side(frame, self.clip_resize), *self.clip_crop) for frame in shared
+        ])
+        clip_inputs = _to_normalized_tensor(clip_frames, self.clip_scale, self.clip_shift)
+
+        dino_inputs = None
+        if self.use_dino:
+            dino_frames = np.stack([
+                center_crop(resize_shortest_side(frame, DINO_RESIZE), DINO_CROP, DINO_CROP) for frame in shared
+            ])
+            dino_inputs = _to_normalized_tensor(dino_frames, self.dino_scale, self.dino_shift)
+
+        return clip_inputs, dino_inputs
+
+def _normalization(mean, std):
+    # (x / 255 - mean) / std == x * scale + shift
+    std = torch.tensor(std, dtype=torch.float32).view(1, 3, 1, 1)
+    mean = torch.tensor(mean, dtype=torch.float32).view(1, 3, 1, 1)
+    return 1.0 / (255.0 * std), -mean / std
+
+def _to_normalized_tensor(frames: np.ndarray, scale, shift):
+    # [N, H, W, C] uint8 permuted to NCHW is already laid out as channels_last
+    tensor = torch.from_numpy(frames).permute(0, 3, 1, 2).float()
+    return tensor.mul_(scale).add_(shift).contiguous(memory_format=torch.channels_last)
+
+def resize_shortest_side(frame: np.ndarray, size: int) -> np.ndarray:
+    height, width = frame.shape[:2]
+    if min(height, width) == size:
+        return frame
+    scale = size / min(height, width)
+    new_size = (max(size, round(width * scale)), max(size, round(height * scale)))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    return cv2.resize(frame, new_size, interpolation=interpolation)
+
+def center_crop(frame: np.ndarray, height: int, width: int) -> np.ndarray:
+    top = max(0, (frame.shape[0] - height) // 2)
+    left = max(0, (frame.shape[1] - width) // 2)
+    return np.ascontiguousarray(frame[top:top + height, left:left + width])
+
+def prefetch(preprocess, batches, depth: int = 1):
+    """
+    Yields preprocess(batch) for every batch while a producer thread already prepares the
+    following ones (at most depth ahead). cv2 and torch release the GIL, so preprocessing
+    overlaps with inference.
+    """
+    if len(batches) <= 1:
+        for batch in batches:
+            yield preprocess(batch)
+        return
+
+    results = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for batch in batches:
+                if stop.is_set():
+                    return
+                results.put((preprocess(batch), None))
+        except Exception as e:
+            results.put((None, e))
+        results.put((None, StopIteration()))
+
+    producer = threading.Thread(target=produce, name="embedding-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = results.get()
+            if isinstance(error, StopIteration):
+                return
+            if error is not None:
+                raise error
+            yield item
+    finally:
+        stop.set()
+        # unblock the producer if the consumer stopped early
+        while producer.is_alive():
+            try:
+                results.get_nowait()
+            except queue.Empty:
+                producer.join(timeout=0.1)
+
 def get_distance_to_existing_keyframes(clip, query_features: dict):
     """
     Computes min/max distance from the given embedding dict to keyframes in the clip.
@@ -0,0 +1,255 @@
+import numpy as np
+from VideoSearch.models import Keyframe
+from VideoSearch.utils.color_features import DEFAULT_COLOR_WEIGHTS, COLORFULNESS_MAX, max_palette_dist
+
+class FeatureMatrix:
+    """
+    Stacks a list of feature dicts (as produced by VisualFeatureExtractor) into matrices so
+    distances between whole sets of frames can be computed with a few matrix operations.
+    Rows whose optional features are missing are tracked with masks.
+    """
+
+    def __init__(self, features: list[dict]):
+        self.size = len(features)
+
+        self.clip_emb, self.has_clip_emb = _stack(features, "clip_emb")
+        self.dino_emb, self.has_dino_emb = _stack(features, "dino_emb")
+        self.clip_emb = _normalize_rows(self.clip_emb)
+        self.dino_emb = _normalize_rows(self.dino_emb)
+
+        histogram, self.has_histogram = _stack(features, "histogram")
+        # Bhattacharyya coefficients are dot products of square-rooted histograms
+        self.histogram_sqrt = np.sqrt(np.maximum(histogram, 0)) if histogram is not None else None
+        self.histogram_sum = histogram.sum(axis=1) if histogram is not None else None
+
+        palette, self.has_palette = _stack(features, "palette")
+        self.palette = palette.reshape(self.size, -1) if palette is not None else None
+
+        colorfulness, self.has_colorfulness = _stack(features, "colorfulness")
+        self.colorfulness = colorfulness.reshape(self.size) if colorfulness is not None else None
+
+        self.has_object_vector = np.array(["object_vector" in f for f in features], dtype=bool)
+
+    def __len__(self):
+        return self.size
+
+def _stack(features: list[dict], key: str):
+    values = [f.get(key) for f in features]
+    mask = np.array([v is not None for v in values], dtype=bool)
+    if not mask.any():
+        return None, mask
+
+    template = np.asarray(next(v for v in values if v is not None), dtype=np.float64)
+    stacked = np.stack([
+        np.asarray(v, dtype=np.float64) if v is not None else np.zeros_like(template)
+        for v in values
+    ])
+    return stacked, mask
+
+def _normalize_rows(matrix):
+    if matrix is None:
+        return None
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+def cosine_distance_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Cosine distances between row-normalized matrices, equal to scipy's cosine per pair."""
+    return 1.0 - a @ b.T
+
+def bhattacharyya_distance_matrix(a: FeatureMatrix, b: FeatureMatrix) -> np.ndarray:
+    """Same result as cv2.compareHist(..., cv2.HISTCMP_BHATTACHARYYA) for every pair of rows."""
+    coefficients = a.histogram_sqrt @ b.histogram_sqrt.T
+    scale = a.histogram_sum[:, None] * b.histogram_sum[None, :]
+    scale = np.where(np.abs(scale) > np.finfo(np.float64).eps, 1.0 / np.sqrt(np.abs(scale)), 1.0)
+    return np.sqrt(np.maximum(1.0 - coefficients * scale, 0.0))
+
+def embedding_distance_matrix(a: FeatureMatrix, b: FeatureMatrix) -> np.ndarray:
+    """Vectorized calculate_combined_distance: mean of the CLIP and (if both present) DINO cosine distances."""
+    if a.clip_emb is None or b.clip_emb is None:
+        raise ValueError("No valid embeddings provided for distance calculation.")
+
+    distance = cosine_distance_matrix(a.clip_emb, b.clip_emb)
+    if a.dino_emb is None or b.dino_emb is None:
+        return distance
+
+    both_dino = a.has_dino_emb[:, None] & b.has_dino_emb[None, :]
+    dino_distance = cosine_distance_matrix(a.dino_emb, b.dino_emb)
+    return np.where(both_dino, (distance + dino_distance) / 2, distance)
+
+def color_distance_matrix(a: FeatureMatrix, b: FeatureMatrix, weights=None) -> np.ndarray:
+    """Vectorized color_features.compute_distance for every pair of rows."""
+    weights = weights or DEFAULT_COLOR_WEIGHTS
+    dist = np.zeros((len(a), len(b)))
+    norm = np.zeros((len(a), len(b)))
+
+    if a.histogram_sqrt is not None and b.histogram_sqrt is not None:
+        w = weights.get("histogram", 1.0)
+        dist += w * bhattacharyya_distance_matrix(a, b)
+        norm += w
+
+    if a.palette is not None and b.palette is not None:
+        w = weights.get("palette", 0.5)
+        both = a.has_palette[:, None] & b.has_palette[None, :]
+        squared = (
+            (a.palette ** 2).sum(axis=1)[:, None] + (b.palette ** 2).sum(axis=1)[None, :]
+            - 2 * a.palette @ b.palette.T
+        )
+        euclid = np.sqrt(np.maximum(squared, 0.0))
+        dist += np.where(both, w * euclid / max_palette_dist, 0.0)
+        norm += np.where(both, w, 0.0)
+
+    if a.colorfulness is not None and b.colorfulness is not None:
+        w = weights.get("colorfulness", 0.2)
+        diff = np.minimum(COLORFULNESS_MAX, np.abs(a.colorfulness[:, None] - b.colorfulness[None, :])) / COLORFULNESS_MAX
+        dist += w * diff
+        norm += w
+
+    return np.where(norm > 0, dist / np.where(norm > 0, norm, 1.0), 1.0)
+
+def nonlinear_pooling_rows(distances: np.ndarray, alpha: float = 5.0) -> np.ndarray:
+    """nonlinear_pooling applied along the last axis, e.g. row-wise on a [rows, distances] matrix."""
+    if distances.shape[-1] == 0:
+        return np.ones(distances.shape[:-1])
+    weights = np.exp(alpha * distances)
+    return np.sum(distances * weights, axis=-1) / np.sum(weights, axis=-1)
+
+def combined_distance_matrix(a: FeatureMatrix, b: FeatureMatrix) -> np.ndarray:
+    """
+    Vectorized visual_feature_extractor.compute_distance for every pair of rows: embedding,
+    color and object distances pooled with nonlinear_pooling.
+    """
+    distances = []
+
+    if a.has_clip_emb.any() and b.has_clip_emb.any():
+        distances.append(embedding_distance_matrix(a, b))
+
+    if a.has_histogram.any() and b.has_histogram.any():
+        distances.append(color_distance_matrix(a, b))
+
+    if a.has_object_vector.all() and b.has_object_vector.all():
+        # soft_object_distance reads the "object_vec" key, so dicts carrying "object_vector" score 1.0
+        distances.append(np.ones((len(a), len(b))))
+
+    if not distances:
+        return np.ones((len(a), len(b)))
+
+    return nonlinear_pooling_rows(np.stack(distances, axis=-1))
+
+class CandidatePool:
+    """
+    Pairwise combined distances between candidate frames of a change region.
+
+    The distance matrix is computed once; medoid() picks the candidate with the smallest
+    median distance to all other remaining candidates (like select_representative did pair
+    by pair), and keep() removes candidates without recomputing any distances.
+    """
+
+    def __init__(self, candidates: list):
+        self.candidates = list(candidates)
+        self.active = np.ones(len(self.candidates), dtype=bool)
+
+        matrix = FeatureMatrix([features for _, features in self.candidates])
+        self.distances = combined_distance_matrix(matrix, matrix) if self.candidates else np.zeros((0, 0))
+
+    def __len__(self):
+        return int(self.active.sum())
+
+    def remaining(self) -> list:
+        return [self.candidates[i] for i in np.flatnonzero(self.active)]
+
+    def medoid(self):
+        """Returns the (frame_number, features) tuple of the most representative remaining candidate."""
+        indices = np.flatnonzero(self.active)
+        if len(indices) == 0:
+            return None
+        if len(indices) == 1:
+            return self.candidates[indices[0]]
+
+        distances = self.distances[np.ix_(indices, indices)]
+        np.fill_diagonal(distances, np.nan)
+        medians = np.nanmedian(distances, axis=1)
+        return self.candidates[indices[np.argmin(medians)]]
+
+    def keep(self, mask):
+        """Keeps only the remaining candidates where mask (aligned with remaining()) is True."""
+        indices = np.flatnonzero(self.active)
+        self.active[indices[~np.asarray(mask, dtype=bool)]] = False
+
+class KeyframeAccumulator:
+    """
+    Collects the accepted keyframes of one clip in memory during extraction.
+
+    Their features are kept as a FeatureMatrix, so novelty checks of candidate frames are
+    answered without any database queries. All keyframes are written with a single
+    bulk_create when the clip is flushed.
+
+    :param detector: Optional ObjectDetector. If given, objects are detected on the decoded
+        keyframe images during flush and stored with the keyframes, so no separate
+        extract_objects pass has to read the images again.
+    :param detector_batch_size: Images per object detection call.
+    """
+
+    def __init__(self, clip, detector=None, detector_batch_size: int = 8):
+        self.clip = clip
+        self.detector = detector
+        self.detector_batch_size = max(1, detector_batch_size)
+        self.frames = []
+        self.features = []
+        self.images = []
+        self._matrix = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def add(self, frame: int, features: dict, image=None):
+        """:param image: Decoded frame, if available; saved on flush instead of extracting the frame again."""
+        self.frames.append(frame)
+        self.features.append(features)
+        self.images.append(image)
+        self._matrix = None
+
+    @property
+    def signatures(self) -> list:
+        """Frame signatures of the accepted keyframes (see frame_hash), where available."""
+        return [features["signature"] for features in self.features if features.get("signature") is not None]
+
+    @property
+    def matrix(self) -> FeatureMatrix:
+        if self._matrix is None:
+            self._matrix = FeatureMatrix(self.features)
+        return self._matrix
+
+    def flush(self) -> list:
+        """Stores all collected keyframes and their images, then clears the accumulator."""
+        keyframes = [
+            Keyframe.build(
+                self.clip,
+                frame,
+                features["clip_emb"],
+                features.get("dino_emb"),
+                features.get("histogram"),
+                features.get("palette"),
+                features.get("colorfulness"),
+            )
+            for frame, features in zip(self.frames, self.features)
+        ]
+
+        # image paths only depend on clip and frame, so images can be written before the rows exist
+        images = [keyframe.save_image(image) for keyframe, image in zip(keyframes, self.images)]
+        if self.detector is not None:
+            self._detect_objects(keyframes, images)
+
+        Keyframe.objects.bulk_create(keyframes)
+
+        self.frames, self.features, self.images, self._matrix = [], [], [], None
+        return keyframes
+
+    def _detect_objects(self, keyframes, images):
+        decoded = [(keyframe, image) for keyframe, image in zip(keyframes, images) if image is not None]
+        for i in range(0, len(decoded), self.detector_batch_size):
+            batch = decoded[i:i + self.detector_batch_size]
+            vectors = self.detector.extract_vector_batch([image for _, image in batch])
+            for (keyframe, _), vec in zip(batch, vectors):
+                # same rule as extract_objects: empty detections stay NULL
+                if vec is not None and np.linalg.norm(vec) > 0:
+                    keyframe.object_vector = Keyframe.compress_array(vec)
@@ -0,0 +1,35 @@
+import numpy as np
+import cv2
+from PIL import Image
+
+SIGNATURE_SIZE = 16
+DEFAULT_DEDUP_TOLERANCE = 0.0
+
+def frame_signature(image: Image.Image | np.ndarray, size: int = SIGNATURE_SIZE) -> np.ndarray:
+    """
+    Tiny grayscale thumbnail (size x size, values in [0, 1]) used to spot near-identical frames.
+    Area interpolation averages over blocks, so encoder noise and grain barely change it.
+    """
+    frame = np.asarray(image.convert("RGB")) if isinstance(image, Image.Image) else np.asarray(image, dtype=np.uint8)
+    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+    thumbnail = cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA)
+    return thumbnail.astype(np.float32) / 255.0
+
+def signature_distance(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean absolute difference between two signatures (0 = identical thumbnails, 1 = inverted)."""
+    return float(np.mean(np.abs(a - b)))
+
+def distinct_frames(signatures: list, tolerance: float = DEFAULT_DEDUP_TOLERANCE, reference: list = None) -> list[int]:
+    """
+    Greedily keeps the frames whose signature differs by more than tolerance from every frame
+    kept before it and from every reference signature (e.g. the clip's accepted keyframes).
+    Returns the indices of the kept frames.
+    """
+    kept = []
+    known = list(reference or [])
+    for i, signature in enumerate(signatures):
+        if known and np.abs(np.stack(known) - signature).mean(axis=(1, 2)).min() <= tolerance:
+            continue
+        kept.append(i)
+        known.append(signature)
+    return kept
@@ -0,0 +1,75 @@
+from collections import Counter
+from PIL import Image
+import numpy as np
+import cv2
+
+class SequentialFrameReader:
+    """
+    Reads a known set of frames of a video in a single forward decode instead of one seek per frame.
+
+    All frames that will be requested are passed up front. Frames that are not needed are only
+    grabbed (decoded, but neither converted nor copied); needed frames are kept until every request
+    for them was served, so memory stays bounded by the frames requested but not yet consumed.
+    Requests must come in increasing frame order; frames behind the decoder position are returned as None.
+
+    :param video_path: Video file to read.
+    :param frames: Absolute frame numbers that will be requested (duplicates allowed).
+    """
+
+    def __init__(self, video_path, frames):
+        self.video_path = str(video_path)
+        self.remaining = Counter(frames)
+        self.last_frame = max(self.remaining, default=-1)
+        self.buffer = {}
+        self.position = 0
+        self.capture = None
+
+    def open(self):
+        self.capture = cv2.VideoCapture(self.video_path)
+        if not self.capture.isOpened():
+            print(f"[FrameReader] Could not open {self.video_path}")
+        return self
+
+    def close(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+        self.buffer = {}
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, frames: list[int]) -> list:
+        """Returns PIL RGB images for the given absolute frame numbers (None where a frame could not be decoded)."""
+        if frames:
+            self._decode_until(max(frames))
+
+        images = [self.buffer.get(frame) for frame in frames]
+        for frame in frames:
+            self.remaining[frame] -= 1
+            if self.remaining[frame] <= 0:
+                self.buffer.pop(frame, None)
+        return images
+
+    def _decode_until(self, frame: int):
+        frame = min(frame, self.last_frame)
+        while self.capture is not None and self.position <= frame:
+            if not self.capture.grab():
+                # end of stream or broken file; frames after this stay None
+                self.capture.release()
+                self.capture = None
+                return
+            if self.remaining[self.position] > 0:
+                ok, bgr = self.capture.retrieve()
+                if ok:
+                    self.buffer[self.position] = Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+            self.position += 1
+
+def rgb_array(image) -> np.ndarray:
+    """Contiguous RGB uint8 array of a PIL image; arrays (e.g. frames decoded with ffmpeg) are passed through."""
+    if isinstance(image, np.ndarray):
+        return np.ascontiguousarray(image, dtype=np.uint8)
+    return np.ascontiguousarray(np.asarray(image.convert("RGB")))
@@ -12,7 +12,14 @@ except ImportError:
 
 class EmbeddingModelSelector:
     @staticmethod
-    def select(command=None):
+    def select(command=None, quantized=False):
+        """
+        Returns (clip_model_name, dino_model_name, mode) for this machine.
+
+        :param quantized: The image encoders will run int8-quantized on the CPU. CPU-only machines
+            then also use a small DINO model instead of dropping it. CLIP stays the model the
+            search uses on CPU, so image and text embeddings remain comparable.
+        """
         def log(msg, level='info'):
             if command:
                 command.stdout.write(getattr(command, f'style_{level}')(msg))
@@ -20,6 +27,9 @@ class EmbeddingModelSelector:
                 print(msg)
 
         if not torch.cuda.is_available():
+            if quantized:
+                log("[Embedding] No GPU found, using int8-quantized CPU encoders with DINO.", "info")
+                return "openai/clip-vit-base-patch32", "vit_small_patch16_224_dino", "full"
             log("[Embedding] No GPU found, using CPU-only mode.", "warning")
             return "openai/clip-vit-base-patch32", None, "clip-only"
 
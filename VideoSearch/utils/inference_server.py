@@ -0,0 +1,225 @@
+import multiprocessing as mp
+import numpy as np
+import queue
+import time
+import os
+from multiprocessing.util import Finalize
+from multiprocessing import shared_memory
+from VideoSearch.utils.frame_reader import rgb_array
+
+DEFAULT_SLOT_BYTES = 64 * 1024 ** 2
+RESPONSE_TIMEOUT = 600
+
+class InferenceServer:
+    """
+    Runs the embedding models (CLIP/DINO) once in a separate local process for all import workers.
+
+    Every worker gets a slot: a shared memory block it writes its frames into and a response queue.
+    Requests only carry offsets and shapes, so frames are never pickled. The server gathers the
+    requests of all workers into large batches (until max_batch frames are queued or max_wait
+    seconds passed) and sends the embeddings back per request.
+
+    :param slots: Number of client slots, i.e. worker processes.
+    :param slot_bytes: Shared memory per slot; larger requests are split by the client.
+    :param max_batch: Frames gathered before a batch runs; also the chunk size of each model call.
+    :param max_wait: Seconds the server waits for further requests before running a batch.
+    :param embedder_kwargs: Keyword arguments for ImageEmbedder in the server process.
+    """
+
+    def __init__(self, slots: int, slot_bytes: int = DEFAULT_SLOT_BYTES, max_batch: int = 64, max_wait: float = 0.05, **embedder_kwargs):
+        self.slots = max(1, slots)
+        self.slot_bytes = slot_bytes
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.embedder_kwargs = embedder_kwargs
+        self.process = None
+        self.memory = []
+
+    def start(self):
+        self.memory = [shared_memory.SharedMemory(create=True, size=self.slot_bytes) for _ in range(self.slots)]
+        self.requests = mp.Queue()
+        self.responses = [mp.Queue() for _ in range(self.slots)]
+        # pid of the worker owning each slot, 0 if free
+        self.slot_owners = mp.Array("i", self.slots)
+
+        self.process = mp.Process(
+            target=serve,
+            args=([m.name for m in self.memory], self.requests, self.responses, self.max_batch, self.max_wait, self.embedder_kwargs),
+            name="inference-server",
+            daemon=True,
+        )
+        self.process.start()
+        return self
+
+    def client_config(self) -> tuple:
+        """Picklable handle passed to the workers (e.g. as Pool initargs); see RemoteEmbedder.connect."""
+        return ([m.name for m in self.memory], self.slot_bytes, self.requests, self.responses, self.slot_owners, self.embedder_kwargs.get("models"))
+
+    def stop(self):
+        if self.process is not None:
+            self.requests.put(None)
+            self.process.join()
+            self.process = None
+        for memory in self.memory:
+            memory.close()
+            memory.unlink()
+        self.memory = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class RemoteEmbedder:
+    """
+    Drop-in replacement for ImageEmbedder inside worker processes that sends frames to an InferenceServer.
+    """
+
+    def __init__(self, memory_name: str, slot_bytes: int, slot: int, requests, response, models=None):
+        self.memory = shared_memory.SharedMemory(name=memory_name)
+        # known if the server was started with explicit models; used in the keyframe settings hash
+        self.model_names = tuple(models[:2]) if models else None
+        self.slot_bytes = slot_bytes
+        self.slot = slot
+        self.requests = requests
+        self.response = response
+        self._request_id = 0
+
+    @classmethod
+    def connect(cls, config: tuple):
+        """
+        Claims a free slot of the server described by InferenceServer.client_config(). The slot is given
+        back when the process exits; slots of processes that died without exiting (e.g. killed pool
+        workers) are taken over, so respawned workers always find one.
+        """
+        memory_names, slot_bytes, requests, responses, slot_owners, models = config
+        pid = os.getpid()
+        with slot_owners.get_lock():
+            slot = next((i for i, owner in enumerate(slot_owners) if owner == 0 or not _process_alive(owner)), None)
+            if slot is None:
+                raise RuntimeError(f"All {len(memory_names)} slot(s) of the inference server are in use.")
+            slot_owners[slot] = pid
+        Finalize(None, _release_slot, args=(slot_owners, slot, pid), exitpriority=10)
+        return cls(memory_names[slot], slot_bytes, slot, requests, responses[slot], models)
+
+    def get_combined_embedding(self, image) -> dict:
+        return self.get_combined_embedding_batch([image])[0]
+
+    def get_combined_embedding_batch(self, images: list) -> list[dict]:
+        frames = [rgb_array(image) for image in images]
+        features = []
+        start = 0
+        while start < len(frames):
+            layout, offset = [], 0
+            for frame in frames[start:]:
+                if offset + frame.nbytes > self.slot_bytes:
+                    if not layout:
+                        raise ValueError(f"Frame of {frame.nbytes} bytes does not fit into the {self.slot_bytes} byte slot.")
+                    break
+                np.ndarray(frame.shape, dtype=np.uint8, buffer=self.memory.buf, offset=offset)[:] = frame
+                layout.append((offset, frame.shape))
+                offset += frame.nbytes
+
+            features.extend(self._request(layout))
+            start += len(layout)
+        return features
+
+    def _request(self, layout) -> list[dict]:
+        # ids carry the pid, so answers to a previous owner of the slot are recognized and dropped
+        self._request_id += 1
+        expected = (os.getpid(), self._request_id)
+        self.requests.put((self.slot, expected, layout))
+        while True:
+            try:
+                request_id, result = self.response.get(timeout=RESPONSE_TIMEOUT)
+            except queue.Empty:
+                raise RuntimeError("Inference server did not respond.")
+            if request_id[0] == expected[0]:
+                break
+        if isinstance(result, str):
+            raise RuntimeError(f"Inference server failed: {result}")
+        if request_id != expected:
+            raise RuntimeError(f"Inference server answered request {request_id}, expected {expected}.")
+        return result
+
+def _release_slot(slot_owners, slot, pid):
+    with slot_owners.get_lock():
+        if slot_owners[slot] == pid:
+            slot_owners[slot] = 0
+
+def _process_alive(pid: int) -> bool:
+    if os.name == "nt":
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def serve(memory_names, requests, responses, max_batch, max_wait, embedder_kwargs):
+    """Server process: loads the models once, then answers requests in dynamic batches until it receives None."""
+    import os
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ContentBasedVideoRetrieval.settings")
+    import django
+    django.setup()
+
+    from VideoSearch.utils.embeddings import ImageEmbedder
+
+    memory = [shared_memory.SharedMemory(name=name) for name in memory_names]
+    embedder = ImageEmbedder(command=None, batch_size=max_batch, **embedder_kwargs)
+    print(f"[InferenceServer] Ready with {len(memory)} slot(s), batches of up to {max_batch} frames.")
+
+    served = frames_served = 0
+    running = True
+    while running:
+        pending = [requests.get()]
+        if pending[0] is None:
+            break
+
+        size = len(pending[0][2])
+        deadline = time.monotonic() + max_wait
+        while size < max_batch:
+            try:
+                request = requests.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if request is None:
+                running = False
+                break
+            pending.append(request)
+            size += len(request[2])
+
+        frames = [
+            np.ndarray(shape, dtype=np.uint8, buffer=memory[slot].buf, offset=offset).copy()
+            for slot, _, layout in pending
+            for offset, shape in layout
+        ]
+        try:
+            features = embedder.get_combined_embedding_batch(frames)
+        except Exception as e:
+            for slot, request_id, _ in pending:
+                responses[slot].put((request_id, str(e)))
+            continue
+
+        start = 0
+        for slot, request_id, layout in pending:
+            responses[slot].put((request_id, features[start:start + len(layout)]))
+            start += len(layout)
+
+        served += 1
+        frames_served += len(frames)
+
+    for m in memory:
+        m.close()
+    print(f"[InferenceServer] Stopped after {served} batch(es), {frames_served} frame(s), {frames_served / max(1, served):.1f} frames per batch.")
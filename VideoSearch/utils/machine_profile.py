@@ -0,0 +1,36 @@
+import json
+import socket
+from pathlib import Path
+
+PROFILE_ROOT = Path("data/profiles")
+
+def profile_path(hostname: str = None) -> Path:
+    return PROFILE_ROOT / f"{hostname or socket.gethostname()}.json"
+
+def load_profile(path: Path = None) -> dict:
+    """Returns the tuned settings of this machine (written by tune_import), or {} if there are none."""
+    path = Path(path or profile_path())
+    if not path.is_file():
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[Profile] Ignoring unreadable machine profile {path}: {e}")
+        return {}
+
+def save_profile(profile: dict, path: Path = None) -> Path:
+    path = Path(path or profile_path())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(profile, f, indent=2, sort_keys=True)
+    return path
+
+def command_defaults(command_name: str, profile: dict = None) -> dict:
+    """Option defaults (argparse dests) the profile stores for a management command."""
+    profile = load_profile() if profile is None else profile
+    return dict(profile.get("commands", {}).get(command_name, {}))
+
+def setting(section: str, key: str, default=None):
+    """A single tuned value outside of command options, e.g. setting("color_features", "threads")."""
+    return load_profile().get(section, {}).get(key, default)
@@ -0,0 +1,60 @@
+from pathlib import Path
+import hashlib
+import json
+
+HASH_SAMPLES = 8
+HASH_CHUNK_BYTES = 64 * 1024
+
+def content_hash(path, samples: int = HASH_SAMPLES, chunk_bytes: int = HASH_CHUNK_BYTES) -> str:
+    """
+    Fingerprint of a file from its size and evenly spaced byte samples (first and last chunk included).
+    Reads at most samples * chunk_bytes, so it is cheap even for large videos, yet survives renames and moves.
+
+    :param path: File to fingerprint.
+    :param samples: Number of chunks read.
+    :param chunk_bytes: Size of every chunk.
+    :return: Hex digest.
+    """
+    size = Path(path).stat().st_size
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, "rb") as f:
+        if size <= samples * chunk_bytes:
+            digest.update(f.read())
+        else:
+            step = (size - chunk_bytes) / (samples - 1)
+            for i in range(samples):
+                f.seek(int(i * step))
+                digest.update(f.read(chunk_bytes))
+    return digest.hexdigest()
+
+def params_hash(params: dict) -> str:
+    """Short stable hash of stage parameters; stored with the stage output to detect parameter changes."""
+    encoded = json.dumps({key: params[key] for key in sorted(params)}, default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+def clip_params_hash(kwargs: dict) -> str:
+    """Hash of the segmentation settings of extract_clips (defaults for missing keys)."""
+    from VideoSearch.management.commands.extract_clips import DEFAULT_CLIP_EXTRACTION_SETTINGS
+    return params_hash({key: kwargs.get(key, default) for key, default in DEFAULT_CLIP_EXTRACTION_SETTINGS.items()})
+
+def keyframe_params_hash(threshold, search_range_factor, frames_to_compare, dedup_tolerance, quantize, model_names=None) -> str:
+    """
+    Hash of everything besides the clip itself that changes which keyframes are extracted.
+
+    :param model_names: (clip_model_name, dino_model_name) of the embedder. Without them the hash
+        equals the one stored before model names were part of it.
+    """
+    params = {
+        "threshold": threshold,
+        "search_range_factor": search_range_factor,
+        "frames_to_compare": frames_to_compare,
+        "dedup_tolerance": dedup_tolerance,
+        "quantize": bool(quantize),
+    }
+    if model_names:
+        params["models"] = list(model_names)
+    return params_hash(params)
+
+def is_stale(stored_hash: str, current_hash: str) -> bool:
+    """Output without a stored hash predates the manifest and is treated as up to date."""
+    return bool(stored_hash) and stored_hash != current_hash
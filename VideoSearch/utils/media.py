@@ -0,0 +1,145 @@
+"""
+Serving of media files with byte ranges (206) and conditional requests (ETag/Last-Modified), so the
+browser can seek in long videos without downloading them and revalidate images without refetching.
+Whole files are passed to the WSGI server's file wrapper, which uses sendfile where available.
+"""
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from urllib.parse import quote
+from pathlib import Path
+import mimetypes
+import re
+
+DEFAULT_MEDIA_SERVED_DIRS = ["videos", "keyframes", "proxies"]
+MEDIA_CACHE_CONTROL = "no-cache"
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+class RangeFile:
+    """
+    Read-only view of length bytes of an open file, starting at its current position. Keeps
+    fileno(), so servers that send files with os.sendfile (e.g. gunicorn) still do so for the range.
+    """
+
+    def __init__(self, file, length: int):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self) -> int:
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+def served_dirs() -> list:
+    """Top-level folders of MEDIA_ROOT that media_view serves (MEDIA_SERVED_DIRS setting)."""
+    return getattr(settings, "MEDIA_SERVED_DIRS", DEFAULT_MEDIA_SERVED_DIRS)
+
+def file_etag(stat) -> str:
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parses a single "bytes=first-last" range (also "first-" and the suffix form "-length").
+
+    :param header: Value of the Range header.
+    :param size: File size in bytes.
+    :return: (first, last) byte, both inclusive; None if there is no usable range and the whole file is sent.
+    :raises ValueError: If the range lies outside of the file (416).
+    """
+    match = RANGE_PATTERN.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Empty suffix range.")
+        return max(0, size - length), size - 1
+
+    first = int(first)
+    if first >= size:
+        raise ValueError("Range starts after the end of the file.")
+    last = min(int(last), size - 1) if last else size - 1
+    return (first, last) if first <= last else None
+
+def if_range_matches(request, etag: str, last_modified: int) -> bool:
+    """A range is only served if the If-Range validator (if any) still matches, otherwise the whole file is sent."""
+    validator = request.headers.get("If-Range")
+    if not validator:
+        return True
+    if validator.startswith(('"', "W/")):
+        return validator == etag
+    return parse_http_date_safe(validator) == last_modified
+
+def serve_file(request, path: Path, relative_path: str = None, content_type: str = None, cache_control: str = MEDIA_CACHE_CONTROL):
+    """
+    Response for a file with ETag/Last-Modified validation (304/412) and single byte ranges (206/416).
+    With MEDIA_SENDFILE_HEADER set and a relative_path given, the web server sends the file instead.
+
+    :param request: The request.
+    :param path: File to send.
+    :param relative_path: Path below MEDIA_ROOT, used for X-Accel-Redirect.
+    :param content_type: Content type (guessed from the file name if None).
+    :param cache_control: Value of the Cache-Control header.
+    """
+    stat = path.stat()
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+    content_type = content_type or mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        sendfile_header = getattr(settings, "MEDIA_SENDFILE_HEADER", None)
+        if sendfile_header and relative_path is not None:
+            response = sendfile_response(sendfile_header, path, relative_path, content_type)
+        else:
+            response = file_response(request, path, stat.st_size, content_type, etag, last_modified)
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Accept-Ranges"] = "bytes"
+    response["Cache-Control"] = cache_control
+    return response
+
+def file_response(request, path: Path, size: int, content_type: str, etag: str, last_modified: int):
+    try:
+        byte_range = parse_range(request.headers.get("Range"), size) if if_range_matches(request, etag, last_modified) else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    file = open(path, "rb")
+    if byte_range is None:
+        return FileResponse(file, content_type=content_type)
+
+    first, last = byte_range
+    file.seek(first)
+    response = FileResponse(RangeFile(file, last - first + 1), status=206, content_type=content_type)
+    response["Content-Length"] = str(last - first + 1)
+    response["Content-Range"] = f"bytes {first}-{last}/{size}"
+    return response
+
+def sendfile_response(header: str, path: Path, relative_path: str, content_type: str):
+    """
+    Empty response telling the web server which file to send; it then handles ranges itself.
+    X-Accel-Redirect (nginx) points to an internal location aliasing MEDIA_ROOT (MEDIA_ACCEL_REDIRECT_PREFIX),
+    X-Sendfile (Apache mod_xsendfile, lighttpd) to the absolute path.
+    """
+    response = HttpResponse(content_type=content_type)
+    if header.lower() == "x-accel-redirect":
+        prefix = getattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", "/protected-media/")
+        response[header] = prefix.rstrip("/") + "/" + quote(relative_path.replace("\\", "/"))
+    else:
+        response[header] = str(path.resolve())
+    return response
@@ -0,0 +1,175 @@
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+MODEL_ROOT = Path("data/models")
+CLIP_ROOT = MODEL_ROOT / "clip"
+DINO_ROOT = MODEL_ROOT / "dino"
+YOLO_ROOT = MODEL_ROOT / "yolo"
+TRANSNET_SAFETENSORS = MODEL_ROOT / "transnetv2" / "transnetv2-pytorch.safetensors"
+
+def offline() -> bool:
+    """
+    Offline mode never contacts a model hub; every model must have been fetched with fetch_models.
+    Enabled by the MODELS_OFFLINE setting or the VIDEOSEARCH_OFFLINE environment variable.
+    """
+    if os.environ.get("VIDEOSEARCH_OFFLINE", "").lower() in ("1", "true", "yes"):
+        return True
+    try:
+        from django.conf import settings
+        return bool(getattr(settings, "MODELS_OFFLINE", False))
+    except Exception:
+        return False
+
+def _configure_hub():
+    if offline():
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+
+def _slug(name: str) -> str:
+    return name.replace("/", "__")
+
+def _missing(kind: str, name: str, path: Path):
+    return FileNotFoundError(f"[Models] {kind} model '{name}' is not available at {path} and offline mode is enabled. Run: python manage.py fetch_models")
+
+def clip_dir(name: str) -> Path:
+    return CLIP_ROOT / _slug(name)
+
+def dino_file(name: str) -> Path:
+    return DINO_ROOT / f"{name}.safetensors"
+
+def yolo_file(name: str) -> Path:
+    return YOLO_ROOT / name
+
+def load_clip(name: str, with_processor: bool = True, with_tokenizer: bool = False):
+    """
+    Returns (model, processor or None, tokenizer or None). Fetched models are built from their config
+    without weights (see empty_weights) and get the memory-mapped safetensors weights assigned like
+    DINO, so processes on one host share them via the page cache; models loaded from the hub are
+    deserialized as usual.
+    """
+    from transformers import CLIPConfig, CLIPModel, CLIPProcessor, CLIPTokenizer
+
+    _configure_hub()
+    local = clip_dir(name)
+    if local.is_dir():
+        source, options = str(local), {"local_files_only": True}
+    elif offline():
+        raise _missing("CLIP", name, local)
+    else:
+        source, options = name, {}
+
+    weights = local / "model.safetensors"
+    if weights.is_file():
+        with empty_weights():
+            model = CLIPModel(CLIPConfig.from_pretrained(source, **options))
+        missing, _ = model.load_state_dict(load_safetensors(weights), strict=False, assign=True)
+        if missing:
+            raise RuntimeError(f"[Models] {weights} lacks {len(missing)} weights, e.g. {missing[0]}. Run: python manage.py fetch_models")
+        model.eval()
+    else:
+        model = CLIPModel.from_pretrained(source, low_cpu_mem_usage=True, **options)
+    processor = CLIPProcessor.from_pretrained(source, **options) if with_processor else None
+    tokenizer = CLIPTokenizer.from_pretrained(source, **options) if with_tokenizer else None
+    return model, processor, tokenizer
+
+def load_dino(name: str):
+    """Creates the timm DINO model and assigns memory-mapped safetensors weights if they were fetched."""
+    import timm
+
+    _configure_hub()
+    local = dino_file(name)
+    if not local.is_file():
+        if offline():
+            raise _missing("DINO", name, local)
+        return timm.create_model(name, pretrained=True)
+
+    with empty_weights():
+        model = timm.create_model(name, pretrained=False)
+    model.load_state_dict(load_safetensors(local), assign=True)
+    return model
+
+def yolo_weights(name: str) -> str:
+    """Path of the local YOLO checkpoint; ultralytics downloads by name otherwise."""
+    local = yolo_file(name)
+    if local.is_file():
+        return str(local)
+    if offline():
+        raise _missing("YOLO", name, local)
+    return name
+
+@contextmanager
+def empty_weights():
+    """
+    Creates the parameters of modules built inside on the meta device: no memory and no random
+    initialization, which load_state_dict(..., assign=True) would throw away anyway. Buffers stay
+    real, as non-persistent ones (e.g. position ids) are not part of a checkpoint.
+    """
+    import torch
+
+    register_parameter = torch.nn.Module.register_parameter
+
+    def register_empty_parameter(module, name, param):
+        register_parameter(module, name, param)
+        if param is not None:
+            module._parameters[name] = torch.nn.Parameter(param.to("meta"), requires_grad=param.requires_grad)
+
+    torch.nn.Module.register_parameter = register_empty_parameter
+    try:
+        yield
+    finally:
+        torch.nn.Module.register_parameter = register_parameter
+
+def load_safetensors(path: Path) -> dict:
+    """
+    Loads a state dict whose tensors are backed by a memory map of the file. Combined with
+    load_state_dict(..., assign=True) processes on one host share the weights via the page cache.
+    """
+    from safetensors.torch import load_file
+    return load_file(str(path), device="cpu")
+
+def save_safetensors(state_dict: dict, path: Path):
+    from safetensors.torch import save_file
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # safetensors refuses shared or non-contiguous storages
+    save_file({key: tensor.detach().contiguous().clone() for key, tensor in state_dict.items()}, str(path))
+
+def fetch_clip(name: str) -> Path:
+    from transformers import CLIPModel, CLIPProcessor, CLIPTokenizer
+
+    target = clip_dir(name)
+    CLIPModel.from_pretrained(name).save_pretrained(target, safe_serialization=True)
+    CLIPProcessor.from_pretrained(name).save_pretrained(target)
+    CLIPTokenizer.from_pretrained(name).save_pretrained(target)
+    return target
+
+def fetch_dino(name: str) -> Path:
+    import timm
+
+    target = dino_file(name)
+    save_safetensors(timm.create_model(name, pretrained=True).state_dict(), target)
+    return target
+
+def fetch_yolo(name: str) -> Path:
+    import shutil
+    from ultralytics import YOLO
+
+    target = yolo_file(name)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    model = YOLO(name)  # downloads into the working directory if necessary
+    shutil.copyfile(model.ckpt_path, target)
+    return target
+
+def convert_transnet() -> Path:
+    """Stores the converted PyTorch TransNetV2 weights as safetensors."""
+    import torch
+    from VideoSearch.utils.shot_boundaries import TRANSNET_PYTORCH_WEIGHTS
+
+    if not TRANSNET_PYTORCH_WEIGHTS.is_file():
+        raise FileNotFoundError(
+            f"{TRANSNET_PYTORCH_WEIGHTS} does not exist. Convert the TensorFlow weights first: "
+            f"cd {TRANSNET_PYTORCH_WEIGHTS.parent} && python convert_weights.py"
+        )
+    save_safetensors(torch.load(TRANSNET_PYTORCH_WEIGHTS, map_location="cpu"), TRANSNET_SAFETENSORS)
+    return TRANSNET_SAFETENSORS
@@ -4,6 +4,7 @@ import numpy as np
 from collections import Counter
 from typing import List, Set
 from VideoSearch.models import Keyframe
+from VideoSearch.utils.model_registry import yolo_weights
 
 # YOLOv8 COCO class names (80 classes)
 YOLO_CLASSES = [
@@ -30,7 +31,7 @@ def label_dict_to_vector(label_conf: dict) -> np.ndarray:
 class ObjectDetector:
     def __init__(self, model_name="yolov8x.pt", command=None, conf_threshold=0.05):
         self.command = command
-        self.model = YOLO(model_name)
+        self.model = YOLO(yolo_weights(model_name))
         self.conf_threshold = conf_threshold
 
     def _log(self, msg, level="info"):
@@ -112,4 +113,25 @@ def distance_to_existing_keyframes(clip, query_vector: np.ndarray) -> tuple[floa
     if not distances:
         return 1.0, 1.0
 
-    return min(distances), max(distances)
\ No newline at end of file
+    return min(distances), max(distances)
+
+def auto_batch_size(per_image_mb: float = None, min_batch: int = 1, max_batch: int = 64) -> int:
+    """
+    Picks a YOLO batch size from the memory that is currently free: GPU memory when CUDA is
+    available, otherwise system RAM. Half of the free memory is budgeted for the batch.
+    """
+    import os
+    import torch
+
+    if torch.cuda.is_available():
+        free_bytes, _ = torch.cuda.mem_get_info()
+        per_image_mb = per_image_mb or 300.0
+    else:
+        try:
+            free_bytes = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        except (ValueError, OSError, AttributeError):
+            return 4  # e.g. Windows, where sysconf is unavailable
+        per_image_mb = per_image_mb or 150.0
+
+    batch = int(free_bytes * 0.5 / (per_image_mb * 1024 ** 2))
+    return max(min_batch, min(max_batch, batch))
@@ -0,0 +1,166 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+
+_END = object()
+
+@dataclass
+class StageStats:
+    items_in: int = 0
+    items_out: int = 0
+    batches: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    started: float = field(default_factory=time.perf_counter)
+
+    def throughput(self) -> float:
+        """Items consumed per second of wall time since the stage started."""
+        elapsed = time.perf_counter() - self.started
+        return self.items_in / elapsed if elapsed > 0 else 0.0
+
+class Stage:
+    """
+    One step of a Pipeline.
+
+    :param name: Name used in logs and statistics.
+    :param process: Callable(context, batch) returning an iterable of items for the next stage.
+    :param workers: Number of threads running this stage.
+    :param batch_size: Maximum number of items handed to process at once.
+    :param init: Optional callable creating a per-worker context (e.g. a loaded model).
+    :param queue_size: Capacity of the stage's input queue. A full queue blocks the previous stage (backpressure).
+    """
+
+    def __init__(self, name, process, workers=1, batch_size=1, init=None, queue_size=8):
+        self.name = name
+        self.process = process
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.init = init
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.stats = StageStats()
+        self._lock = threading.Lock()
+        self._active_workers = self.workers
+
+class Pipeline:
+    """
+    Streams items through a chain of stages connected by bounded queues.
+
+    Every stage runs in its own worker threads, so decoding, model inference and database
+    work of different items overlap. An item reaches the last stage as soon as all previous
+    stages are done with it instead of after the whole input was processed.
+    """
+
+    def __init__(self, stages: list, log=print, stats_interval: float = 30.0):
+        self.stages = stages
+        self.log = log
+        self.stats_interval = stats_interval
+        self._done = threading.Event()
+
+    def run(self, items):
+        """Feeds items into the first stage and blocks until every stage has drained."""
+        threads = []
+        for index, stage in enumerate(self.stages):
+            downstream = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            for worker in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker, args=(stage, downstream), name=f"{stage.name}-{worker}", daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        reporter = threading.Thread(target=self._report_periodically, daemon=True)
+        reporter.start()
+
+        first = self.stages[0]
+        try:
+            for item in items:
+                first.queue.put(item)
+        finally:
+            for _ in range(first.workers):
+                first.queue.put(_END)
+
+        for thread in threads:
+            thread.join()
+        self._done.set()
+        self.report()
+
+        return {stage.name: stage.stats for stage in self.stages}
+
+    def report(self):
+        for stage in self.stages:
+            stats = stage.stats
+            self.log(
+                f"[Pipeline] {stage.name}: {stats.items_in} in, {stats.items_out} out, "
+                f"{stats.errors} error(s), {stats.throughput():.2f} items/s, "
+                f"busy {stats.busy_seconds:.1f}s, queued {stage.queue.qsize()}"
+            )
+
+    def _report_periodically(self):
+        while not self._done.wait(self.stats_interval):
+            self.report()
+
+    def _worker(self, stage, downstream):
+        import django.db
+
+        finished = False
+        try:
+            context = stage.init() if stage.init else None
+            while not finished:
+                batch = []
+                while len(batch) < stage.batch_size:
+                    # block for the first item only, then take whatever is already waiting
+                    try:
+                        item = stage.queue.get() if not batch else stage.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _END:
+                        finished = True
+                        break
+                    batch.append(item)
+
+                if batch:
+                    self._process_batch(stage, downstream, context, batch)
+        except Exception as e:
+            # only init can get here, _process_batch handles its own errors
+            self.log(f"[Pipeline] {stage.name} worker failed to start: {e}")
+        finally:
+            django.db.connections.close_all()
+            with stage._lock:
+                stage._active_workers -= 1
+                last = stage._active_workers == 0
+            if last and not finished:
+                # no worker of this stage is left: discard its input so the previous stage does not block
+                self._drain(stage)
+            if last and downstream is not None:
+                for _ in range(downstream.workers):
+                    downstream.queue.put(_END)
+
+    def _drain(self, stage):
+        dropped = 0
+        while stage.queue.get() is not _END:
+            dropped += 1
+        with stage._lock:
+            stage.stats.errors += dropped
+        if dropped:
+            self.log(f"[Pipeline] {stage.name}: dropped {dropped} item(s), no worker is running.")
+
+    def _process_batch(self, stage, downstream, context, batch):
+        start = time.perf_counter()
+        try:
+            outputs = list(stage.process(context, batch) or [])
+        except Exception as e:
+            outputs = []
+            with stage._lock:
+                stage.stats.errors += 1
+            self.log(f"[Pipeline] {stage.name} failed on {batch}: {e}")
+
+        with stage._lock:
+            stage.stats.items_in += len(batch)
+            stage.stats.items_out += len(outputs)
+            stage.stats.batches += 1
+            stage.stats.busy_seconds += time.perf_counter() - start
+
+        if downstream is not None:
+            for output in outputs:
+                downstream.queue.put(output)
@@ -0,0 +1,151 @@
+from VideoSearch.models import VideoProbe
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import subprocess
+import json
+import re
+
+DEFAULT_PROBE_WORKERS = 8
+PROBE_FIELDS = ["size", "mtime_ns", "is_video", "width", "height", "fps_num", "fps_den", "frame_count", "frame_count_source"]
+
+def run_ffprobe(path, count_fallback: bool = True, log=print) -> dict:
+    """
+    Probes a file with a single JSON ffprobe call. If the container has no nb_frames, the frames
+    are counted from the demuxed packets (no decoding); only if that fails too the video is decoded.
+
+    :param path: File to probe.
+    :param count_fallback: Count packets/decode when the header has no frame count.
+    :return: Field values of a VideoProbe (without size and mtime).
+    """
+    result = subprocess.run([
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=codec_type,width,height,r_frame_rate,nb_frames',
+        '-of', 'json',
+        str(path)
+    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    probe = {"is_video": False, "width": None, "height": None, "fps_num": None, "fps_den": None,
+             "frame_count": None, "frame_count_source": ""}
+    try:
+        streams = json.loads(result.stdout.decode() or "{}").get("streams", [])
+    except ValueError:
+        streams = []
+    stream = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if result.returncode != 0 or stream is None:
+        return probe
+
+    probe["is_video"] = True
+    try:
+        probe["width"] = int(stream["width"])
+        probe["height"] = int(stream["height"])
+        probe["fps_num"], probe["fps_den"] = map(int, stream["r_frame_rate"].split('/'))
+    except (KeyError, ValueError):
+        return probe
+
+    frame_count = _to_int(stream.get("nb_frames"))
+    source = VideoProbe.FRAMES_FROM_HEADER
+    if not frame_count and count_fallback:
+        frame_count = count_packets(path)
+        source = VideoProbe.FRAMES_FROM_PACKETS
+        if not frame_count:
+            log(f"[Probe] {Path(path).name}: packet count failed, decoding video to count frames (this may take a while!)")
+            frame_count = count_decoded_frames(path)
+            source = VideoProbe.FRAMES_FROM_DECODE
+
+    if frame_count:
+        probe["frame_count"] = frame_count
+        probe["frame_count_source"] = source
+    return probe
+
+def count_packets(path) -> int | None:
+    """Counts the packets of the first video stream; only demuxes, so it runs at disk speed."""
+    result = subprocess.run([
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-count_packets',
+        '-show_entries', 'stream=nb_read_packets',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        str(path)
+    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return _to_int(result.stdout.decode().strip())
+
+def count_decoded_frames(path) -> int | None:
+    """Last resort: decodes the first video stream and returns the number of frames ffmpeg reports."""
+    result = subprocess.run([
+        'ffmpeg', '-v', 'error', '-stats',
+        '-i', str(path),
+        '-map', '0:v:0', '-f', 'null', '-'
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    counts = re.findall(r"frame=\s*(\d+)", result.stderr.decode(errors="replace"))
+    return int(counts[-1]) if counts and int(counts[-1]) > 0 else None
+
+def _to_int(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def probe_files(paths, workers: int = DEFAULT_PROBE_WORKERS, use_cache: bool = True, count_fallback: bool = True, log=print) -> dict:
+    """
+    Probes many files at once. Cached probes whose size and mtime still match are reused,
+    all other files are probed in a thread pool and written back to the cache in one query.
+
+    :param paths: Files to probe.
+    :param workers: Concurrent ffprobe processes.
+    :param use_cache: Ignore existing probes if False (results are still stored).
+    :param count_fallback: See run_ffprobe. Videos probed without it that lack a frame count are
+        returned but not cached, so a later full probe still counts their frames.
+    :return: Dict of resolved path string -> VideoProbe; files that cannot be stat'ed are omitted.
+    """
+    stats = {}
+    for path in paths:
+        resolved = str(Path(path).resolve())
+        try:
+            stats[resolved] = Path(resolved).stat()
+        except OSError:
+            continue
+
+    cached = {}
+    if use_cache and stats:
+        cached = {probe.path: probe for probe in _cached_probes(list(stats))}
+
+    probes, stale = {}, []
+    for path, stat in stats.items():
+        probe = cached.get(path)
+        if probe is not None and probe.matches(stat):
+            probes[path] = probe
+        else:
+            stale.append(path)
+
+    if not stale:
+        return probes
+
+    log(f"[Probe] Probing {len(stale)} new or changed file(s) ({len(probes)} cached) with {workers} worker(s).")
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = executor.map(lambda path: run_ffprobe(path, count_fallback, log), stale)
+        fresh = [
+            VideoProbe(path=path, size=stats[path].st_size, mtime_ns=stats[path].st_mtime_ns, **result)
+            for path, result in zip(stale, results)
+        ]
+
+    complete = [probe for probe in fresh if count_fallback or not probe.is_video or probe.frame_count]
+    VideoProbe.objects.bulk_create(complete, batch_size=500, update_conflicts=True, unique_fields=["path"], update_fields=PROBE_FIELDS + ["probed_at"])
+    probes.update((probe.path, probe) for probe in fresh)
+    return probes
+
+def _cached_probes(paths: list, chunk_size: int = 500):
+    # chunked to stay below the SQL variable limit of SQLite
+    for start in range(0, len(paths), chunk_size):
+        yield from VideoProbe.objects.filter(path__in=paths[start:start + chunk_size])
+
+def prune_probes(directory, present_paths):
+    """Deletes cached probes of files below directory that no longer exist; returns the number deleted."""
+    prefix = str(Path(directory).resolve())
+    gone = [
+        probe_id for probe_id, path in VideoProbe.objects.filter(path__startswith=prefix).values_list("id", "path")
+        if path not in present_paths
+    ]
+    for start in range(0, len(gone), 500):
+        VideoProbe.objects.filter(id__in=gone[start:start + 500]).delete()
+    return len(gone)
@@ -0,0 +1,97 @@
+from VideoSearch.models import PROXY_ROOT
+from VideoSearch.utils.manifest import params_hash
+from django.conf import settings
+import subprocess
+import shutil
+import time
+import os
+
+DEFAULT_PROXY_SETTINGS = {
+    "height": 480,
+    "crf": 28,
+    "preset": "veryfast",
+    "keyframe_seconds": 1,
+    "audio_bitrate": "64k",
+}
+PROXY_PARTIAL_MAX_AGE_SECONDS = 6 * 3600  # older partial files are leftovers of cancelled encodes, not running ones
+
+def proxy_settings() -> dict:
+    """Encoding settings of the preview proxies: DEFAULT_PROXY_SETTINGS updated with the VIDEO_PROXY_SETTINGS setting."""
+    return {**DEFAULT_PROXY_SETTINGS, **getattr(settings, "VIDEO_PROXY_SETTINGS", {})}
+
+def proxy_hash(video, params: dict = None) -> str:
+    """Identifies a proxy by the content of its source and the encoding settings."""
+    params = params or proxy_settings()
+    return params_hash({**params, "source": video.content_hash or f"{video.file_size}:{video.file_mtime_ns}"})
+
+def needs_proxy(video, params: dict = None) -> bool:
+    return video.proxy_hash != proxy_hash(video, params) or not video.get_proxy_path().exists()
+
+def encode_proxy(source, target, params: dict):
+    """
+    Encodes an H.264/AAC MP4 of at most params["height"] lines with a keyframe every keyframe_seconds,
+    so a seek only decodes up to one second of video, and the moov atom in front (+faststart), so
+    playback starts before the whole file is downloaded. Timestamps are kept, so frame numbers of
+    the source map to the same times in the proxy.
+
+    :param source: Source video file.
+    :param target: Proxy file; written via a temporary file, so a failed encode never replaces it.
+    :param params: Encoding settings, see DEFAULT_PROXY_SETTINGS.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = target.with_name(f"{target.stem}.partial{target.suffix}")
+    cmd = [
+        "ffmpeg", "-v", "error", "-y",
+        "-i", str(source),
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-vf", f"scale=-2:trunc(min({params['height']}\\,ih)/2)*2",
+        "-c:v", "libx264", "-preset", params["preset"], "-crf", str(params["crf"]), "-pix_fmt", "yuv420p",
+        "-force_key_frames", f"expr:gte(t,n_forced*{params['keyframe_seconds']})",
+        "-c:a", "aac", "-b:a", params["audio_bitrate"], "-ac", "2",
+        "-movflags", "+faststart",
+        "-f", "mp4", str(partial),
+    ]
+    try:
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+        os.replace(partial, target)
+    finally:
+        partial.unlink(missing_ok=True)
+
+def build_proxy(video, params: dict = None, log=print) -> str | None:
+    """Encodes the proxy of a video and returns its proxy hash (None if ffmpeg failed)."""
+    params = params or proxy_settings()
+    try:
+        encode_proxy(video.file_path, video.get_proxy_path(), params)
+    except subprocess.CalledProcessError as e:
+        log(f"[Proxy] Failed to encode {video.file_name}: {e.stderr.decode(errors='replace').strip()}")
+        return None
+    return proxy_hash(video, params)
+
+def remove_proxies(video_ids):
+    for video_id in video_ids:
+        (PROXY_ROOT / f"{video_id}.mp4").unlink(missing_ok=True)
+
+def remove_all_proxies():
+    shutil.rmtree(PROXY_ROOT, ignore_errors=True)
+
+def prune_proxies(video_ids, max_partial_age: float = PROXY_PARTIAL_MAX_AGE_SECONDS) -> int:
+    """
+    Deletes proxy files of videos that no longer exist, and leftovers of cancelled encodes. Partial
+    files younger than max_partial_age seconds are kept, a concurrent run may still be writing them.
+    """
+    video_ids = {str(video_id) for video_id in video_ids}
+    cutoff = time.time() - max_partial_age
+    removed = 0
+    for path in PROXY_ROOT.glob("*.mp4"):
+        if path.stem.isdigit():
+            if path.stem in video_ids:
+                continue
+        else:
+            try:
+                if path.stat().st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+        path.unlink(missing_ok=True)
+        removed += 1
+    return removed
@@ -0,0 +1,115 @@
+"""
+Bulk deletion of imported videos. Django's delete() loads every related row to emulate the
+cascade and fires post_delete per keyframe (signals.py unlinks one JPEG per row). These helpers
+delete with set-based SQL instead and remove keyframe images per clip folder or as a whole tree.
+Files are only removed once the surrounding transaction committed, so a rollback keeps them.
+"""
+from VideoSearch.models import KEYFRAME_ROOT, Video, Clip, Keyframe, ClipPredictionCache, VideoPredictionCache, ImportJob
+from VideoSearch.utils.proxies import remove_proxies, remove_all_proxies
+from django.db import connection, transaction
+from datetime import datetime
+import subprocess
+import shutil
+import sys
+
+CHUNK_SIZE = 500
+PURGE_SUFFIX = ".purge-"
+
+# children first, so the set-based deletes never violate a foreign key
+VIDEO_TABLES = [Keyframe, ClipPredictionCache, ImportJob, Clip, VideoPredictionCache, Video]
+
+def purge_all(background: bool = True, log=print) -> int:
+    """
+    Deletes all videos and everything derived from them. Uses TRUNCATE ... CASCADE on PostgreSQL
+    and one DELETE per table otherwise. The keyframe tree is renamed aside and deleted afterwards,
+    in a detached process if background is set. Returns the number of deleted videos.
+    """
+    count = Video.objects.count()
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            tables = ", ".join(connection.ops.quote_name(model._meta.db_table) for model in VIDEO_TABLES)
+            with connection.cursor() as cursor:
+                cursor.execute(f"TRUNCATE TABLE {tables} CASCADE")
+        else:
+            for model in VIDEO_TABLES:
+                _delete_rows(model)
+
+    transaction.on_commit(lambda: (discard_keyframe_tree(background, log), remove_all_proxies()))
+    return count
+
+def purge_videos(video_ids) -> int:
+    """Deletes the given videos with set-based SQL and removes their proxies and the keyframe folders of their clips."""
+    video_ids = list(video_ids)
+    clip_ids = []
+    for chunk in _chunks(video_ids):
+        clip_ids.extend(Clip.objects.filter(video_id__in=chunk).values_list("id", flat=True))
+
+    with transaction.atomic():
+        _delete_clip_rows(clip_ids)
+        for chunk in _chunks(video_ids):
+            for model in (ImportJob, VideoPredictionCache):
+                _delete_rows(model, "video", chunk)
+            _delete_rows(Video, "id", chunk)
+
+    transaction.on_commit(lambda: (remove_clip_folders(clip_ids), remove_proxies(video_ids)))
+    return len(video_ids)
+
+def purge_clips(clip_ids) -> int:
+    """
+    Deletes the given clips, their keyframes and pending work with set-based SQL and removes their
+    keyframe folders once the (possibly surrounding) transaction committed.
+    """
+    clip_ids = list(clip_ids)
+    with transaction.atomic():
+        _delete_clip_rows(clip_ids)
+    transaction.on_commit(lambda: remove_clip_folders(clip_ids))
+    return len(clip_ids)
+
+def _delete_clip_rows(clip_ids):
+    for chunk in _chunks(clip_ids):
+        for model in (Keyframe, ClipPredictionCache, ImportJob):
+            _delete_rows(model, "clip", chunk)
+        _delete_rows(Clip, "id", chunk)
+
+def _delete_rows(model, field: str = None, ids: list = None):
+    """Plain DELETE of all rows of a model, or of those whose field is in ids; no cascade emulation, no signals."""
+    sql = f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)}"
+    if field is not None:
+        if not ids:
+            return
+        column = connection.ops.quote_name(model._meta.get_field(field).column)
+        sql += f" WHERE {column} IN ({', '.join(['%s'] * len(ids))})"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, ids if field is not None else None)
+
+def remove_clip_folders(clip_ids):
+    """Removes the keyframe image folder of every clip at once instead of unlinking single images."""
+    for clip_id in clip_ids:
+        shutil.rmtree(KEYFRAME_ROOT / str(clip_id), ignore_errors=True)
+
+def discard_keyframe_tree(background: bool = True, log=print):
+    """
+    Renames data/keyframes aside, so an empty tree is available immediately, and deletes the old
+    tree (plus leftovers of earlier purges) either now or in a detached process.
+    """
+    if KEYFRAME_ROOT.exists():
+        KEYFRAME_ROOT.rename(KEYFRAME_ROOT.with_name(f"{KEYFRAME_ROOT.name}{PURGE_SUFFIX}{datetime.now():%Y%m%d%H%M%S%f}"))
+    KEYFRAME_ROOT.mkdir(parents=True, exist_ok=True)
+
+    discarded = [str(path) for path in KEYFRAME_ROOT.parent.glob(f"{KEYFRAME_ROOT.name}{PURGE_SUFFIX}*")]
+    if not discarded:
+        return
+
+    if background:
+        subprocess.Popen(
+            [sys.executable, "-c", "import shutil, sys\nfor path in sys.argv[1:]: shutil.rmtree(path, ignore_errors=True)", *discarded],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+        )
+        log(f"[Purge] Deleting {len(discarded)} discarded keyframe tree(s) in the background.")
+    else:
+        for path in discarded:
+            shutil.rmtree(path, ignore_errors=True)
+
+def _chunks(ids: list):
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
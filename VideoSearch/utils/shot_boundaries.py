@@ -0,0 +1,323 @@
+import subprocess
+import importlib.util
+import numpy as np
+from collections import deque
+from pathlib import Path
+
+TRANSNET_INPUT_SIZE = (27, 48, 3)
+WINDOW_SIZE = 100
+WINDOW_STRIDE = 50
+WINDOW_CONTEXT = 25
+
+TRANSNET_ROOT = Path(__file__).resolve().parents[2] / "third_party" / "transnetv2"
+TRANSNET_PYTORCH_WEIGHTS = TRANSNET_ROOT / "inference-pytorch" / "transnetv2-pytorch-weights.pth"
+
+TRANSNET_BACKENDS = ("tensorflow", "pytorch")
+
+def load_transnet(backend: str = "tensorflow", threads: int = None, quantize: bool = False):
+    """
+    Loads a TransNetV2 model exposing predict_raw for the given backend.
+    Only the selected framework is imported, so the PyTorch backend never loads TensorFlow.
+
+    :param backend: "tensorflow" (reference SavedModel) or "pytorch" (converted weights).
+    :param threads: Intra-op thread limit for this process (None keeps the framework default).
+    :param quantize: Dynamically quantize the dense layers to int8 (PyTorch on CPU only).
+    """
+    if backend == "pytorch":
+        return TorchTransNetV2(threads=threads, quantize=quantize)
+
+    if backend != "tensorflow":
+        raise ValueError(f"Unknown TransNetV2 backend '{backend}', expected one of {TRANSNET_BACKENDS}.")
+    if quantize:
+        raise ValueError("Quantization is only supported by the pytorch backend.")
+
+    import tensorflow as tf
+    if threads:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    from third_party.transnetv2.inference.transnetv2 import TransNetV2
+    return TransNetV2()
+
+class TorchTransNetV2:
+    """
+    Wraps the vendored PyTorch port of TransNetV2 with the predict_raw interface of the
+    TensorFlow model. Weights have to be converted once with inference-pytorch/convert_weights.py.
+    """
+
+    def __init__(self, weights_path=None, device=None, threads: int = None, quantize: bool = False):
+        import torch
+
+        if threads:
+            torch.set_num_threads(threads)
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass  # can only be set once per process, before any parallel work
+
+        from VideoSearch.utils.model_registry import TRANSNET_SAFETENSORS, empty_weights, load_safetensors
+
+        if weights_path is None and TRANSNET_SAFETENSORS.is_file():
+            weights_path = TRANSNET_SAFETENSORS  # written by fetch_models, loaded memory-mapped
+        weights_path = Path(weights_path or TRANSNET_PYTORCH_WEIGHTS)
+        if not weights_path.is_file():
+            raise FileNotFoundError(
+                f"[TransNetV2] ERROR: {weights_path} does not exist. Convert the TensorFlow weights first: "
+                f"cd {weights_path.parent} && python convert_weights.py"
+            )
+
+        spec = importlib.util.spec_from_file_location(
+            "transnetv2_pytorch", TRANSNET_ROOT / "inference-pytorch" / "transnetv2_pytorch.py"
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        if weights_path.suffix == ".safetensors":
+            with empty_weights():
+                model = module.TransNetV2()
+            model.load_state_dict(load_safetensors(weights_path), assign=True)
+        else:
+            model = module.TransNetV2()
+            model.load_state_dict(torch.load(weights_path, map_location="cpu"))
+        model.eval()
+
+        if quantize:
+            # Dynamic quantization covers the dense head; the 3D convolutions stay in float.
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            device = "cpu"
+
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = model.to(self.device)
+        self._torch = torch
+
+        print(f"[TransNetV2] Using PyTorch weights from {weights_path} | Device: {self.device}"
+              f"{' | int8' if quantize else ''}.")
+
+    def predict_raw(self, frames: np.ndarray):
+        assert len(frames.shape) == 5 and frames.shape[2:] == TRANSNET_INPUT_SIZE, \
+            "[TransNetV2] Input shape must be [batch, frames, height, width, 3]."
+        torch = self._torch
+
+        with torch.inference_mode():
+            inputs = torch.from_numpy(np.ascontiguousarray(frames, dtype=np.uint8)).to(self.device)
+            logits, dict_ = self.model(inputs)
+            single_frame_pred = torch.sigmoid(logits).float().cpu().numpy()
+            all_frames_pred = torch.sigmoid(dict_["many_hot"]).float().cpu().numpy()
+
+        return single_frame_pred, all_frames_pred
+
+def load_transnet_frames(video_path) -> np.ndarray:
+    """
+    Decodes a video into the 48x27 RGB frames TransNetV2 expects.
+    Returns an array of shape [frames, 27, 48, 3].
+    """
+    height, width, _ = TRANSNET_INPUT_SIZE
+    cmd = [
+        "ffmpeg",
+        "-loglevel", "error",
+        "-i", str(video_path),
+        "-f", "rawvideo",
+        "-pix_fmt", "rgb24",
+        "-s", f"{width}x{height}",
+        "pipe:"
+    ]
+    output = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+    return np.frombuffer(output, np.uint8).reshape([-1, *TRANSNET_INPUT_SIZE])
+
+def iter_windows(frames: np.ndarray):
+    """
+    Yields the overlapping 100-frame windows TransNetV2 is evaluated on.
+    The first/last window is padded with copies of the first/last frame, exactly like
+    TransNetV2.predict_frames, so predictions are identical to the reference implementation.
+    """
+    padding_start = WINDOW_CONTEXT
+    padding_end = WINDOW_CONTEXT + WINDOW_STRIDE - (len(frames) % WINDOW_STRIDE or WINDOW_STRIDE)
+
+    padded = np.concatenate(
+        [frames[:1]] * padding_start + [frames] + [frames[-1:]] * padding_end, 0
+    )
+
+    ptr = 0
+    while ptr + WINDOW_SIZE <= len(padded):
+        yield padded[ptr:ptr + WINDOW_SIZE]
+        ptr += WINDOW_STRIDE
+
+class WindowBatchScheduler:
+    """
+    Packs TransNetV2 windows of several videos into batched predict_raw calls.
+
+    Videos are submitted with a key and their decoded frames. Whenever enough windows are
+    pending a batch is run, and videos whose windows are all predicted are returned as
+    (key, single_frame_predictions) tuples.
+    """
+
+    def __init__(self, model, batch_size: int = 16):
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.batches_run = 0
+        self.windows_run = 0
+
+        self._pending = deque()
+        self._results = {}
+        self._remaining = {}
+        self._frame_counts = {}
+
+    def submit(self, key, frames: np.ndarray) -> list:
+        """Queues all windows of a video and runs every batch that is full."""
+        if key in self._results:
+            raise ValueError(f"Video {key} was already submitted.")
+
+        if len(frames) == 0:
+            return [(key, np.zeros(0, dtype=np.float32))]
+
+        windows = list(iter_windows(frames))
+        self._results[key] = [None] * len(windows)
+        self._remaining[key] = len(windows)
+        self._frame_counts[key] = len(frames)
+        self._pending.extend((key, i, window) for i, window in enumerate(windows))
+
+        finished = []
+        while len(self._pending) >= self.batch_size:
+            finished.extend(self._run_batch())
+        return finished
+
+    def flush(self) -> list:
+        """Runs all pending windows, including a final partial batch."""
+        finished = []
+        while self._pending:
+            finished.extend(self._run_batch())
+        return finished
+
+    def _run_batch(self) -> list:
+        batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+
+        single_frame_pred, _ = self.model.predict_raw(np.stack([window for _, _, window in batch]))
+        single_frame_pred = np.asarray(single_frame_pred)[:, WINDOW_CONTEXT:WINDOW_CONTEXT + WINDOW_STRIDE, 0]
+
+        self.batches_run += 1
+        self.windows_run += len(batch)
+
+        finished = []
+        for (key, index, _), prediction in zip(batch, single_frame_pred):
+            self._results[key][index] = prediction
+            self._remaining[key] -= 1
+            if self._remaining[key] == 0:
+                finished.append((key, self._collect(key)))
+        return finished
+
+    def _collect(self, key) -> np.ndarray:
+        predictions = np.concatenate(self._results.pop(key))
+        del self._remaining[key]
+        return predictions[:self._frame_counts.pop(key)]  # remove extra padded frames
+
+def predict_videos(model, videos, batch_size: int = 16):
+    """
+    Runs TransNetV2 over an iterable of (key, frames) tuples with windows of different
+    videos batched together. Yields (key, single_frame_predictions) as videos complete.
+    """
+    scheduler = WindowBatchScheduler(model, batch_size=batch_size)
+    for key, frames in videos:
+        yield from scheduler.submit(key, frames)
+    yield from scheduler.flush()
+
+def local_maximum_reach(predictions: np.ndarray, max_order: int) -> np.ndarray:
+    """
+    Computes for every frame the largest order (up to max_order) for which it is a strict
+    local maximum, using the same definition as scipy's argrelextrema(np.greater, mode="clip").
+    Frames that are no local maximum at all get 0.
+
+    A frame is a maximum of order k exactly if its reach is >= k, so a whole series of
+    argrelextrema calls with different orders reduces to one comparison against this array.
+    """
+    predictions = np.asarray(predictions)
+    n = len(predictions)
+    reach = np.zeros(n, dtype=np.int32)
+    if n < 3:
+        return reach
+
+    # the first and last frame compare against themselves under clipping and never qualify
+    candidates = np.arange(1, n - 1)
+    for order in range(1, max_order + 1):
+        values = predictions[candidates]
+        is_maximum = (
+            (values > predictions[np.maximum(candidates - order, 0)]) &
+            (values > predictions[np.minimum(candidates + order, n - 1)])
+        )
+        candidates = candidates[is_maximum]
+        if len(candidates) == 0:
+            break
+        reach[candidates] = order
+
+    return reach
+
+def multipass_schedule(
+    threshold_low: float,
+    threshold_high: float,
+    order_low: int,
+    max_pass_seconds: float,
+    passes: int,
+    fps: float
+):
+    """
+    Returns the (thresholds, orders) arrays of the passes run by multipass detection.
+    Thresholds decrease linearly from threshold_high to threshold_low while the local
+    maximum order increases from order_low to max_pass_seconds worth of frames.
+    """
+    order_high = int(max_pass_seconds * fps / 2)
+    t = np.arange(passes) / (passes - 1) if passes > 1 else np.zeros(1)
+
+    thresholds = threshold_high - t * (threshold_high - threshold_low)
+    orders = np.maximum(1, (order_low + t * (order_high - order_low)).astype(int))
+    return thresholds, orders
+
+def multipass_cuts(predictions: np.ndarray, thresholds: np.ndarray, orders: np.ndarray, reach: np.ndarray = None) -> np.ndarray:
+    """
+    Returns the sorted frame indices accepted as cuts by any pass, where pass i accepts
+    local maxima of order orders[i] whose confidence exceeds thresholds[i].
+    """
+    predictions = np.asarray(predictions)
+    thresholds = _thresholds_like(predictions, thresholds)
+    if reach is None:
+        reach = local_maximum_reach(predictions, int(np.max(orders)))
+
+    candidates = np.flatnonzero(reach)
+    accepted = (
+        (reach[candidates, None] >= orders[None, :]) &
+        (predictions[candidates, None] > thresholds[None, :])
+    ).any(axis=1)
+    return candidates[accepted]
+
+def sweep_accepted_cuts(predictions: np.ndarray, schedules: list, reach: np.ndarray = None):
+    """
+    Evaluates many multipass settings on one prediction array at once.
+
+    :param schedules: List of (thresholds, orders) tuples as returned by multipass_schedule.
+    :return: Boolean matrix [candidate frames, settings] marking accepted cuts, and the candidate frame indices.
+    """
+    predictions = np.asarray(predictions)
+    max_passes = max(len(orders) for _, orders in schedules)
+
+    # pad schedules to a common pass count with passes that can never fire
+    thresholds = np.full((len(schedules), max_passes), np.inf)
+    orders = np.full((len(schedules), max_passes), np.iinfo(np.int32).max)
+    for i, (pass_thresholds, pass_orders) in enumerate(schedules):
+        thresholds[i, :len(pass_thresholds)] = pass_thresholds
+        orders[i, :len(pass_orders)] = pass_orders
+
+    thresholds = _thresholds_like(predictions, thresholds)
+    if reach is None:
+        reach = local_maximum_reach(predictions, int(orders[orders < np.iinfo(np.int32).max].max()))
+
+    candidates = np.flatnonzero(reach)
+    accepted = (
+        (reach[candidates, None, None] >= orders[None, :, :]) &
+        (predictions[candidates, None, None] > thresholds[None, :, :])
+    ).any(axis=2)
+    return accepted, candidates
+
+def _thresholds_like(predictions: np.ndarray, thresholds) -> np.ndarray:
+    # compare in the precision of the predictions, like scalar thresholds against a float32 array
+    thresholds = np.asarray(thresholds)
+    if np.issubdtype(predictions.dtype, np.floating):
+        return thresholds.astype(predictions.dtype)
+    return thresholds
@@ -0,0 +1,130 @@
+from VideoSearch.utils.thumbnails import grid_tier, tier_version, thumbnail_format, thumbnail_quality
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from pathlib import Path
+import hashlib
+import json
+import threading
+import math
+import time
+import os
+
+SPRITE_ROOT = Path("data/sprites")
+SPRITE_TILE_SIZE = (320, 180)  # matches .preview-container-home in styles.css
+SPRITE_MAX_TILES = 200
+SPRITE_CACHE_LIMIT = 500
+SPRITE_MIN_AGE_SECONDS = 600  # sheets used this recently are never pruned, their clients may still load them
+SPRITE_LOAD_THREADS = 8
+
+def sprite_key(keyframes) -> str:
+    """
+    Cache key of a sheet: the ordered keyframe ids with their image hashes, so a sheet is rebuilt
+    when any of its images changed.
+    """
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(f"{SPRITE_TILE_SIZE}|{grid_tier()}|{tier_version(grid_tier())}|{thumbnail_quality()}|".encode())
+    for kf in keyframes:
+        digest.update(f"{kf.id}:{kf.image_hash};".encode())
+    return digest.hexdigest()
+
+def sprite_path(key: str) -> Path:
+    return SPRITE_ROOT / f"{key}.{thumbnail_format()[1]}"
+
+def get_sprite(keyframes) -> dict:
+    """
+    Returns the layout of the sprite sheet for the keyframes (in this order), building the sheet if it
+    is not cached yet. Layout: {"key", "width", "height", "tile": [w, h], "tiles": {id: [x, y]}};
+    keyframes without a stored image are left out of "tiles".
+    """
+    key = sprite_key(keyframes)
+    layout_path = SPRITE_ROOT / f"{key}.json"
+    if layout_path.exists() and sprite_path(key).exists():
+        with open(layout_path) as f:
+            layout = json.load(f)
+        # mark as recently used, so prune_sprites keeps it
+        os.utime(layout_path)
+        return layout
+
+    # the sheet is in place before its layout, so a layout that can be read always has its sheet
+    layout = build_sprite(keyframes, key)
+    partial = partial_path(layout_path)
+    try:
+        with open(partial, "w") as f:
+            json.dump(layout, f)
+        os.replace(partial, layout_path)
+    finally:
+        partial.unlink(missing_ok=True)
+    prune_sprites()
+    return layout
+
+def build_sprite(keyframes, key: str) -> dict:
+    """Packs the grid thumbnails, cropped to SPRITE_TILE_SIZE like the result grid does, into one image."""
+    tile_width, tile_height = SPRITE_TILE_SIZE
+    with ThreadPoolExecutor(max_workers=SPRITE_LOAD_THREADS) as pool:
+        tiles = list(pool.map(load_tile, keyframes))
+
+    columns = max(1, math.ceil(math.sqrt(len(keyframes))))
+    rows = max(1, math.ceil(len(keyframes) / columns))
+    sheet = Image.new("RGB", (columns * tile_width, rows * tile_height))
+
+    positions = {}
+    for index, (kf, tile) in enumerate(zip(keyframes, tiles)):
+        if tile is None:
+            continue
+        x, y = (index % columns) * tile_width, (index // columns) * tile_height
+        sheet.paste(tile, (x, y))
+        positions[str(kf.id)] = [x, y]
+
+    SPRITE_ROOT.mkdir(parents=True, exist_ok=True)
+    image_format, _ = thumbnail_format()
+    partial = partial_path(sprite_path(key))
+    try:
+        sheet.save(partial, image_format, quality=thumbnail_quality())
+        os.replace(partial, sprite_path(key))
+    finally:
+        partial.unlink(missing_ok=True)
+
+    return {
+        "key": key,
+        "width": sheet.width,
+        "height": sheet.height,
+        "tile": [tile_width, tile_height],
+        "tiles": positions,
+    }
+
+def partial_path(path: Path) -> Path:
+    """
+    Temporary file a sprite file is written to before it replaces path, unique per thread, so
+    concurrent requests building the same sheet never read or write each other's half-written files.
+    """
+    return path.with_name(f"{path.stem}.{os.getpid()}-{threading.get_ident()}.partial")
+
+def load_tile(kf) -> Image.Image | None:
+    """Loads the grid thumbnail of a keyframe (the full image if it has none) cropped to the tile size."""
+    path = kf.get_image_path(grid_tier())
+    if not path.exists():
+        path = kf.get_image_path()
+        if not path.exists():
+            return None
+    with Image.open(path) as img:
+        return ImageOps.fit(img.convert("RGB"), SPRITE_TILE_SIZE, Image.LANCZOS)
+
+def prune_sprites(limit: int = SPRITE_CACHE_LIMIT, min_age: float = SPRITE_MIN_AGE_SECONDS):
+    """
+    Keeps the most recently used sheets. Sheets used within min_age seconds are kept even beyond
+    the limit, so a layout that was just returned never points to a deleted sheet.
+    """
+    layouts = []
+    for layout_path in SPRITE_ROOT.glob("*.json"):
+        try:
+            layouts.append((layout_path.stat().st_mtime, layout_path))
+        except FileNotFoundError:
+            continue
+    layouts.sort(reverse=True)
+
+    cutoff = time.time() - min_age
+    for used_at, layout_path in layouts[limit:]:
+        if used_at >= cutoff:
+            continue
+        for path in SPRITE_ROOT.glob(f"{layout_path.stem}.*"):
+            path.unlink(missing_ok=True)
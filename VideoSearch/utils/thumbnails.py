@@ -0,0 +1,75 @@
+from django.conf import settings
+from PIL import Image, features
+from pathlib import Path
+import hashlib
+
+DEFAULT_THUMBNAIL_TIERS = {"thumb": 320}
+DEFAULT_THUMBNAIL_QUALITY = 80
+FULL_TIER = "full"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def thumbnail_tiers() -> dict:
+    """Tier name -> longest side in pixels, from the KEYFRAME_THUMBNAIL_TIERS setting."""
+    return getattr(settings, "KEYFRAME_THUMBNAIL_TIERS", DEFAULT_THUMBNAIL_TIERS)
+
+def grid_tier() -> str:
+    """Tier shown in the result grid: the first configured thumbnail tier."""
+    return next(iter(thumbnail_tiers()), FULL_TIER)
+
+def thumbnail_format() -> tuple[str, str]:
+    """Returns (PIL format, file extension); WebP unless Pillow was built without it or KEYFRAME_THUMBNAIL_FORMAT says otherwise."""
+    wanted = getattr(settings, "KEYFRAME_THUMBNAIL_FORMAT", "WEBP").upper()
+    if wanted == "WEBP" and features.check("webp"):
+        return "WEBP", "webp"
+    return "JPEG", "jpg"
+
+def thumbnail_quality() -> int:
+    return getattr(settings, "KEYFRAME_THUMBNAIL_QUALITY", DEFAULT_THUMBNAIL_QUALITY)
+
+def tier_version(tier: str) -> str:
+    """
+    Short hash of the settings a thumbnail tier is encoded with (size, format, quality). It is part of
+    the tier's file name and URL, so changing the settings never serves a cached old thumbnail.
+    """
+    if tier == FULL_TIER:
+        return ""
+    encoded = f"{thumbnail_tiers()[tier]}|{thumbnail_format()[0]}|{thumbnail_quality()}".encode()
+    return hashlib.blake2b(encoded, digest_size=4).hexdigest()
+
+def image_version(image_hash: str, tier: str) -> str:
+    """Version part of an image URL: the content hash of the full image plus the tier settings."""
+    return image_hash if tier == FULL_TIER else f"{image_hash}-{tier_version(tier)}"
+
+def tier_path(full_path: Path, tier: str) -> Path:
+    """Path of a tier next to the full-size image, e.g. frame12.jpg -> frame12.thumb-1f3a9c0e.webp."""
+    if tier == FULL_TIER:
+        return full_path
+    return full_path.with_name(f"{full_path.stem}.{tier}-{tier_version(tier)}.{thumbnail_format()[1]}")
+
+def tier_paths(full_path: Path) -> list[Path]:
+    return [tier_path(full_path, tier) for tier in thumbnail_tiers()]
+
+def image_files(full_path: Path) -> list[Path]:
+    """The full-size image and all of its tier files on disk, also those of earlier tier settings."""
+    return list(full_path.parent.glob(f"{full_path.stem}.*"))
+
+def save_thumbnails(img: Image.Image, full_path: Path):
+    """Writes every configured tier of an already decoded image next to its full-size file and removes outdated tiers."""
+    image_format, _ = thumbnail_format()
+    quality = thumbnail_quality()
+    rgb = img.convert("RGB")
+    for tier, size in thumbnail_tiers().items():
+        thumbnail = rgb.copy()
+        # reducing_gap shrinks in the decoder-friendly integer steps first, then resamples the rest
+        thumbnail.thumbnail((size, size), Image.LANCZOS, reducing_gap=2.0)
+        thumbnail.save(tier_path(full_path, tier), image_format, quality=quality)
+
+    current = {full_path, *tier_paths(full_path)}
+    for path in image_files(full_path):
+        if path not in current:
+            path.unlink(missing_ok=True)
+
+def file_hash(path: Path) -> str:
+    """Short content hash used in image URLs, so they can be cached forever."""
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=8).hexdigest()
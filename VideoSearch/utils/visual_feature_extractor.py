@@ -2,17 +2,34 @@ import numpy as np
 from VideoSearch.utils.embeddings import ImageEmbedder, calculate_combined_distance as embedding_distance, get_distance_to_existing_keyframes as embedding_ex_keyframes_distance
 from VideoSearch.utils.color_features import ColorFeatureExtractor , compute_distance as color_distance, distance_to_existing_keyframes as color_ex_keyframes_distance
 import time
+from concurrent.futures import ThreadPoolExecutor
 from VideoSearch.utils.objects import soft_object_distance as object_distance
+from VideoSearch.utils.machine_profile import setting
+from VideoSearch.utils.frame_hash import DEFAULT_DEDUP_TOLERANCE, frame_signature, distinct_frames
+from VideoSearch.utils.feature_matrix import FeatureMatrix, CandidatePool, embedding_distance_matrix, color_distance_matrix, nonlinear_pooling_rows
 
 class VisualFeatureExtractor:
-    def __init__(self, use_embeddings=True, use_color=True, command=None):
+    def __init__(self, use_embeddings=True, use_color=True, command=None, num_threads=None, quantize=False,
+                 dedup_tolerance=DEFAULT_DEDUP_TOLERANCE, embedder=None, models=None):
         self.use_embeddings = use_embeddings
         self.use_color = use_color
         self.command = command
+        self.dedup_tolerance = dedup_tolerance
+        self.quantize = quantize
+        self.stats = {"frames_sampled": 0, "frames_skipped": 0}
         if use_embeddings:
-            self.embedder = ImageEmbedder(command=command)
+            # e.g. an inference_server.RemoteEmbedder sharing one model copy between processes
+            self.embedder = embedder or ImageEmbedder(command=command, num_threads=num_threads, quantize=quantize, models=models)
+        # (clip_model_name, dino_model_name), part of the keyframe settings hash
+        self.model_names = getattr(self.embedder, "model_names", None) if use_embeddings else None
         if use_color:
-            self.color = ColorFeatureExtractor(command=command)
+            # num_threads is this process's share of the cores (e.g. per keyframe worker); the color
+            # pool must stay within it instead of starting one thread per core in every worker.
+            # tune_import measures the best pool size per keyframe worker.
+            color_threads = setting("color_features", "threads")
+            if num_threads:
+                color_threads = min(color_threads or num_threads, num_threads)
+            self.color = ColorFeatureExtractor(command=command, workers=color_threads)
 
     def extract_features(self, image):
         features = {}
@@ -28,9 +45,14 @@ class VisualFeatureExtractor:
     def extract_features_batch(self, images):
         """
         Batched version of extract_features. Returns a list of feature dicts.
+        Color features are computed in a background thread while the embedding models run.
         """
         all_features = [{} for _ in images]
 
+        color_future = None
+        if self.use_color:
+            color_future = self._color_executor().submit(self._timed, self.color.extract_all_batch, images)
+
         t0 = time.perf_counter()
 
         if self.use_embeddings:
@@ -40,8 +62,9 @@ class VisualFeatureExtractor:
 
         t1 = time.perf_counter()
 
-        if self.use_color:
-            colors = self.color.extract_all_batch(images)
+        color_seconds = 0.0
+        if color_future is not None:
+            colors, color_seconds = color_future.result()
             for i in range(len(images)):
                 all_features[i].update(colors[i])
 
@@ -49,59 +72,71 @@ class VisualFeatureExtractor:
 
         if self.command:
             self.command.stdout.write(self.command.style_info(
-                f"Embedding batch: {(t1 - t0) * 1000:.1f}ms | Color batch: {(t2 - t1) * 1000:.1f}ms"
+                f"Embedding batch: {(t1 - t0) * 1000:.1f}ms | Color batch: {color_seconds * 1000:.1f}ms | Total: {(t2 - t0) * 1000:.1f}ms"
             ))
 
         return all_features
 
-    def get_candidates(self, images, start, step_size, clip, threshold):
+    def _color_executor(self):
+        if getattr(self, "_color_thread", None) is None:
+            self._color_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="color-batch")
+        return self._color_thread
+
+    @staticmethod
+    def _timed(func, *args):
+        start = time.perf_counter()
+        return func(*args), time.perf_counter() - start
+
+    def get_candidates(self, images, start, step_size, keyframes, threshold):
         """
         Returns a list of (frame_number, features_dict) tuples for frames
-        that are sufficiently different from existing keyframes.
+        that are sufficiently different from the keyframes accepted so far.
         Uses batched feature extraction for performance.
+
+        Near-identical frames (see frame_hash.distinct_frames) are dropped before any model runs.
+
+        :param images: Sampled frames; image i shows frame start + i * step_size.
+        :param keyframes: KeyframeAccumulator holding the clip's accepted keyframes.
         """
-        indices = [i for i in range(len(images)) if i == 0 or i % step_size == 0]
-        selected_images = [images[i] for i in indices]
-        selected_frame_numbers = [start + i for i in indices]
+        indices = [i for i in range(len(images)) if images[i] is not None]
+        self.stats["frames_sampled"] += len(indices)
 
-        batched_features = self.extract_features_batch(selected_images)
+        signatures = [frame_signature(images[i]) for i in indices] if self.dedup_tolerance > 0 else None
+        if signatures is not None:
+            kept = distinct_frames(signatures, self.dedup_tolerance, reference=keyframes.signatures)
+            self.stats["frames_skipped"] += len(indices) - len(kept)
+            indices = [indices[k] for k in kept]
+            signatures = [signatures[k] for k in kept]
+
+        if not indices:
+            return []
 
-        candidates = []
-        for frame_number, features in zip(selected_frame_numbers, batched_features):
-            distance, _ = self.distance_to_existing_keyframes(clip, features)
-            if distance >= threshold:
-                candidates.append((frame_number, features))
+        selected_images = [images[i] for i in indices]
+        selected_frame_numbers = [start + i * step_size for i in indices]
 
-        return candidates
+        batched_features = self.extract_features_batch(selected_images)
+        if signatures is not None:
+            for features, signature in zip(batched_features, signatures):
+                features["signature"] = signature
+        min_distances, _ = self.distances_to_keyframes(keyframes, batched_features)
+
+        return [
+            (frame_number, features)
+            for frame_number, features, distance in zip(selected_frame_numbers, batched_features, min_distances)
+            if distance >= threshold
+        ]
+
+    def reset_stats(self) -> dict:
+        """Returns the frame counters collected so far and starts new ones."""
+        stats, self.stats = self.stats, {"frames_sampled": 0, "frames_skipped": 0}
+        return stats
 
     def select_representative(self, candidates):
         """
         From a list of (frame_number, features_dict), pick the most representative one
         based on median distance to others.
         """
-        best_frame = None
-        best_score = float("inf")
-
-        if len(candidates) == 1:
-            return candidates[0]
-
-        for i, (frame_i, feat_i) in enumerate(candidates):
-            distances = []
-
-            for j, (_, feat_j) in enumerate(candidates):
-                if i == j:
-                    continue
-
-                d = compute_distance(feat_i, feat_j)
-                distances.append(d)
-
-            if distances:
-                median_dist = np.median(distances)
-                if median_dist < best_score:
-                    best_score = median_dist
-                    best_frame = (frame_i, feat_i)
-
-        return best_frame
+        return CandidatePool(candidates).medoid()
     
     def distance_to_existing_keyframes(self, clip, features):
         min_distances = []
@@ -119,6 +154,36 @@ class VisualFeatureExtractor:
 
         return nonlinear_pooling(min_distances), nonlinear_pooling(max_distances)
 
+    def distances_to_keyframes(self, keyframes, features_list):
+        """
+        Vectorized distance_to_existing_keyframes for a batch of feature dicts against the
+        keyframes held by a KeyframeAccumulator. Returns (min_distances, max_distances) arrays.
+        """
+        if not features_list:
+            return np.zeros(0), np.zeros(0)
+        if not len(keyframes):
+            return np.ones(len(features_list)), np.ones(len(features_list))
+
+        queries = FeatureMatrix(features_list)
+        references = keyframes.matrix
+        min_distances = []
+        max_distances = []
+
+        if self.use_embeddings:
+            distances = embedding_distance_matrix(queries, references)
+            min_distances.append(distances.min(axis=1))
+            max_distances.append(distances.max(axis=1))
+
+        if self.use_color:
+            distances = color_distance_matrix(queries, references)
+            min_distances.append(distances.min(axis=1))
+            max_distances.append(distances.max(axis=1))
+
+        return (
+            nonlinear_pooling_rows(np.stack(min_distances, axis=1) if min_distances else np.zeros((len(features_list), 0))),
+            nonlinear_pooling_rows(np.stack(max_distances, axis=1) if max_distances else np.zeros((len(features_list), 0))),
+        )
+
     def filter_against_existing(self, clip, candidates, threshold):
         """
         Filters out candidates that are too similar to existing keyframes.
@@ -1,13 +1,18 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render, get_object_or_404, redirect
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import JsonResponse, FileResponse, Http404, HttpResponseNotModified
 from pathlib import Path
 from .models import Keyframe
 from utils.search import Searcher
 from collections import defaultdict
 import sys
 import os
+import posixpath
 from django.utils.http import urlencode
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.core.exceptions import SuspiciousFileOperation
+from django.views.decorators.http import require_safe
 
 _searcher_instance = None
 
@@ -55,19 +60,13 @@ def api_search_view(request):
     if not results:
         return JsonResponse({"done": True})
 
-    media_root = Path(settings.MEDIA_ROOT).resolve()
     keyframe_data = []
 
     for kf in results:
-        image_path = kf.get_image_path().resolve()
-
-        try:
-            relative_path = image_path.relative_to(media_root)
-        except ValueError:
+        image_url = kf.image_url()
+        if image_url is None:
             continue  # skip invalid
 
-        image_url = settings.MEDIA_URL.rstrip("/") + "/" + str(relative_path).replace("\\", "/")
-
         keyframe_data.append({
             "keyframe_id": kf.id,
             "thumbnail": image_url
@@ -78,16 +77,10 @@ def api_search_view(request):
 def detailed_view(request, keyframe_id):
     query = request.GET.get('q', '')
     keyframe = get_object_or_404(Keyframe, id=keyframe_id)
-    image_path = keyframe.get_image_path().resolve()
-    media_root = Path(settings.MEDIA_ROOT).resolve()
-
-    try:
-        relative_path = image_path.relative_to(media_root)
-    except ValueError:
+    image_url = keyframe.image_url("full")
+    if image_url is None:
         return JsonResponse({"error": "Image path is not within MEDIA_ROOT"}, status=500)
 
-    image_url = settings.MEDIA_URL.rstrip("/") + "/" + str(relative_path).replace("\\", "/")
-
     # Add this to preserve query + filters
     query_string = urlencode(request.GET, doseq=True)
 
@@ -97,4 +90,101 @@ def detailed_view(request, keyframe_id):
         "query": query,
         "query_string": query_string,  # ← added
     }
-    return render(request, "detailed_view.html", context)
\ No newline at end of file
+    return render(request, "detailed_view.html", context)
+
+def keyframe_image_view(request, keyframe_id, tier, version):
+    """
+    Serves a keyframe image tier under a URL versioned by the image's content hash and the tier settings,
+    with immutable cache headers. Outdated versions redirect to the current URL; missing thumbnail tiers
+    are created from the full image.
+    """
+    from VideoSearch.utils.thumbnails import FULL_TIER, IMMUTABLE_CACHE_CONTROL, thumbnail_tiers, thumbnail_format, save_thumbnails, image_version
+
+    if tier != FULL_TIER and tier not in thumbnail_tiers():
+        raise Http404("Unknown image tier.")
+    keyframe = get_object_or_404(Keyframe.objects.only("id", "clip_id", "frame", "image_hash"), id=keyframe_id)
+    if not keyframe.image_hash:
+        raise Http404("Keyframe image not found.")
+    if version != image_version(keyframe.image_hash, tier):
+        return redirect(keyframe.image_url(tier))
+
+    etag = f'"{version}-{tier}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+    else:
+        path = keyframe.get_image_path(tier)
+        if not path.exists():
+            image = keyframe.load_image()
+            if image is None or tier == FULL_TIER:
+                raise Http404("Keyframe image not found.")
+            save_thumbnails(image, keyframe.get_image_path())
+        content_type = "image/jpeg" if tier == FULL_TIER or thumbnail_format()[1] == "jpg" else "image/webp"
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+
+    response["ETag"] = etag
+    response["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+def api_sprites_view(request):
+    """
+    Sprite sheet for a page of results: ?ids=1,2,3 returns the URL of one packed image and the
+    offset of every keyframe in it, so the grid needs one request instead of one per thumbnail.
+    """
+    from VideoSearch.utils.sprites import SPRITE_MAX_TILES, get_sprite
+
+    try:
+        ids = [int(value) for value in request.GET.get("ids", "").split(",") if value]
+    except ValueError:
+        return JsonResponse({"error": "ids must be comma separated keyframe ids."}, status=400)
+    if not ids:
+        return JsonResponse({"error": "No ids provided."}, status=400)
+    if len(ids) > SPRITE_MAX_TILES:
+        return JsonResponse({"error": f"At most {SPRITE_MAX_TILES} ids per sheet."}, status=400)
+
+    found = Keyframe.objects.only("id", "clip_id", "frame", "image_hash").in_bulk(ids)
+    keyframes = [found[kf_id] for kf_id in dict.fromkeys(ids) if kf_id in found]
+    if not keyframes:
+        return JsonResponse({"error": "No keyframes found."}, status=404)
+
+    layout = get_sprite(keyframes)
+    return JsonResponse({
+        "sheet": reverse("sprite_sheet", args=[layout["key"]]),
+        "width": layout["width"],
+        "height": layout["height"],
+        "tile": layout["tile"],
+        "tiles": layout["tiles"],
+    })
+
+def sprite_sheet_view(request, key):
+    """Serves a built sprite sheet; the key is a content hash, so it is cached forever."""
+    from VideoSearch.utils.sprites import sprite_path
+    from VideoSearch.utils.thumbnails import IMMUTABLE_CACHE_CONTROL, thumbnail_format
+
+    path = sprite_path(key)
+    if not path.exists():
+        raise Http404("Sprite sheet not found.")
+    response = FileResponse(open(path, "rb"), content_type=f"image/{'jpeg' if thumbnail_format()[1] == 'jpg' else 'webp'}")
+    response["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+@require_safe
+def media_view(request, path):
+    """
+    Serves videos, proxies and keyframe images from MEDIA_ROOT with byte ranges and conditional requests
+    (see utils/media.py). URLs with a version (?v=...) are cached forever, all others are revalidated.
+    """
+    from VideoSearch.utils.media import MEDIA_CACHE_CONTROL, served_dirs, serve_file
+    from VideoSearch.utils.thumbnails import IMMUTABLE_CACHE_CONTROL
+
+    path = posixpath.normpath(path.replace("\\", "/")).lstrip("/")
+    if path.split("/", 1)[0] not in served_dirs():
+        raise Http404("Media file not found.")
+    try:
+        full_path = Path(safe_join(settings.MEDIA_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404("Media file not found.")
+    if not full_path.is_file():
+        raise Http404("Media file not found.")
+
+    cache_control = IMMUTABLE_CACHE_CONTROL if "v" in request.GET else MEDIA_CACHE_CONTROL
+    return serve_file(request, full_path, relative_path=path, cache_control=cache_control)
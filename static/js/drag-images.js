@@ -3,7 +3,7 @@ document.addEventListener("DOMContentLoaded", () => {
         const img = e.target;
         if (img.classList.contains("draggable-image")) {
             const payload = {
-                src: img.src,
+                src: img.dataset.thumbnail || img.src,
                 keyframeId: img.dataset.keyframeId,
             };
             console.log("dragstart payload set:", payload);
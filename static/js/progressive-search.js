@@ -36,6 +36,7 @@ document.addEventListener("DOMContentLoaded", function () {
             }
 
             resultsFound = true;
+            const thumbnails = [];
             data.results.forEach(result => {
                 returnedKeyframes.add(result.keyframe_id);
 
@@ -43,13 +44,15 @@ document.addEventListener("DOMContentLoaded", function () {
                 div.className = "clip-card preview-container-home";
                 div.innerHTML = `
                     <a href="/detailed_view/${result.keyframe_id}?q=${encodeURIComponent(query)}" draggable="false">
-                        <img src="${result.thumbnail}" alt="Keyframe" data-keyframe-id="${result.keyframe_id}" class="thumbnail draggable-image" draggable="true" />
+                        <img alt="Keyframe" data-keyframe-id="${result.keyframe_id}" class="thumbnail draggable-image" draggable="true" />
                     </a>
                 `;
+                thumbnails.push({ id: result.keyframe_id, img: div.querySelector("img"), url: result.thumbnail });
 
                 resultContainer.appendChild(div);
 
             });
+            loadSpriteTiles(thumbnails);
 
         } catch (err) {
             console.error("Error fetching result:", err);
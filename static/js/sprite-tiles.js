@@ -0,0 +1,46 @@
+// Loads result thumbnails as tiles of a few sprite sheets (/api/sprites/) instead of one request per image.
+// Cards are rendered right away; all sheets are requested in parallel and applied as each one arrives.
+const SPRITE_BATCH_SIZE = 50;
+const BLANK_PIXEL = "data:image/gif;base64,R0lGODlhAQABAIAAAAAAACH5BAEAAAAALAAAAAABAAEAAAICRAEAOw==";
+
+// thumbnails: [{ id, img, url }] of already rendered cards; url is the single thumbnail used as fallback.
+function loadSpriteTiles(thumbnails) {
+    for (let i = 0; i < thumbnails.length; i += SPRITE_BATCH_SIZE) {
+        const batch = thumbnails.slice(i, i + SPRITE_BATCH_SIZE);
+        batch.forEach(({ img, url }) => {
+            img.dataset.thumbnail = url;
+            img.src = BLANK_PIXEL;
+        });
+
+        fetch(`/api/sprites/?ids=${batch.map(({ id }) => id).join(",")}`)
+            .then(response => (response.ok ? response.json() : null))
+            .catch(err => {
+                console.error("Error fetching sprite sheet:", err);
+                return null;
+            })
+            .then(sheet => {
+                batch.forEach(({ id, img, url }) => {
+                    const position = sheet && sheet.tiles[id];
+                    const tile = position && { sheet: sheet.sheet, width: sheet.width, height: sheet.height, x: position[0], y: position[1] };
+                    renderThumbnail(img, url, tile);
+                });
+            });
+    }
+}
+
+// Shows a tile of a sprite sheet in the thumbnail <img>; falls back to the single thumbnail.
+// The thumbnail URL stays in data-thumbnail, e.g. for drag & drop previews.
+function renderThumbnail(img, thumbnailUrl, tile) {
+    img.dataset.thumbnail = thumbnailUrl;
+
+    if (!tile) {
+        img.src = thumbnailUrl;
+        return;
+    }
+
+    img.src = BLANK_PIXEL;
+    img.classList.add("sprite-tile");
+    img.style.backgroundImage = `url("${tile.sheet}")`;
+    img.style.backgroundSize = `${tile.width}px ${tile.height}px`;
+    img.style.backgroundPosition = `-${tile.x}px -${tile.y}px`;
+}
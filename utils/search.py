@@ -1,8 +1,8 @@
 import torch
 import numpy as np
-from transformers import CLIPTokenizer, CLIPModel
 from VideoSearch.models import Keyframe
 from VideoSearch.utils.hardware import EmbeddingModelSelector
+from VideoSearch.utils.model_registry import load_clip
 from VideoSearch.utils.visual_feature_extractor import compute_distance, nonlinear_pooling
 import utils.filters as ufil
 from utils.annoy_index import build_annoy_index
@@ -13,8 +13,8 @@ class Searcher:
         clip_model_name, _, _ = hardware.select()
 
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.tokenizer = CLIPTokenizer.from_pretrained(clip_model_name)
-        self.model = CLIPModel.from_pretrained(clip_model_name).to(self.device)
+        self.model, _, self.tokenizer = load_clip(clip_model_name, with_processor=False, with_tokenizer=True)
+        self.model = self.model.to(self.device)
 
         self.last_query = None
         self.last_embedding = None